@@ -0,0 +1,53 @@
+class Artifacts(object):
+    """
+    Things computed while one request is handled, for instance a signed
+    ID token or the claims that went into it. Kept so that later phases of
+    handling the same request, like process_request and the pre_construct
+    methods run by do_response, can reuse them instead of computing them
+    again.
+    """
+
+    def __init__(self):
+        self._db = {}
+
+    def __getitem__(self, name):
+        return self._db[name]
+
+    def __setitem__(self, name, value):
+        self._db[name] = value
+
+    def __contains__(self, name):
+        return name in self._db
+
+    def get(self, name, default=None):
+        return self._db.get(name, default)
+
+    def produce(self, name, func, *args, **kwargs):
+        """
+        Return the named artifact, computing it by calling func with the
+        given arguments if it hasn't been computed before.
+
+        :param name: Name of the artifact
+        :param func: Function that computes the artifact
+        :return: The artifact
+        """
+        try:
+            return self._db[name]
+        except KeyError:
+            _val = self._db[name] = func(*args, **kwargs)
+            return _val
+
+
+def request_artifacts(request):
+    """
+    Get the artifacts belonging to a request, they are created the first
+    time they are asked for.
+
+    :param request: A parsed request, a Message instance
+    :return: An :py:class:`Artifacts` instance
+    """
+    try:
+        return request._artifacts
+    except AttributeError:
+        request._artifacts = Artifacts()
+        return request._artifacts
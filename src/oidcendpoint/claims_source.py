@@ -0,0 +1,245 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError
+
+from cryptojwt.jws.jws import factory as jws_factory
+
+from oidcendpoint.exception import ConfigurationError
+from oidcendpoint.signer import Signer
+
+logger = logging.getLogger(__name__)
+
+
+class ClaimsSource(object):
+    """
+    Base class for sources of claims that are not returned directly but as
+    aggregated or distributed claims, see section 5.6.2 of
+    http://openid.net/specs/openid-connect-core-1_0.html
+
+    :param name: Name of the source, used in _claim_sources
+    :param claims: The claims this source can provide
+    :param timeout: How long to wait for the source, in seconds
+    """
+
+    def __init__(self, name, claims, timeout=1.0, **kwargs):
+        self.name = name
+        self.claims = set(claims)
+        self.timeout = timeout
+
+    def __call__(self, user_id, client_id, claims):
+        """
+        :param user_id: User ID
+        :param client_id: The client the claims are for
+        :param claims: The claims that are asked for and this source provides
+        :return: A tuple of the value to put in _claim_sources for this
+            source and the claims it holds, or None if the source has
+            nothing for this user.
+        """
+        raise NotImplementedError()
+
+
+class AggregatedClaimsSource(ClaimsSource):
+    """
+    Claims that are returned as a signed JWT.
+
+    *fetch* is called as fetch(user_id, client_id, claims) and should
+    return either a signed JWT, as returned by a claims provider, or a
+    dictionary with claims which is then signed using the keys that
+    belongs to *issuer* in *keyjar*.
+    Set *signed* to True if *fetch* only returns signed JWTs, a *keyjar* is
+    not needed then.
+    Signed JWTs are kept until they expire, at most *max_entries* of them,
+    the least recently used are dropped first.
+    """
+
+    def __init__(self, name, claims, fetch, keyjar=None, issuer='',
+                 sign_alg='RS256', lifetime=600, timeout=1.0, signed=False,
+                 max_entries=10000, **kwargs):
+        ClaimsSource.__init__(self, name, claims, timeout=timeout)
+        self.fetch = fetch
+        self.lifetime = lifetime
+        self.max_entries = max_entries
+        if keyjar is not None:
+            self.signer = Signer(keyjar, iss=issuer, sign_alg=sign_alg)
+        elif signed:
+            self.signer = None
+        else:
+            raise ConfigurationError(
+                'Claims source {} needs a keyjar to sign claims'.format(name))
+        # (user_id, client_id, claims) -> (expires, jwt, claim names)
+        self._cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _payload(self, jwt):
+        # Only looked at to find out what's in it, the client verifies it
+        try:
+            return jws_factory(jwt).jwt.payload()
+        except (AttributeError, TypeError, ValueError):
+            return {}
+
+    def __call__(self, user_id, client_id, claims):
+        _key = (user_id, client_id, tuple(sorted(claims)))
+        _now = time.time()
+        with self.lock:
+            try:
+                _expires, _jwt, _names = self._cache[_key]
+            except KeyError:
+                pass
+            else:
+                if _expires > _now:
+                    self._cache.move_to_end(_key)
+                    return {'JWT': _jwt}, _names
+                del self._cache[_key]
+
+        _res = self.fetch(user_id, client_id, claims)
+        if not _res:
+            return None
+
+        if isinstance(_res, dict):
+            _payload = {k: v for k, v in _res.items() if k in claims}
+            if not _payload:
+                return None
+            if self.signer is None:
+                raise ConfigurationError(
+                    'Claims source {} got claims to sign but has no '
+                    'keyjar'.format(self.name))
+            _jwt = self.signer.pack(_payload, recv=client_id,
+                                    lifetime=self.lifetime)
+            _expires = _now + self.lifetime
+        else:
+            _jwt = _res
+            _payload = self._payload(_jwt)
+            try:
+                _expires = _payload['exp']
+            except KeyError:
+                _expires = _now + self.lifetime
+        _names = set(_payload.keys()) & set(claims)
+        if not _names:
+            return None
+
+        with self.lock:
+            self._cache[_key] = (_expires, _jwt, _names)
+            self._cache.move_to_end(_key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return {'JWT': _jwt}, _names
+
+
+class DistributedClaimsSource(ClaimsSource):
+    """
+    Claims that the client has to fetch itself from *endpoint*.
+
+    If *access_token* is given it's called as access_token(user_id,
+    client_id, claims) and should return the access token the client
+    should use at the endpoint.
+    """
+
+    def __init__(self, name, claims, endpoint, access_token=None,
+                 timeout=1.0, **kwargs):
+        ClaimsSource.__init__(self, name, claims, timeout=timeout)
+        self.endpoint = endpoint
+        self.access_token = access_token
+
+    def __call__(self, user_id, client_id, claims):
+        _res = {'endpoint': self.endpoint}
+        if self.access_token is not None:
+            _token = self.access_token(user_id, client_id, claims)
+            if not _token:
+                return None
+            _res['access_token'] = _token
+        # What the endpoint holds isn't known, the claims this source is
+        # configured for are assumed to be there
+        return _res, set(claims)
+
+
+class ClaimsSources(object):
+    """
+    Asks all sources that can provide some of the asked for claims at the
+    same time. A source that doesn't answer within its timeout, or fails,
+    is left out.
+
+    A task that has timed out can't be stopped once it runs, so a source
+    should enforce its timeout on whatever it calls too. A source that
+    already has *max_pending* tasks queued or running in the pool of
+    *max_workers* threads isn't asked, so a source that hangs can't take
+    every worker. It defaults to half the workers.
+    """
+
+    def __init__(self, sources, max_workers=4, max_pending=None):
+        self.sources = sources
+        self.max_pending = max_pending or max(1, max_workers // 2)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # source name -> tasks queued or running
+        self._pending = {}
+        self.lock = threading.Lock()
+
+    def _submit(self, source, user_id, client_id, claims):
+        with self.lock:
+            _count = self._pending.get(source.name, 0)
+            if _count >= self.max_pending:
+                return None
+            self._pending[source.name] = _count + 1
+
+        def _done(fut):
+            with self.lock:
+                self._pending[source.name] -= 1
+
+        _fut = self.executor.submit(source, user_id, client_id, claims)
+        _fut.add_done_callback(_done)
+        return _fut
+
+    def collect(self, user_id, client_id, claims):
+        """
+        :param user_id: User ID
+        :param client_id: The client the claims are for
+        :param claims: The claims that are asked for
+        :return: Dictionary with _claim_names and _claim_sources, empty if
+            no source had anything
+        """
+        _claims = set(claims)
+        _start = time.time()
+        _pending = []
+        for source in self.sources:
+            _wanted = _claims & source.claims
+            if not _wanted:
+                continue
+            _fut = self._submit(source, user_id, client_id, _wanted)
+            if _fut is None:
+                logger.warning('Claims source {} is busy'.format(
+                    source.name))
+                continue
+            _pending.append((source, _wanted, _fut))
+
+        _names = {}
+        _sources = {}
+        for source, _wanted, _fut in _pending:
+            _left = max(0, _start + source.timeout - time.time())
+            try:
+                _res = _fut.result(timeout=_left)
+            except TimeoutError:
+                # If it hasn't started it never will
+                _fut.cancel()
+                logger.warning('Claims source {} timed out'.format(
+                    source.name))
+                continue
+            except Exception as err:
+                logger.warning('Claims source {} failed: {}'.format(
+                    source.name, err))
+                continue
+
+            if not _res:
+                continue
+            _value, _held = _res
+            _held = set(_held) & _wanted
+            if not _held:
+                continue
+            _sources[source.name] = _value
+            for claim in _held:
+                _names.setdefault(claim, source.name)
+
+        if not _sources:
+            return {}
+        return {'_claim_names': _names, '_claim_sources': _sources}
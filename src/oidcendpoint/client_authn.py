@@ -1,12 +1,20 @@
+import atexit
 import base64
+import heapq
 import logging
+import threading
+import time
+import weakref
 
+from cryptojwt.exception import BadSignature
 from cryptojwt.exception import Invalid
 from cryptojwt.exception import MissingKey
 from cryptojwt.jwt import utc_time_sans_frac
 from cryptojwt.utils import as_bytes
 from cryptojwt.utils import as_unicode
 
+from cryptojwt.jws.exception import JWSException
+from cryptojwt.jws.jws import factory as jws_factory
 from cryptojwt.jwt import JWT
 from oidcmsg.oidc import AuthnToken
 
@@ -14,6 +22,7 @@ from oidcendpoint import JWT_BEARER
 from oidcendpoint import rndstr
 from oidcendpoint import sanitize
 from oidcendpoint.exception import NotForMe
+from oidcendpoint.util import key_bundles_fingerprint
 
 logger = logging.getLogger(__name__)
 
@@ -58,6 +67,16 @@ class ClientAuthnMethod(object):
         """
         raise NotImplementedError
 
+    def is_usable(self, request=None, authorization_info=None):
+        """
+        Verify that this authentication method is applicable.
+
+        :param request: The request
+        :param authorization_info: Client authentication information
+        :return: True/False
+        """
+        raise NotImplementedError
+
 
 def basic_authn(authn):
     if not authn.startswith("Basic "):
@@ -76,11 +95,18 @@ class ClientSecretBasic(ClientAuthnMethod):
     Section 3.2.1 of OAuth 2.0 [RFC6749] using HTTP Basic authentication scheme.
     """
 
+    def is_usable(self, request=None, authorization_info=None):
+        if authorization_info is None:
+            return False
+        return authorization_info.startswith('Basic ')
+
     def verify(self, request, authorization_info, **kwargs):
         client_info = basic_authn(authorization_info)
 
-        if self.endpoint_context.cdb[
-            client_info['id']]["client_secret"] == client_info['secret']:
+        if self.endpoint_context.client_secret_verifier.verify(
+                client_info['id'],
+                self.endpoint_context.cdb[client_info['id']]["client_secret"],
+                client_info['secret']):
             return {'client_id': client_info['id']}
         else:
             raise AuthnFailure()
@@ -94,10 +120,17 @@ class ClientSecretPost(ClientSecretBasic):
     the request body.
     """
 
+    def is_usable(self, request=None, authorization_info=None):
+        if authorization_info:
+            return False
+        return 'client_id' in request and 'client_secret' in request
+
     def verify(self, request, **kwargs):
-        if self.endpoint_context.cdb[
-                request[
-                    'client_id']]["client_secret"] == request['client_secret']:
+        if self.endpoint_context.client_secret_verifier.verify(
+                request['client_id'],
+                self.endpoint_context.cdb[request['client_id']][
+                    "client_secret"],
+                request['client_secret']):
             return {'client_id': request['client_id']}
         else:
             raise AuthnFailure("secrets doesn't match")
@@ -107,6 +140,11 @@ class BearerHeader(ClientSecretBasic):
     """
     """
 
+    def is_usable(self, request=None, authorization_info=None):
+        if authorization_info is None:
+            return False
+        return authorization_info.startswith('Bearer ')
+
     def verify(self, request, authorization_info, **kwargs):
         if not authorization_info.startswith("Bearer "):
             raise AuthnFailure("Wrong type of authorization token")
@@ -119,6 +157,11 @@ class BearerBody(ClientSecretPost):
     Same as Client Secret Post
     """
 
+    def is_usable(self, request=None, authorization_info=None):
+        if authorization_info:
+            return False
+        return 'access_token' in request
+
     def verify(self, request, **kwargs):
         try:
             return {'token': request['access_token']}
@@ -126,16 +169,141 @@ class BearerBody(ClientSecretPost):
             raise AuthnFailure('No access token')
 
 
+class VerificationKeyCache(object):
+    """
+    Remembers which key verified a client assertion from an issuer
+    with a specific kid and signing algorithm.
+    An entry is dropped when it's older than *ttl* seconds or when the
+    issuer's key bundles in the key jar has changed.
+    """
+
+    def __init__(self, endpoint_context, ttl=300):
+        self.endpoint_context = endpoint_context
+        self.ttl = ttl
+        self._db = {}
+        self.lock = threading.Lock()
+
+    def _fingerprint(self, issuer):
+        return key_bundles_fingerprint(self.endpoint_context.keyjar, issuer)
+
+    def get(self, issuer, kid, alg):
+        _key = (issuer, kid, alg)
+        with self.lock:
+            try:
+                key, fingerprint, expires = self._db[_key]
+            except KeyError:
+                return None
+
+        if expires < time.time() or fingerprint != self._fingerprint(issuer):
+            with self.lock:
+                # Only drop the entry that was found to be stale
+                if self._db.get(_key, (None,))[0] is key:
+                    self._db.pop(_key, None)
+            return None
+        return key
+
+    def set(self, issuer, kid, alg, key):
+        _fp = self._fingerprint(issuer)
+        if not _fp:
+            return
+        with self.lock:
+            self._db[(issuer, kid, alg)] = (key, _fp, time.time() + self.ttl)
+
+    def invalidate(self, issuer=None):
+        with self.lock:
+            if issuer is None:
+                self._db = {}
+            else:
+                for _key in [k for k in self._db.keys() if k[0] == issuer]:
+                    self._db.pop(_key, None)
+
+
+class ReplayCache(object):
+    """
+    Keeps track of seen JWT IDs until the JWT expires. If the JWT doesn't
+    have an expiration time, *default_ttl* is used. No JWT ID is remembered
+    for more than *max_ttl* seconds.
+    """
+
+    def __init__(self, default_ttl=600, max_ttl=3600):
+        self.default_ttl = default_ttl
+        self.max_ttl = max_ttl
+        self._seen = {}
+        self._expires = []
+        self.lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._expires and self._expires[0][0] < now:
+            _, key = heapq.heappop(self._expires)
+            self._seen.pop(key, None)
+
+    def add(self, key, exp=0):
+        """
+        :param key: The JWT ID, possibly combined with the issuer
+        :param exp: When the JWT expires
+        :return: False if the key has been seen before, otherwise True
+        """
+        _now = time.time()
+        if not exp:
+            exp = _now + self.default_ttl
+        exp = min(exp, _now + self.max_ttl)
+
+        with self.lock:
+            self._expire(_now)
+            if key in self._seen:
+                return False
+            self._seen[key] = exp
+            heapq.heappush(self._expires, (exp, key))
+        return True
+
+    def __contains__(self, key):
+        return key in self._seen
+
+    def __len__(self):
+        return len(self._seen)
+
+
 class JWSAuthnMethod(ClientAuthnMethod):
 
+    def is_usable(self, request=None, authorization_info=None):
+        if authorization_info:
+            return False
+        return 'client_assertion' in request
+
+    def _verify_assertion(self, assertion):
+        _context = self.endpoint_context
+        _jws = jws_factory(assertion)
+        if _jws is None:  # Not a signed JWT, might be encrypted
+            return JWT(_context.keyjar).unpack(assertion)
+
+        _jwt = _jws.jwt
+        _cache = _context.client_assertion_key_cache
+        _cache_key = (_jwt.payload().get('iss', ''),
+                      _jwt.headers.get('kid', ''), _jwt.headers['alg'])
+
+        _key = _cache.get(*_cache_key)
+        if _key:
+            try:
+                return _jws.verify_compact(assertion, [_key])
+            except BadSignature:  # Do the full key search
+                pass
+
+        _keys = _context.keyjar.get_jwt_verify_keys(_jwt)
+        _res = _jws.verify_compact_verbose(assertion, _keys)
+        _cache.set(*_cache_key, key=_res['key'])
+        return _res['msg']
+
     def verify(self, request, **kwargs):
-        _jwt = JWT(self.endpoint_context.keyjar)
         try:
-            ca_jwt = _jwt.unpack(request["client_assertion"])
-        except (Invalid, MissingKey) as err:
+            ca_jwt = self._verify_assertion(request["client_assertion"])
+        except (Invalid, MissingKey, JWSException) as err:
             logger.info("%s" % sanitize(err))
             raise AuthnFailure("Could not verify client_assertion.")
 
+        _exp = ca_jwt.get('exp', 0)
+        if _exp and _exp < utc_time_sans_frac():
+            raise AuthnFailure("Expired client_assertion")
+
         try:
             logger.debug("authntoken: %s" % sanitize(ca_jwt.to_dict()))
         except AttributeError:
@@ -157,6 +325,12 @@ class JWSAuthnMethod(ClientAuthnMethod):
         else:
             raise NotForMe("Not for me!")
 
+        # Only assertions that are otherwise OK use up their jti
+        if 'jti' in ca_jwt:
+            if not self.endpoint_context.client_assertion_jti.add(
+                    (ca_jwt.get('iss', ''), ca_jwt['jti']), _exp):
+                raise AuthnFailure("Replayed client_assertion")
+
         return {'client_id': client_id, 'jwt': ca_jwt}
 
 
@@ -187,6 +361,112 @@ CLIENT_AUTHN_METHOD = {
 TYPE_METHOD = [(JWT_BEARER, JWSAuthnMethod)]
 
 
+class AuthnMethodAccounting(object):
+    """
+    Keeps track of which client authentication method a client used for
+    which type of request. Changes are written to the client database,
+    under 'auth_method', by a background timer *flush_delay* seconds
+    after the first change. Nothing is written if nothing has changed.
+    Changes not yet written are written by :py:meth:`close`, which is also
+    called when the interpreter exits.
+
+    This is bookkeeping and best-effort. The client database has no atomic
+    update, so a change made to a client by someone else, like another
+    worker sharing the client database, between the read and the write of
+    a flush is lost.
+    """
+
+    def __init__(self, endpoint_context, flush_delay=1.0):
+        self.endpoint_context = endpoint_context
+        self.flush_delay = flush_delay
+        self._known = {}
+        self._changed = {}
+        self._timer = None
+        self.lock = threading.Lock()
+        atexit.register(_close_at_exit, weakref.ref(self))
+
+    def get(self, client_id, request_type):
+        return self._known.get((client_id, request_type))
+
+    def record(self, client_id, request_type, method, cinfo=None):
+        """
+        :param client_id: Client ID
+        :param request_type: Name of the request class
+        :param method: Name of the client authentication method
+        :param cinfo: The client information, used to find out what is
+            already stored.
+        """
+        _key = (client_id, request_type)
+        try:
+            if self._known[_key] == method:
+                return
+        except KeyError:
+            try:
+                if cinfo['auth_method'][request_type] == method:
+                    self._known[_key] = method
+                    return
+            except (KeyError, TypeError):
+                pass
+
+        with self.lock:
+            self._known[_key] = method
+            try:
+                self._changed[client_id][request_type] = method
+            except KeyError:
+                self._changed[client_id] = {request_type: method}
+
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """
+        Write all changes to the client database.
+        """
+        with self.lock:
+            _changed = self._changed
+            self._changed = {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        _cdb = self.endpoint_context.cdb
+        for client_id, methods in _changed.items():
+            self._write(_cdb, client_id, methods)
+
+    def close(self):
+        """
+        Write all changes not yet written and stop the timer.
+        """
+        self.flush()
+
+    @staticmethod
+    def _write(cdb, client_id, methods):
+        """
+        Only auth_method is changed, everything else is written back as it
+        was when read here.
+        """
+        try:
+            _cinfo = dict(cdb[client_id])
+        except KeyError:
+            return
+
+        _methods = dict(_cinfo.get('auth_method') or {})
+        _methods.update(methods)
+        _cinfo['auth_method'] = _methods
+        cdb[client_id] = _cinfo
+
+
+def _close_at_exit(ref):
+    _accounting = ref()
+    if _accounting is not None:
+        try:
+            _accounting.close()
+        except Exception as err:
+            logger.exception(err)
+
+
 def valid_client_info(cinfo):
     eta = cinfo.get('client_secret_expires_at', 0)
     if eta != 0 and eta < utc_time_sans_frac():
@@ -194,44 +474,102 @@ def valid_client_info(cinfo):
     return True
 
 
-def verify_client(endpoint_context, request, authorization_info):
+def guess_authn_method(request, authorization_info):
     """
     Initiated Guessing !
 
-    :param endpoint_context: SrvInfo instance
     :param request: The request
     :param authorization_info: Client authentication information
-    :return: dictionary containing client id, client authentication method and
-        possibly access token.
+    :return: The name of the client authentication method
     """
-
     if not authorization_info:
         if 'client_id' in request and 'client_secret' in request:
-            auth_info = ClientSecretPost(endpoint_context).verify(request)
-            auth_info['method'] = 'client_secret_post'
+            return 'client_secret_post'
         elif 'client_assertion' in request:
-            auth_info = JWSAuthnMethod(endpoint_context).verify(request)
             #  If symmetric key was used
             # auth_method = 'client_secret_jwt'
             #  If asymmetric key was used
-            auth_info['method'] = 'private_key_jwt'
+            return 'private_key_jwt'
         elif 'access_token' in request:
-            auth_info = BearerBody(endpoint_context).verify(request)
-            auth_info['method'] = 'bearer_body'
+            return 'bearer_body'
         else:
             raise UnknownOrNoAuthnMethod()
     else:
         if authorization_info.startswith('Basic '):
-            auth_info = ClientSecretBasic(endpoint_context).verify(
-                request, authorization_info)
-            auth_info['method'] = 'client_secret_basic'
+            return 'client_secret_basic'
         elif authorization_info.startswith('Bearer '):
-            auth_info = BearerHeader(endpoint_context).verify(
-                request, authorization_info)
-            auth_info['method'] = 'bearer_header'
+            return 'bearer_header'
         else:
             raise UnknownOrNoAuthnMethod(authorization_info)
 
+
+def registered_authn_method(endpoint_context, client_id):
+    """
+    Find the client authentication method the client has registered.
+    The result is cached in the endpoint context's dispatch table for
+    clients that are in the client database.
+
+    :param endpoint_context: EndpointContext instance
+    :param client_id: Client ID
+    :return: Name of the client authentication method or None
+    """
+    _dispatch = endpoint_context.client_authn_dispatch
+    try:
+        return _dispatch[client_id]
+    except KeyError:
+        pass
+
+    try:
+        _cinfo = endpoint_context.cdb[client_id]
+    except (KeyError, TypeError):
+        # Not cached, anyone can send a request with an unknown client ID
+        # and the client may be added to the client database later.
+        return None
+
+    try:
+        _name = _cinfo['token_endpoint_auth_method']
+    except (KeyError, TypeError):
+        _name = None
+
+    if _name not in endpoint_context.client_authn_method:
+        _name = None
+
+    _dispatch[client_id] = _name
+    return _name
+
+
+def verify_client(endpoint_context, request, authorization_info):
+    """
+    Use the client authentication method the client has registered if it
+    is applicable to the request, otherwise guess.
+
+    :param endpoint_context: SrvInfo instance
+    :param request: The request
+    :param authorization_info: Client authentication information
+    :return: dictionary containing client id, client authentication method and
+        possibly access token.
+    """
+
+    _methods = endpoint_context.client_authn_method
+
+    _name = None
+    try:
+        _client_id = request['client_id']
+    except KeyError:
+        pass
+    else:
+        _name = registered_authn_method(endpoint_context, _client_id)
+        if _name and not _methods[_name].is_usable(request,
+                                                   authorization_info):
+            _name = None
+
+    if _name is None:
+        _name = guess_authn_method(request, authorization_info)
+
+    auth_info = _methods[_name].verify(request,
+                                       authorization_info=authorization_info)
+    auth_info['method'] = _name
+
     try:
         client_id = auth_info['client_id']
     except KeyError:
@@ -242,8 +580,19 @@ def verify_client(endpoint_context, request, authorization_info):
             pass
             logger.warning('Unknown client ID')
         else:
-            sinfo = endpoint_context.sdb[_token]
-            auth_info['client_id'] = sinfo['authn_req']['client_id']
+            _sdb = endpoint_context.sdb
+            _tinfo, _sinfo = _sdb.read_valid_token(
+                _token, order=['access_token', 'refresh_token', 'code'])
+            if _tinfo is None:
+                auth_info['client_id'] = _sdb.get_client_id_by_token(_token)
+            else:
+                try:
+                    auth_info['client_id'] = _tinfo['client_id']
+                except KeyError:
+                    auth_info['client_id'] = _sinfo['authn_req']['client_id']
+                # So the endpoint doesn't have to look them up again
+                auth_info['token_info'] = _tinfo
+                auth_info['session_info'] = _sinfo
     else:
         try:
             _cinfo = endpoint_context.cdb[client_id]
@@ -256,15 +605,9 @@ def verify_client(endpoint_context, request, authorization_info):
                 logger.warning('Client registration has timed out')
                 raise ValueError('Not valid client')
             else:
-                # check that the expected authz method was used
-                try:
-                    endpoint_context.cdb[client_id]['auth_method'][
-                        request.__class__.__name__] = auth_info['method']
-                except KeyError:
-                    try:
-                        endpoint_context.cdb[client_id]['auth_method'] = {
-                            request.__class__.__name__: auth_info['method']}
-                    except KeyError:
-                        pass
+                # keep track of which authn method was used
+                endpoint_context.client_authn_accounting.record(
+                    client_id, request.__class__.__name__,
+                    auth_info['method'], _cinfo)
 
     return auth_info
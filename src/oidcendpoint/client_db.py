@@ -0,0 +1,191 @@
+import mmap
+import os
+import pickle
+import struct
+
+MAGIC = b'OECS'
+VERSION = 1
+
+# magic, version, number of entries, index offset
+HEADER = struct.Struct('!4sIIQ')
+# key offset, key length, record offset, record length
+INDEX_ENTRY = struct.Struct('!QIQI')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def compile_snapshot(clients, filename):
+    """
+    Write a snapshot file from a dictionary like client database.
+
+    :param clients: Dictionary with client IDs as keys and client
+        information as values.
+    :param filename: Name of the snapshot file
+    """
+    _keys = sorted(clients.keys())
+    _index = []
+    _tmp = '{}.tmp'.format(filename)
+    with open(_tmp, 'wb') as fp:
+        fp.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        for key in _keys:
+            _key = key.encode('utf-8')
+            _rec = pickle.dumps(clients[key])
+            _key_offset = fp.tell()
+            fp.write(_key)
+            _rec_offset = fp.tell()
+            fp.write(_rec)
+            _index.append((_key_offset, len(_key), _rec_offset, len(_rec)))
+
+        _index_offset = fp.tell()
+        for entry in _index:
+            fp.write(INDEX_ENTRY.pack(*entry))
+
+        fp.seek(0)
+        fp.write(HEADER.pack(MAGIC, VERSION, len(_keys), _index_offset))
+        fp.flush()
+        os.fsync(fp.fileno())
+
+    # atomic replace so running workers never see a half written file
+    os.replace(_tmp, filename)
+
+
+class ClientSnapshot(object):
+    """
+    Read-only, memory-mapped view of a snapshot file.
+
+    The snapshot file layout is::
+
+        header: magic, version, number of entries, offset of the index
+        records: key and pickled client information, one after the other
+        index: one fixed size entry per key, sorted on key
+
+    The index is binary searched in place so nothing is loaded at startup,
+    and the pages are shared between pre-forked workers.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as fp:
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self._count, self._index_offset = HEADER.unpack_from(
+            self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError('Not a client snapshot: {}'.format(filename))
+
+    def _entry(self, pos):
+        return INDEX_ENTRY.unpack_from(
+            self._map, self._index_offset + pos * INDEX_ENTRY.size)
+
+    def _key(self, entry):
+        return self._map[entry[0]:entry[0] + entry[1]]
+
+    def _find(self, key):
+        _key = key.encode('utf-8')
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._entry(mid)
+            _mkey = self._key(entry)
+            if _mkey < _key:
+                lo = mid + 1
+            elif _mkey > _key:
+                hi = mid
+            else:
+                return entry
+        return None
+
+    def __getitem__(self, key):
+        entry = self._find(key)
+        if entry is None:
+            raise KeyError(key)
+        return pickle.loads(self._map[entry[2]:entry[2] + entry[3]])
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __len__(self):
+        return self._count
+
+    def keys(self):
+        return [self._key(self._entry(i)).decode('utf-8')
+                for i in range(self._count)]
+
+    def close(self):
+        self._map.close()
+
+
+class SnapshotClientDatabase(object):
+    """
+    A client database where statically provisioned clients are read from a
+    snapshot and dynamically registered clients are kept in a writable
+    overlay. The overlay can be any dictionary like object, by default it's
+    a dictionary.
+    """
+
+    def __init__(self, filename, overlay=None):
+        self.snapshot = ClientSnapshot(filename)
+        self.overlay = {} if overlay is None else overlay
+        self._deleted = set()
+
+    def __getitem__(self, key):
+        try:
+            return self.overlay[key]
+        except KeyError:
+            if key in self._deleted:
+                raise
+        return self.snapshot[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        self._deleted.discard(key)
+        self.overlay[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        try:
+            del self.overlay[key]
+        except KeyError:
+            pass
+        if key in self.snapshot:
+            self._deleted.add(key)
+
+    def __contains__(self, key):
+        if key in self.overlay:
+            return True
+        if key in self._deleted:
+            return False
+        return key in self.snapshot
+
+    def keys(self):
+        _keys = set(self.snapshot.keys()) - self._deleted
+        _keys.update(self.overlay.keys())
+        return list(_keys)
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        for key in self.keys():
+            yield key, self[key]
+
+    def sync(self):
+        try:
+            self.overlay.sync()
+        except AttributeError:  # Not all databases can be sync'ed
+            pass
+
+    def close(self):
+        self.snapshot.close()
+        try:
+            self.overlay.close()
+        except AttributeError:
+            pass
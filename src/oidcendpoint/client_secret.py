@@ -0,0 +1,154 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+PBKDF2_ITERATIONS = 100000
+SCRYPT_PARAMS = {'n': 2 ** 14, 'r': 8, 'p': 1}
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(data):
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _pbkdf2(secret, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', secret.encode('utf-8'), salt,
+                               iterations)
+
+
+def _scrypt(secret, salt, n, r, p):
+    # Only there if Python was built with OpenSSL 1.1 or later
+    if not hasattr(hashlib, 'scrypt'):
+        raise ValueError('scrypt is not supported by this Python')
+    return hashlib.scrypt(secret.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                          maxmem=128 * r * (n + p + 2) + 1024 * 1024)
+
+
+def hash_secret(secret, method='pbkdf2_sha256', salt=None):
+    """
+    Create a slow hash of a client secret suitable for storing in the
+    client database.
+
+    :param secret: The client secret
+    :param method: 'pbkdf2_sha256' or 'scrypt'
+    :param salt: Salt, a random one is created if not given
+    :return: A string of the form method$parameters$salt$hash
+    """
+    if salt is None:
+        salt = os.urandom(16)
+
+    if method == 'pbkdf2_sha256':
+        _hash = _pbkdf2(secret, salt, PBKDF2_ITERATIONS)
+        _params = '{}'.format(PBKDF2_ITERATIONS)
+    elif method == 'scrypt':
+        _hash = _scrypt(secret, salt, **SCRYPT_PARAMS)
+        _params = '{n},{r},{p}'.format(**SCRYPT_PARAMS)
+    else:
+        raise ValueError('Unknown hash method: {}'.format(method))
+
+    return '$'.join([method, _params, _b64(salt), _b64(_hash)])
+
+
+def is_hashed(stored):
+    return isinstance(stored, str) and (
+        stored.startswith('pbkdf2_sha256$') or stored.startswith('scrypt$'))
+
+
+def check_secret(stored, presented):
+    """
+    Compare a presented secret with a stored one, which may be hashed.
+    The comparison is done in constant time.
+
+    :param stored: The stored secret or hash of the secret
+    :param presented: The secret presented by the client
+    :return: True if they match
+    """
+    # A missing or broken stored secret never matches
+    if not isinstance(stored, str) or not isinstance(presented, str):
+        return False
+
+    if not is_hashed(stored):
+        return hmac.compare_digest(stored.encode('utf-8'),
+                                   presented.encode('utf-8'))
+
+    try:
+        method, params, salt, _hash = stored.split('$')
+        salt = _unb64(salt)
+        if method == 'pbkdf2_sha256':
+            _computed = _pbkdf2(presented, salt, int(params))
+        else:
+            n, r, p = [int(v) for v in params.split(',')]
+            _computed = _scrypt(presented, salt, n, r, p)
+    except ValueError:
+        return False
+
+    return hmac.compare_digest(_computed, _unb64(_hash))
+
+
+class SecretVerifier(object):
+    """
+    Verifies client secrets. Successful verifications against hashed secrets
+    are remembered for *ttl* seconds keyed on a HMAC, using a per-process
+    key, over the client ID, the stored hash and the presented secret.
+    So the presented secret is never kept in memory and a changed secret
+    doesn't match any old entry.
+
+    The hashing functions release the GIL, so :py:meth:`verify` can be
+    called from several request threads at the same time.
+    """
+
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._key = os.urandom(32)
+        self._memo = {}
+        self.lock = threading.Lock()
+
+    def _memo_key(self, client_id, stored, presented):
+        _msg = '\x00'.join([client_id, stored, presented]).encode('utf-8')
+        return hmac.new(self._key, _msg, hashlib.sha256).digest()
+
+    def _remember(self, memo_key, now):
+        with self.lock:
+            if len(self._memo) >= self.max_entries:
+                self._memo = {k: v for k, v in self._memo.items() if v > now}
+                if len(self._memo) >= self.max_entries:
+                    self._memo = {}
+            self._memo[memo_key] = now + self.ttl
+
+    def _memo_get(self, client_id, stored, presented):
+        """
+        :return: tuple of memo key, None if there is nothing to memoize,
+            and whether a successful verification is remembered.
+        """
+        if not is_hashed(stored) or not isinstance(presented, str):
+            return None, False
+
+        _memo_key = self._memo_key(client_id, stored, presented)
+        try:
+            return _memo_key, self._memo[_memo_key] > time.time()
+        except KeyError:
+            return _memo_key, False
+
+    def verify(self, client_id, stored, presented):
+        """
+        :param client_id: Client ID
+        :param stored: The stored secret or hash of the secret
+        :param presented: The secret presented by the client
+        :return: True if the presented secret is correct
+        """
+        _memo_key, _known = self._memo_get(client_id, stored, presented)
+        if _known:
+            return True
+
+        _now = time.time()
+        res = check_secret(stored, presented)
+        if res and _memo_key is not None:
+            self._remember(_memo_key, _now)
+        return res
@@ -15,11 +15,23 @@ from oidcmsg.oidc import SCOPE2CLAIMS
 
 from oidcendpoint import rndstr
 from oidcendpoint import authz
+from oidcendpoint.claims_source import ClaimsSources
+from oidcendpoint.client_authn import AuthnMethodAccounting
 from oidcendpoint.client_authn import CLIENT_AUTHN_METHOD
+from oidcendpoint.client_authn import ReplayCache
+from oidcendpoint.client_authn import VerificationKeyCache
+from oidcendpoint.client_secret import SecretVerifier
 from oidcendpoint.exception import ConfigurationError
+from oidcendpoint.redirect_uri import RedirectURIMatcher
+from oidcendpoint.sign_cost import measure_sign_cost
+from oidcendpoint.signer import SignerCache
+from oidcendpoint.signing_executor import SigningExecutor
 from oidcendpoint.sso_db import SSODb
 from oidcendpoint.user_authn import user
 from oidcendpoint.user_authn.authn_context import AuthnBroker
+from oidcendpoint.user_info.cache import CachedUserInfo
+from oidcendpoint.user_info.reload import ReloadingUserDB
+from oidcendpoint.userinfo import ClaimsPlanCache
 from oidcendpoint.util import build_endpoints
 
 logger = logging.getLogger(__name__)
@@ -110,6 +122,20 @@ class EndpointContext(object):
         self.endpoint_to_authn_method = {}
         self.cookie_dealer = cookie_dealer
 
+        # One instance per client authentication method and a table
+        # mapping client IDs to the method they have registered.
+        self.client_authn_method = {
+            name: cls(self) for name, cls in CLIENT_AUTHN_METHOD.items()}
+        self.client_authn_dispatch = {}
+        self.client_authn_accounting = AuthnMethodAccounting(self)
+        # Shared by all endpoints that accept client assertions
+        self.client_assertion_key_cache = VerificationKeyCache(self)
+        self.client_assertion_jti = ReplayCache()
+        self.client_secret_verifier = SecretVerifier(
+            **conf.get('client_secret_verifier', {}))
+        self.claims_plan_cache = ClaimsPlanCache()
+        self.redirect_uri_matcher = RedirectURIMatcher()
+
         for param in ['verify_ssl', 'issuer', 'sso_ttl',
                       'symkey', 'client_authn', 'id_token_schema']:
             try:
@@ -117,6 +143,27 @@ class EndpointContext(object):
             except KeyError:
                 pass
 
+        # Optionally create asymmetric signatures in worker processes.
+        # The workers are started here, before any request is handled.
+        try:
+            _executor = SigningExecutor(**conf['signing_executor'])
+        except KeyError:
+            _executor = None
+        else:
+            _executor.start(self.keyjar, owners=['', self.issuer])
+        self.signer_cache = SignerCache(self, executor=_executor)
+
+        # Measure the signing cost per algorithm if default signing
+        # algorithms should be picked based on cost.
+        if conf.get('sign_alg_policy') == 'cost':
+            self.sign_alg_cost = measure_sign_cost(
+                self.keyjar, owners=['', self.issuer])
+            logger.info('Signing cost per algorithm (ms): {}'.format(
+                {k: round(v * 1000, 3) for k, v in
+                 self.sign_alg_cost.items()}))
+        else:
+            self.sign_alg_cost = {}
+
         template_dir = conf["template_dir"]
         jinja_env = Environment(loader=FileSystemLoader(template_dir))
 
@@ -195,6 +242,31 @@ class EndpointContext(object):
                 kwargs['db_file'] = os.path.join(self.cwd, kwargs['db_file'])
             self.userinfo = _conf['class'](**kwargs)
 
+            # Cache what the user info source returns
+            try:
+                _cache_conf = _conf['cache']
+            except KeyError:
+                pass
+            else:
+                self.userinfo = CachedUserInfo(self.userinfo, **_cache_conf)
+                # Don't return what was cached from a replaced user database
+                _db = getattr(self.userinfo.source, 'db', None)
+                if isinstance(_db, ReloadingUserDB):
+                    _db.add_listener(self.userinfo.users_changed)
+
+        # Sources of aggregated and distributed claims
+        self.claims_sources = None
+        try:
+            _conf = conf['claims_sources']
+        except KeyError:
+            pass
+        else:
+            _sources = [spec['class'](**spec.get('kwargs', {})) for spec in
+                        _conf['sources']]
+            self.claims_sources = ClaimsSources(
+                _sources, max_workers=_conf.get('max_workers', 4),
+                max_pending=_conf.get('max_pending'))
+
         self.provider_info = self.create_providerinfo(_cap)
 
         # which signing/encryption algorithms to use in what context
@@ -220,6 +292,11 @@ class EndpointContext(object):
         # Sort order RS, ES, HS, PS
         sign_algs = list(jws.SIGNER_ALGS.keys())
         sign_algs = sorted(sign_algs, key=cmp_to_key(sort_sign_alg))
+        if self.sign_alg_cost:
+            # cheapest measured first, the rest in the order above
+            sign_algs = sorted(
+                sign_algs, key=lambda a: (a not in self.sign_alg_cost,
+                                          self.sign_alg_cost.get(a, 0)))
 
         for typ in ["userinfo", "id_token", "request_object"]:
             _provider_info["%s_signing_alg_values_supported" % typ] = sign_algs
@@ -0,0 +1,147 @@
+import bisect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in milliseconds, of the flush latency histogram buckets
+LATENCY_BUCKETS = [0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000]
+
+
+class LatencyHistogram(object):
+    """
+    Counts observed latencies in a fixed set of buckets.
+    """
+
+    def __init__(self, buckets=None):
+        self.buckets = buckets or LATENCY_BUCKETS
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, msec):
+        self.counts[bisect.bisect_left(self.buckets, msec)] += 1
+        self.total += msec
+        if msec > self.max:
+            self.max = msec
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def to_dict(self):
+        """
+        :return: A dictionary with the bucket counts keyed by the upper
+            bound of the bucket ('inf' for the last one) together with the
+            number of observations, the mean and the max value.
+        """
+        _labels = ['{}'.format(b) for b in self.buckets] + ['inf']
+        _count = len(self)
+        return {
+            'buckets': dict(zip(_labels, self.counts)),
+            'count': _count,
+            'mean': self.total / _count if _count else 0.0,
+            'max': self.max
+        }
+
+
+class GroupCommit(object):
+    """
+    Buffers writes to a persistent store and flushes them as a group.
+    A flush happens when *max_ops* writes are pending or when the oldest
+    pending write is older than *max_delay* seconds. The latter is only
+    checked on the next write unless *background* is True, in which case
+    a daemon thread does the flush.
+
+    The store does the actual work in the *flush* callable which is always
+    called with the lock held.
+    """
+
+    def __init__(self, flush, max_ops=100, max_delay=1.0, background=False):
+        self._flush = flush
+        self.max_ops = max_ops
+        self.max_delay = max_delay
+        self.lock = threading.RLock()
+        self.histogram = LatencyHistogram()
+        self.pending = 0
+        self._first_pending = 0
+        # Failed background flushes and the latest error
+        self.failures = 0
+        self.last_error = None
+        self._closed = False
+        self._thread = None
+        self._wakeup = threading.Condition(self.lock)
+        if background:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def add(self):
+        """
+        Register that a write has been buffered. Must be called with the
+        lock held.
+        """
+        if not self.pending:
+            self._first_pending = time.time()
+        self.pending += 1
+
+        if self.pending >= self.max_ops:
+            self.flush()
+        elif self._thread is None:
+            if time.time() - self._first_pending >= self.max_delay:
+                self.flush()
+        else:
+            self._wakeup.notify()
+
+    def flush(self, force=False):
+        """
+        Flush all pending writes. Blocks until they are durable.
+
+        :param force: Call the flush function even if there are no
+            pending writes.
+        """
+        with self.lock:
+            if not self.pending and not force:
+                return
+            _start = time.time()
+            self._flush()
+            self.histogram.add((time.time() - _start) * 1000)
+            self.pending = 0
+
+    def _run(self):
+        with self.lock:
+            while not self._closed:
+                if not self.pending:
+                    self._wakeup.wait()
+                    continue
+                _left = self._first_pending + self.max_delay - time.time()
+                if _left > 0:
+                    self._wakeup.wait(_left)
+                else:
+                    try:
+                        self.flush()
+                    except Exception as err:
+                        logger.exception(err)
+                        self.failures += 1
+                        self.last_error = err
+                        # Wait max_delay before trying again, the wait
+                        # releases the lock so the store can be used
+                        self._first_pending = time.time()
+
+    def close(self):
+        try:
+            with self.lock:
+                self.flush()
+        finally:
+            # Stop the background thread even if the last flush failed
+            with self.lock:
+                self._closed = True
+                self._wakeup.notify()
+            if self._thread is not None:
+                self._thread.join()
+                self._thread = None
+
+    def stats(self):
+        """
+        :return: Flush latency histogram as a dictionary
+        """
+        return self.histogram.to_dict()
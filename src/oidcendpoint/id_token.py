@@ -2,8 +2,6 @@ import logging
 
 from cryptojwt.jws.utils import left_hash
 
-from cryptojwt.jwt import JWT
-
 from oidcservice.exception import AccessDenied
 
 from oidcendpoint.userinfo import id_token_claims
@@ -139,7 +137,7 @@ def sign_encrypt_id_token(endpoint_context, session_info, client_id, code=None,
                                  access_token=access_token, user_info=user_info,
                                  auth_time=_authn_event["authn_time"])
 
-    _jwt = JWT(endpoint_context.keyjar, iss=endpoint_context.issuer,
-               lifetime=_idt_info['lifetime'], **alg_dict)
+    _signer = endpoint_context.signer_cache.get(client_id, **alg_dict)
 
-    return _jwt.pack(_idt_info['payload'], recv=client_id)
+    return _signer.pack(_idt_info['payload'], recv=client_id,
+                        lifetime=_idt_info['lifetime'])
@@ -1,10 +1,5 @@
 import logging
 
-from urllib.parse import parse_qs
-from urllib.parse import splitquery
-from urllib.parse import unquote
-from urllib.parse import urlparse
-
 from cryptojwt.jwe.exception import JWEException
 from cryptojwt.jws.exception import NoSuitableSigningKeys
 
@@ -12,13 +7,13 @@ from oidcservice.exception import InvalidRequest
 from oidcmsg import oidc
 from oidcmsg.exception import ParameterError
 from oidcmsg.exception import UnSupported
-from oidcmsg.exception import URIError
 from oidcmsg.oauth2 import AuthorizationErrorResponse
 from oidcmsg.oauth2 import ResponseMessage
 from oidcmsg.oidc import AuthorizationResponse
 from oidcmsg.oidc import verified_claim_name
 
 from oidcendpoint import sanitize
+from oidcendpoint.artifacts import request_artifacts
 from oidcendpoint.endpoint import Endpoint
 from oidcendpoint.exception import NoSuchAuthentication
 from oidcendpoint.exception import RedirectURIError
@@ -75,7 +70,26 @@ def re_authenticate(request, authn):
     return False
 
 
-def setup_session(endpoint_context, request, authn_event, client_id=''):
+def setup_session(endpoint_context, request, authn_event, client_id='',
+                  reuse=False):
+    """
+    Create a new session or, if reuse is allowed and the user already has
+    an active session with the client, roll that session forward.
+
+    :param endpoint_context: EndpointContext instance
+    :param request: The authorization request
+    :param authn_event: Authentication event information
+    :param client_id: Client ID
+    :param reuse: Whether an existing session may be reused
+    :return: Session ID
+    """
+    _sdb = endpoint_context.sdb
+    if reuse:
+        sid = _sdb.find_authz_session(authn_event['uid'],
+                                      request['client_id'])
+        if sid:
+            return _sdb.reuse_authz_session(sid, authn_event, request)
+
     sid = endpoint_context.sdb.create_authz_session(authn_event, request,
                                                     client_id=client_id)
     endpoint_context.sdb.do_sub(sid, '')
@@ -87,65 +101,49 @@ def verify_redirect_uri(endpoint_context, request):
     MUST NOT contain a fragment
     MAY contain query component
 
+    The client's registered redirect URIs are compiled once, see
+    :py:class:`oidcendpoint.redirect_uri.RedirectURIMatcher`, and a redirect
+    URI that has been verified isn't verified again while the same request
+    is handled.
+
     :return: An error response if the redirect URI is faulty otherwise
         None
     """
-    try:
-        _redirect_uri = unquote(request["redirect_uri"])
-
-        part = urlparse(_redirect_uri)
-        if part.fragment:
-            raise URIError("Contains fragment")
-
-        (_base, _query) = splitquery(_redirect_uri)
-        if _query:
-            _query = parse_qs(_query)
-
-        match = False
-        for regbase, rquery in endpoint_context.cdb[str(request["client_id"])][
-            "redirect_uris"]:
-
-            # The URI MUST exactly match one of the Redirection URI
-            if _base == regbase:
-                # every registered query component must exist in the
-                # redirect_uri
-                if rquery:
-                    for key, vals in rquery.items():
-                        assert key in _query
-                        for val in vals:
-                            assert val in _query[key]
-                # and vice versa, every query component in the redirect_uri
-                # must be registered
-                if _query:
-                    if rquery is None:
-                        raise ValueError
-                    for key, vals in _query.items():
-                        assert key in rquery
-                        for val in vals:
-                            assert val in rquery[key]
-                match = True
-                break
-        if not match:
-            raise RedirectURIError("Doesn't match any registered uris")
-        # ignore query components that are not registered
+    _artifacts = request_artifacts(request)
+    if _artifacts.get('verified_redirect_uri') == (request.get('client_id'),
+                                                   request['redirect_uri']):
         return None
-    except Exception:
+
+    try:
+        _cinfo = endpoint_context.cdb[str(request["client_id"])]
+    except KeyError:
         logger.error("Faulty redirect_uri: %s" % request["redirect_uri"])
         try:
-            _cinfo = endpoint_context.cdb[str(request["client_id"])]
+            cid = request["client_id"]
         except KeyError:
-            try:
-                cid = request["client_id"]
-            except KeyError:
-                logger.error('No client id found')
-                raise UnknownClient('No client_id provided')
-            else:
-                logger.info("Unknown client: %s" % cid)
-                raise UnknownClient(request["client_id"])
+            logger.error('No client id found')
+            raise UnknownClient('No client_id provided')
         else:
-            logger.info("Registered redirect_uris: %s" % sanitize(_cinfo))
-            raise RedirectURIError(
-                "Faulty redirect_uri: %s" % request["redirect_uri"])
+            logger.info("Unknown client: %s" % cid)
+            raise UnknownClient(request["client_id"])
+
+    try:
+        match = endpoint_context.redirect_uri_matcher.match(
+            str(request["client_id"]), _cinfo["redirect_uris"],
+            request["redirect_uri"])
+    except Exception:
+        match = False
+
+    if not match:
+        logger.error("Faulty redirect_uri: %s" % request["redirect_uri"])
+        logger.info("Registered redirect_uris: %s" % sanitize(_cinfo))
+        raise RedirectURIError(
+            "Faulty redirect_uri: %s" % request["redirect_uri"])
+
+    # ignore query components that are not registered
+    _artifacts['verified_redirect_uri'] = (request['client_id'],
+                                           request['redirect_uri'])
+    return None
 
 
 def get_redirect_uri(endpoint_context, request):
@@ -295,6 +293,8 @@ class Authorization(Endpoint):
         Endpoint.__init__(self, endpoint_context, **kwargs)
         # self.pre_construct.append(self._pre_construct)
         self.post_parse_request.append(self._post_parse_request)
+        # Reuse an existing session for the same user and client
+        self.reuse_session = kwargs.get('reuse_session', False)
 
     def filter_request(self, endpoint_context, req):
         return req
@@ -596,7 +596,8 @@ class Authorization(Endpoint):
         :param kwargs: possible other parameters
         :return: A redirect to the redirect_uri of the client
         """
-        sid = setup_session(self.endpoint_context, request, authn_event)
+        sid = setup_session(self.endpoint_context, request, authn_event,
+                            reuse=self.reuse_session)
 
         resp_info = self.post_authentication(user, request, sid, **kwargs)
         if isinstance(resp_info, ResponseMessage):
@@ -54,6 +54,16 @@ PREFERENCE2PROVIDER = {
     'grant_types': 'grant_types_supported'
 }
 
+# Not standard client metadata. The signing algorithms the client can
+# handle, in order to let the provider pick the one that is cheapest to
+# sign with, when the client hasn't registered *_signed_response_alg.
+SIGNING_ALG_PREFERENCES = {
+    "id_token_signing_alg_values_supported":
+        "id_token_signing_alg_values_supported",
+    "userinfo_signing_alg_values_supported":
+        "userinfo_signing_alg_values_supported"
+}
+
 logger = logging.getLogger(__name__)
 
 
@@ -206,6 +216,33 @@ class Registration(Endpoint):
                         if not _k:
                             del _cinfo[item]
 
+        # Only keep the algorithms the provider supports and has keys for
+        for item, _prov in SIGNING_ALG_PREFERENCES.items():
+            if item not in request:
+                continue
+            _algs = request[item]
+            if isinstance(_algs, str):
+                _algs = [_algs]
+            if not isinstance(_algs, list) or not all(
+                    isinstance(a, str) for a in _algs):
+                return ClientRegistrationErrorResponse(
+                    error="invalid_client_metadata",
+                    error_description="{} must be a list of "
+                                      "algorithms".format(item))
+            _usable = []
+            for alg in _algs:
+                if alg not in _context.provider_info.get(_prov, []):
+                    continue
+                ktyp = alg2keytype(alg)
+                if ktyp in ["none", "oct"]:
+                    continue
+                if _context.keyjar.get_signing_key(ktyp, alg=alg):
+                    _usable.append(alg)
+            if _usable:
+                _cinfo[item] = _usable
+            else:
+                del _cinfo[item]
+
         t = {}
         t['jwks_uri'] = ''
         t['jwks'] = None
@@ -218,6 +255,7 @@ class Registration(Endpoint):
             _context.keyjar.load_keys(client_id,
                                       jwks_uri=t['jwks_uri'],
                                       jwks=t['jwks'])
+            _context.client_assertion_key_cache.invalidate(client_id)
             try:
                 n_keys = len(_context.keyjar[client_id])
                 msg = "found {} keys for client_id={}"
@@ -386,7 +424,8 @@ class Registration(Endpoint):
             return _cinfo
 
         args = dict([(k, v) for k, v in _cinfo.items()
-                     if k in RegistrationResponse.c_param])
+                     if k in RegistrationResponse.c_param or
+                     k in SIGNING_ALG_PREFERENCES])
 
         self.comb_uri(args)
         response = RegistrationResponse(**args)
@@ -396,6 +435,10 @@ class Registration(Endpoint):
             _context.keyjar.add_symmetric(client_id, str(client_secret))
 
         _context.cdb[client_id] = _cinfo
+        # The registered client authentication method may have changed
+        _context.client_authn_dispatch.pop(client_id, None)
+        _context.signer_cache.invalidate(client_id)
+        _context.redirect_uri_matcher.invalidate(client_id)
 
         try:
             _context.cdb.sync()
@@ -10,6 +10,7 @@ from oidcmsg.oidc import RefreshAccessTokenRequest
 from oidcmsg.oidc import TokenErrorResponse
 
 from oidcendpoint import sanitize
+from oidcendpoint.artifacts import request_artifacts
 from oidcendpoint.client_authn import verify_client
 from oidcendpoint.endpoint import Endpoint
 from oidcendpoint.id_token import sign_encrypt_id_token
@@ -38,6 +39,15 @@ class AccessToken(Endpoint):
         self.post_parse_request.append(self._post_parse_request)
 
     def _pre_construct(self, response_args, request, **kwargs):
+        _artifacts = request_artifacts(request)
+        # Already done while the request was processed
+        try:
+            response_args['id_token'] = _artifacts['id_token']
+        except KeyError:
+            pass
+        else:
+            return response_args
+
         _context = self.endpoint_context
         _access_code = request["code"].replace(' ', '+')
         _info = _context.sdb[_access_code]
@@ -48,7 +58,9 @@ class AccessToken(Endpoint):
             _client_id = _authn_req['client_id']
 
         if "openid" in _authn_req["scope"]:
-            userinfo = userinfo_in_id_token_claims(_context, _info)
+            userinfo = _artifacts.produce('id_token_userinfo',
+                                          userinfo_in_id_token_claims,
+                                          _context, _info)
             try:
                 _idtoken = sign_encrypt_id_token(_context, _info,
                                                  str(_client_id),
@@ -60,6 +72,7 @@ class AccessToken(Endpoint):
                     error_description="Could not sign/encrypt id_token")
 
             _context.sdb.update_by_token(_access_code, id_token=_idtoken)
+            _artifacts['id_token'] = _idtoken
             response_args['id_token'] = _idtoken
 
         return response_args
@@ -118,12 +131,15 @@ class AccessToken(Endpoint):
         except AccessCodeUsed as err:
             logger.error("%s" % err)
             # Should revoke the token issued to this access code
-            _sdb.revoke_all_tokens(_access_code)
+            _sdb.revoke_code_tokens(_access_code)
             return self.error_cls(error="access_denied",
                                   error_description="Access Code already used")
 
         if "openid" in _authn_req["scope"]:
-            userinfo = userinfo_in_id_token_claims(_context, _info)
+            _artifacts = request_artifacts(req)
+            userinfo = _artifacts.produce('id_token_userinfo',
+                                          userinfo_in_id_token_claims,
+                                          _context, _info)
 
             try:
                 _client_id = req['client_id']
@@ -140,6 +156,7 @@ class AccessToken(Endpoint):
                     error_description="Could not sign/encrypt id_token")
 
             _sdb.update_by_token(_access_code, id_token=_idtoken)
+            _artifacts['id_token'] = _idtoken
             _info = _sdb[_access_code]
 
         return by_schema(AccessTokenResponse, **_info)
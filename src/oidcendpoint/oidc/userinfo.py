@@ -4,12 +4,14 @@ import logging
 from cryptojwt.exception import UnknownAlgorithm
 
 from oidcmsg import oidc
-from cryptojwt.jwt import JWT
 from oidcmsg.message import Message
 from oidcmsg.oauth2 import ResponseMessage
 
+from oidcendpoint.artifacts import request_artifacts
 from oidcendpoint.endpoint import Endpoint
 from oidcendpoint.exception import OidcEndpointError
+from oidcendpoint.response_cache import ResponseCache
+from oidcendpoint.response_cache import claims_fingerprint
 from oidcendpoint.userinfo import collect_user_info
 from oidcendpoint.util import get_sign_and_encrypt_algorithms
 from oidcendpoint.util import OAUTH2_NOCACHE_HEADERS
@@ -25,6 +27,14 @@ class UserInfo(Endpoint):
     response_placement = 'body'
     endpoint_name = 'userinfo_endpoint'
 
+    def __init__(self, endpoint_context, **kwargs):
+        Endpoint.__init__(self, endpoint_context, **kwargs)
+        # Optionally keep signed and/or encrypted responses per access token
+        try:
+            self.response_cache = ResponseCache(**kwargs['response_cache'])
+        except KeyError:
+            self.response_cache = None
+
     def do_response(self, response_args=None, request=None, **kwargs):
 
         if 'error' in kwargs:
@@ -50,9 +60,21 @@ class UserInfo(Endpoint):
             except UnknownAlgorithm as err:
                 raise OidcEndpointError('Configuration error: {}'.format(err))
 
-            _jwt = JWT(_context.keyjar, **jwt_args)
-
-            resp = _jwt.pack(payload=response_args)
+            _signer = _context.signer_cache.get(kwargs['client_id'],
+                                                **jwt_args)
+            if self.response_cache is not None and 'expires_at' in kwargs:
+                _token = request['access_token']
+                _fp = claims_fingerprint(response_args, kwargs['client_id'],
+                                         jwt_args)
+                resp = self.response_cache.get(_token, _fp, _signer)
+                if resp is None:
+                    resp = _signer.pack(payload=response_args,
+                                        recv=kwargs['client_id'])
+                    self.response_cache.set(_token, _fp, resp,
+                                            kwargs['expires_at'], _signer)
+            else:
+                resp = _signer.pack(payload=response_args,
+                                    recv=kwargs['client_id'])
             content_type = 'application/jwt'
         else:
             if isinstance(response_args, dict):
@@ -70,17 +92,24 @@ class UserInfo(Endpoint):
         _sdb = self.endpoint_context.sdb
 
         # should be an access token
-        if not _sdb.is_token_valid(request['access_token']):
+        _tinfo, session = request_artifacts(request).produce(
+            'access_token_info', _sdb.read_valid_token,
+            request['access_token'], order=['access_token'])
+        if _tinfo is None or _tinfo['handler'] != _sdb.handler['access_token']:
+            if self.response_cache is not None:
+                self.response_cache.invalidate(request['access_token'])
             return self.error_cls(error="invalid_token",
                                   error_description="Invalid Token")
 
-        session = _sdb.read(request['access_token'])
-
         # Scope can translate to userinfo_claims
         info = collect_user_info(self.endpoint_context, session)
 
-        return {'response_args': info,
-                'client_id': session['authn_req']['client_id']}
+        res = {'response_args': info,
+               'client_id': session['authn_req']['client_id']}
+        if self.response_cache is not None:
+            # A cached response must not outlive the token
+            res['expires_at'] = int(_tinfo['exp'])
+        return res
 
     def parse_request(self, request, auth=None, **kwargs):
         """
@@ -93,6 +122,8 @@ class UserInfo(Endpoint):
 
         if not request:
             request = {}
+        if not isinstance(request, Message):
+            request = self.request_cls(**request)
 
         # Verify that the client is allowed to do this
         auth_info = self.client_authentication(request, auth, **kwargs)
@@ -101,5 +132,9 @@ class UserInfo(Endpoint):
         else:
             request['client_id'] = auth_info['client_id']
             request['access_token'] = auth_info['token']
+            # The token was validated while the client was authenticated
+            if 'token_info' in auth_info:
+                request_artifacts(request)['access_token_info'] = (
+                    auth_info['token_info'], auth_info['session_info'])
 
         return request
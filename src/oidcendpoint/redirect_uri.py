@@ -0,0 +1,126 @@
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qs
+from urllib.parse import unquote
+
+
+def normalize_query(query):
+    """
+    :param query: A query component parsed with parse_qs or None
+    :return: The query as a frozenset of (key, value) tuples
+    """
+    if not query:
+        return frozenset()
+    return frozenset((key, val) for key, vals in query.items() for val in vals)
+
+
+def freeze_redirect_uris(redirect_uris):
+    """
+    :param redirect_uris: A client's registered redirect URIs, a list of
+        (base, query) tuples
+    :return: The redirect URIs as a tuple of (base, normalized query) tuples
+    """
+    return tuple((base, normalize_query(query))
+                 for base, query in redirect_uris)
+
+
+def compile_redirect_uris(redirect_uris):
+    """
+    :param redirect_uris: A client's registered redirect URIs, a list of
+        (base, query) tuples
+    :return: Dictionary with base URIs as keys and the set of registered,
+        normalized, query components as values
+    """
+    return _compile(freeze_redirect_uris(redirect_uris))
+
+
+def _compile(frozen):
+    res = {}
+    for base, query in frozen:
+        res.setdefault(base, set()).add(query)
+    return res
+
+
+def split_redirect_uri(redirect_uri):
+    """
+    :param redirect_uri: A redirect URI, as received
+    :return: tuple of base URI, normalized query component and fragment,
+        the fragment is None if there is none, not even an empty one
+    """
+    _uri = unquote(redirect_uri)
+    _uri, _hash, _fragment = _uri.partition('#')
+    if not _hash:
+        _fragment = None
+    _base, _sep, _query = _uri.rpartition('?')
+    if not _sep:
+        return _uri, frozenset(), _fragment
+    return _base, normalize_query(parse_qs(_query)), _fragment
+
+
+class RedirectURIMatcher(object):
+    """
+    Keeps every client's registered redirect URIs compiled into a dictionary
+    keyed by base URI. A client's redirect URIs are compiled the first time
+    they are needed and again if the registration has changed, however it
+    was changed. At most *max_entries* clients are kept, the least recently
+    used are dropped first.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        # client_id -> (frozen registered redirect URIs, compiled)
+        self._db = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _compiled(self, client_id, redirect_uris):
+        # Checked against what is registered now, so a redirect URI that
+        # has been removed is never accepted
+        _frozen = freeze_redirect_uris(redirect_uris)
+        with self.lock:
+            try:
+                _registered, _compiled = self._db[client_id]
+            except KeyError:
+                pass
+            else:
+                if _registered == _frozen:
+                    self._db.move_to_end(client_id)
+                    return _compiled
+
+        _compiled = _compile(_frozen)
+        with self.lock:
+            self._db[client_id] = (_frozen, _compiled)
+            self._db.move_to_end(client_id)
+            while len(self._db) > self.max_entries:
+                self._db.popitem(last=False)
+        return _compiled
+
+    def match(self, client_id, redirect_uris, redirect_uri):
+        """
+        The base URI must exactly match a registered one and the query
+        component must contain exactly the registered query parameters.
+        No fragment is allowed.
+
+        :param client_id: Client ID
+        :param redirect_uris: The client's registered redirect URIs
+        :param redirect_uri: The redirect URI in the request
+        :return: True if the redirect URI matches a registered one
+        """
+        _base, _query, _fragment = split_redirect_uri(redirect_uri)
+        if _fragment is not None:
+            return False
+
+        try:
+            return _query in self._compiled(client_id, redirect_uris)[_base]
+        except KeyError:
+            return False
+
+    def invalidate(self, client_id=None):
+        """
+        :param client_id: The client whose redirect URIs have changed, all
+            clients if None
+        """
+        with self.lock:
+            if client_id is None:
+                self._db = OrderedDict()
+            else:
+                self._db.pop(client_id, None)
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def claims_fingerprint(response_args, *extra):
+    """
+    :param response_args: The claims that are returned, a dictionary or a
+        Message instance
+    :param extra: Other things the response depends on, must be JSON
+        serializable
+    :return: A digest that changes when the claims or extra changes
+    """
+    try:
+        response_args = response_args.to_dict()
+    except AttributeError:
+        pass
+    _str = json.dumps([response_args, extra], sort_keys=True)
+    return hashlib.sha256(_str.encode('utf-8')).hexdigest()
+
+
+class ResponseCache(object):
+    """
+    Keeps serialized, signed and/or encrypted, responses per access token.
+    There is at most one response per token, the one for the latest claims
+    fingerprint. A response is kept at most until the token expires and is
+    only returned if the fingerprint and the signer are the same as when
+    it was produced.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        # token -> (fingerprint, signer, expires, response)
+        self._db = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, token, fingerprint, signer=None):
+        """
+        :param token: Access token
+        :param fingerprint: Claims fingerprint
+        :param signer: What produced the response
+        :return: The cached response or None
+        """
+        with self.lock:
+            try:
+                _fp, _signer, _expires, _resp = self._db[token]
+            except KeyError:
+                return None
+
+            if _expires <= time.time():
+                del self._db[token]
+                return None
+            if _fp != fingerprint or _signer is not signer:
+                return None
+            self._db.move_to_end(token)
+            return _resp
+
+    def set(self, token, fingerprint, response, expires, signer=None):
+        """
+        :param token: Access token
+        :param fingerprint: Claims fingerprint
+        :param response: The serialized response
+        :param expires: When the token expires, seconds since epoch
+        :param signer: What produced the response
+        """
+        if expires <= time.time():
+            return
+
+        with self.lock:
+            self._db[token] = (fingerprint, signer, expires, response)
+            self._db.move_to_end(token)
+            while len(self._db) > self.max_entries:
+                self._db.popitem(last=False)
+
+    def invalidate(self, token):
+        """
+        Forget the response for a token, for instance because the token has
+        been revoked.
+
+        :param token: Access token
+        """
+        with self.lock:
+            self._db.pop(token, None)
+
+    def clear(self):
+        with self.lock:
+            self._db = OrderedDict()
+
+    def __len__(self):
+        return len(self._db)
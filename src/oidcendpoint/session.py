@@ -13,6 +13,8 @@ from oidcmsg.oidc import AuthorizationRequest
 
 from oidcendpoint import token_handler
 from oidcendpoint.authn_event import AuthnEvent
+from oidcendpoint.state_snapshot import read_snapshot
+from oidcendpoint.state_snapshot import write_snapshot
 from oidcendpoint.token_handler import ExpiredToken
 from oidcendpoint.token_handler import is_expired
 from oidcendpoint.token_handler import UnknownToken
@@ -128,7 +130,8 @@ class SessionDB(object):
     def create_authz_session(self, authn_event, areq, client_id='', **kwargs):
 
         sid = self.handler['code'].key(user=authn_event['uid'], areq=areq)
-        access_grant = self.handler['code'](sid=sid)
+        access_grant = self.handler['code'](
+            sid=sid, client_id=areq.get('client_id', client_id))
 
         _info = SessionInfo(code=access_grant, oauth_state='authz')
 
@@ -144,6 +147,64 @@ class SessionDB(object):
         self[sid] = _info
         return sid
 
+    def find_authz_session(self, uid, client_id):
+        """
+        Find an active session for a user and a client.
+
+        :param uid: User ID
+        :param client_id: Client ID
+        :return: A session ID or None if there is no active session
+        """
+        _sids = self.sso_db.get_sids_by_uid(uid)
+        if not _sids:
+            return None
+
+        for sid in reversed(_sids):
+            session_info = self[sid]
+            if session_info is None or 'revoked' in session_info:
+                continue
+            if session_info['authn_req']['client_id'] == client_id:
+                return sid
+        return None
+
+    def reuse_authz_session(self, sid, authn_event, areq, **kwargs):
+        """
+        Roll an existing session forward instead of creating a new one.
+        Tokens issued within the session are black listed and a new
+        access code is minted. The subject identifier is kept.
+
+        :param sid: Session ID
+        :param authn_event: The new authentication event
+        :param areq: The new authorization request
+        :return: The session ID
+        """
+        session_info = self[sid]
+
+        for typ in ['code', 'access_token', 'refresh_token']:
+            try:
+                self.handler[typ].black_list(session_info[typ])
+            except KeyError:
+                pass
+
+        for key in ["access_token", "access_token_scope", "token_type",
+                    "expires_in", "id_token", "oidreq", "refresh_token"]:
+            try:
+                del session_info[key]
+            except KeyError:
+                pass
+
+        session_info['code'] = self.handler['code'](
+            sid=sid, client_id=areq.get('client_id', ''))
+        session_info['oauth_state'] = 'authz'
+        session_info['authn_req'] = areq
+        session_info['authn_event'] = authn_event
+
+        if kwargs:
+            session_info.update(kwargs)
+
+        self[sid] = session_info
+        return sid
+
     def update(self, sid, **kwargs):
         """
         Add attribute value assertion to a special session
@@ -242,11 +303,7 @@ class SessionDB(object):
 
             if self.handler['code'].is_black_listed(grant):
                 # invalidate the released access token and refresh token
-                for item in ['access_token', 'refresh_token']:
-                    try:
-                        self.handler[item].black_list(session_info[item])
-                    except KeyError:
-                        pass
+                self.revoke_code_tokens(grant)
                 raise AccessCodeUsed(grant)
 
             # mint a new access token
@@ -314,32 +371,47 @@ class SessionDB(object):
         self[_sid] = session_info
         return session_info
 
-    def is_token_valid(self, token):
+    def read_valid_token(self, token, order=None):
         """
-        Checks validity of a given token
+        Checks the validity of a token and returns what's known about it
+        together with the session it belongs to. The token is decrypted
+        once and the session read once.
 
         :param token: Access or refresh token
+        :param order: The token types to try, in order
+        :return: tuple of token information and session information,
+            (None, None) if the token isn't valid
         """
-
         try:
-            _tinfo = self.handler.info(token)
+            _tinfo = self.handler.info(token, order)
         except KeyError:
-            return False
+            return None, None
 
         if is_expired(int(_tinfo['exp'])) or _tinfo['black_listed']:
-            return False
+            return None, None
 
-        # Dependent on what state the session is in.
-        session_info = self[_tinfo['sid']]
+        _info = self._db.get(_tinfo['sid'])
+        if not _info:
+            return None, None
+        session_info = SessionInfo().from_json(_info)
 
+        # Dependent on what state the session is in.
         if session_info["oauth_state"] == "authz":
             if _tinfo['handler'] != self.handler['code']:
-                return False
+                return None, None
         elif session_info["oauth_state"] == "token":
             if _tinfo['handler'] != self.handler['access_token']:
-                return False
+                return None, None
+
+        return _tinfo, session_info
 
-        return True
+    def is_token_valid(self, token):
+        """
+        Checks validity of a given token
+
+        :param token: Access or refresh token
+        """
+        return self.read_valid_token(token)[0] is not None
 
     def revoke_token(self, token, token_type=''):
         """
@@ -352,6 +424,26 @@ class SessionDB(object):
         else:
             self.handler.black_list(token)
 
+    def revoke_code_tokens(self, grant):
+        """
+        Revoke the access and refresh token issued in exchange for an
+        access code. If the session has been rolled forward, see
+        :py:meth:`reuse_authz_session`, after the code was issued those
+        tokens are already revoked and the ones in the session were issued
+        for a newer code, so they are left alone.
+
+        :param grant: The access code
+        """
+        _sinfo = self[grant]
+        if _sinfo.get('code') != grant:
+            return
+
+        for typ in ['access_token', 'refresh_token']:
+            try:
+                self.revoke_token(_sinfo[typ], typ)
+            except KeyError:
+                pass
+
     def revoke_all_tokens(self, token):
         _sinfo = self[token]
         for typ in self.handler.keys():
@@ -373,6 +465,21 @@ class SessionDB(object):
 
         self.update(sid, revoked=True)
 
+    def get_client_id_by_token(self, token):
+        """
+        Find the client a token was issued to without loading the session,
+        if the client ID is part of the token.
+
+        :param token: An access token, refresh token or access code
+        :return: Client ID
+        """
+        _tinfo = self.handler.info(
+            token, order=['access_token', 'refresh_token', 'code'])
+        try:
+            return _tinfo['client_id']
+        except KeyError:  # Token minted before client IDs were included
+            return self[_tinfo['sid']]['authn_req']['client_id']
+
     def get_client_id_for_session(self, sid):
         return self[sid]["client_id"]
 
@@ -455,6 +562,48 @@ class SessionDB(object):
         else:
             return self[_tinfo['sid']]
 
+    def snapshot(self, filename, background=False):
+        """
+        Write the session database, the SSO database and the token black
+        lists to a file. Only works with in memory databases.
+
+        :param filename: Name of the snapshot file
+        :param background: Write the snapshot in a background thread
+        :return: The writer, to give to
+            :py:func:`oidcendpoint.state_snapshot.wait_for_snapshot`, if
+            background is True otherwise 0
+        """
+        try:
+            state = {'session': self._db.db, 'sso': self.sso_db._db.db}
+        except AttributeError:
+            raise ValueError('Can only snapshot in memory databases')
+
+        state['black_list'] = {}
+        for typ in self.handler.keys():
+            try:
+                state['black_list'][typ] = self.handler[typ].blist
+            except AttributeError:
+                pass
+
+        return write_snapshot(filename, state, background=background)
+
+    def restore(self, filename):
+        """
+        Load the state saved by :py:meth:`snapshot`.
+        Replaces whatever is in the session and SSO databases.
+
+        :param filename: Name of the snapshot file
+        """
+        state = read_snapshot(filename)
+
+        self._db.db = state['session']
+        self.sso_db._db.db = state['sso']
+        for typ, blist in state['black_list'].items():
+            try:
+                self.handler[typ].blist = blist
+            except KeyError:
+                pass
+
     def find_sid(self, req):
         """
         Given a request with some info find the correct session
@@ -1,5 +1,8 @@
+import os
 import shelve
 
+from oidcendpoint.group_commit import GroupCommit
+
 __author__ = 'danielevertsson'
 
 
@@ -42,7 +45,124 @@ class ShelfWrapper(object):
         return shelve.open(self.filename, writeback=True)
 
 
-def open(filename):
+class PersistentShelfWrapper(object):
+    """
+    Keeps one shelve handle open for the lifetime of the instance.
+    Writes are kept in a dirty buffer and written to the shelf in one go
+    every *sync_every* writes or when *sync_interval* seconds has passed
+    since the first unsynced write, see
+    :py:class:`oidcendpoint.group_commit.GroupCommit`.
+    Repeated writes to the same key in between syncs are coalesced into one.
+
+    If *fsync* is True the database files are fsync'ed on every sync.
+    """
+
+    def __init__(self, filename, sync_every=100, sync_interval=1.0,
+                 fsync=False, background=False):
+        self.filename = filename
+        self.fsync = fsync
+        self._db = shelve.open(filename, writeback=False)
+        self._dirty = {}
+        self._deleted = set()
+        self._commit = GroupCommit(self._flush, max_ops=sync_every,
+                                   max_delay=sync_interval,
+                                   background=background)
+
+    def keys(self):
+        with self._commit.lock:
+            _keys = set(self._db.keys())
+            _keys.update(self._dirty.keys())
+            return list(_keys - self._deleted)
+
+    def __len__(self):
+        return len(self.keys())
+
+    def has_key(self, key):
+        return key in self
+
+    def __contains__(self, key):
+        with self._commit.lock:
+            if key in self._dirty:
+                return True
+            if key in self._deleted:
+                return False
+            return key in self._db
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __getitem__(self, key):
+        with self._commit.lock:
+            try:
+                return self._dirty[key]
+            except KeyError:
+                if key in self._deleted:
+                    raise
+            return self._db[key]
+
+    def __setitem__(self, key, value):
+        with self._commit.lock:
+            self._deleted.discard(key)
+            self._dirty[key] = value
+            self._commit.add()
+
+    def __delitem__(self, key):
+        with self._commit.lock:
+            if key not in self:
+                raise KeyError(key)
+            self._dirty.pop(key, None)
+            self._deleted.add(key)
+            self._commit.add()
+
+    def _flush(self):
+        for key, value in self._dirty.items():
+            self._db[key] = value
+        for key in self._deleted:
+            try:
+                del self._db[key]
+            except KeyError:
+                pass
+        self._dirty = {}
+        self._deleted = set()
+        self._db.sync()
+        if self.fsync:
+            for _name in [self.filename, self.filename + '.db',
+                          self.filename + '.dat', self.filename + '.dir']:
+                if os.path.exists(_name):
+                    _fd = os.open(_name, os.O_RDONLY)
+                    try:
+                        os.fsync(_fd)
+                    finally:
+                        os.close(_fd)
+
+    def sync(self):
+        """
+        Write all buffered changes to the shelf and flush it to disk.
+        Blocks until that is done.
+        """
+        self._commit.flush(force=True)
+
+    def flush_stats(self):
+        return self._commit.stats()
+
+    def close(self):
+        if self._db is None:
+            return
+        self._commit.close()
+        self._db.close()
+        self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def open(filename, persistent=False, **kwargs):
     """Open a persistent dictionary for reading and writing.
 
     The filename parameter is the base filename for the underlying
@@ -52,7 +172,13 @@ def open(filename):
     anydbm.open(). The optional protocol parameter specifies the
     version of the pickle protocol (0, 1, or 2).
 
+    If persistent is True a :py:class:`PersistentShelfWrapper` is returned
+    which keeps the database open and coalesces writes. Any extra keyword
+    arguments are passed on to it.
+
     See the module's __doc__ string for an overview of the interface.
     """
 
+    if persistent:
+        return PersistentShelfWrapper(filename, **kwargs)
     return ShelfWrapper(filename)
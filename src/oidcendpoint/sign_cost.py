@@ -0,0 +1,74 @@
+import logging
+import time
+
+from cryptojwt.jwk.asym import AsymmetricKey
+from cryptojwt.jws.jws import SIGNER_ALGS
+from cryptojwt.jws.utils import alg2keytype
+from cryptojwt.jwt import pick_key
+
+logger = logging.getLogger(__name__)
+
+
+def measure_sign_cost(keyjar, owners=('',), rounds=20, msg=None):
+    """
+    Measure how long it takes to sign with each asymmetric signing
+    algorithm there is a key for.
+
+    :param keyjar: A KeyJar instance
+    :param owners: The owners of the signing keys
+    :param rounds: How many signatures to make per algorithm
+    :param msg: What to sign, by default something the size of an ID token
+    :return: Dictionary with algorithm names as keys and the average time
+        per signature, in seconds, as values.
+    """
+    if msg is None:
+        msg = b'x' * 600
+
+    _keys = []
+    for owner in owners:
+        try:
+            _keys.extend(keyjar.get('sig', owner=owner))
+        except KeyError:
+            pass
+
+    res = {}
+    for alg in SIGNER_ALGS.keys():
+        if alg2keytype(alg) not in ['RSA', 'EC']:
+            continue
+
+        _key = None
+        for key in pick_key(_keys, 'sig', alg=alg):
+            if isinstance(key, AsymmetricKey) and key.private_key():
+                _key = key
+                break
+        if _key is None:
+            continue
+
+        _signer = SIGNER_ALGS[alg]
+        _priv = _key.private_key()
+        try:
+            _signer.sign(msg, _priv)
+        except Exception as err:  # Key not usable with this algorithm
+            logger.debug('Could not sign with %s: %s', alg, err)
+            continue
+
+        _start = time.perf_counter()
+        for _ in range(rounds):
+            _signer.sign(msg, _priv)
+        res[alg] = (time.perf_counter() - _start) / rounds
+
+    return res
+
+
+def cheapest_alg(cost, allowed):
+    """
+    :param cost: Signing cost per algorithm, as returned by
+        :py:func:`measure_sign_cost`
+    :param allowed: The algorithms that can be used
+    :return: The cheapest of the allowed algorithms or None if none of
+        them has been measured.
+    """
+    _measured = [alg for alg in allowed if alg in cost]
+    if not _measured:
+        return None
+    return min(_measured, key=lambda alg: cost[alg])
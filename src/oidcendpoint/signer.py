@@ -0,0 +1,230 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import Future
+
+from cryptojwt.jwe.jwe import JWE
+from cryptojwt.jwk.asym import AsymmetricKey
+from cryptojwt.jws.jws import SIGNER_ALGS
+from cryptojwt.jwt import JWT
+from cryptojwt.jwt import utc_time_sans_frac
+from cryptojwt.utils import b64encode_item
+
+from oidcendpoint.util import key_bundles_fingerprint
+
+
+class Signer(object):
+    """
+    Packs JWTs the same way as :py:meth:`cryptojwt.jwt.JWT.pack` but with the
+    signing key and the encoded JWS header resolved once, when the signer is
+    created. The receiver's encryption keys are kept until the receiver's
+    key bundles change. Asymmetric signatures are made by the executor, a
+    :py:class:`oidcendpoint.signing_executor.SigningExecutor`, if one is given.
+    """
+
+    def __init__(self, keyjar, iss='', sign=True, sign_alg='RS256',
+                 encrypt=False, enc_alg='RSA1_5', enc_enc='A128CBC-HS256',
+                 executor=None):
+        self.iss = iss
+        self.sign = sign
+        self.sign_alg = sign_alg
+        self.encrypt = encrypt
+        self.enc_alg = enc_alg
+        self.enc_enc = enc_enc
+        self.executor = executor
+        # receiver, key bundle fingerprint, encryption keys
+        self._enc_keys = None
+        self._jwt = JWT(keyjar, iss=iss, sign=sign, sign_alg=sign_alg,
+                        encrypt=encrypt, enc_alg=enc_alg, enc_enc=enc_enc)
+
+        self.key = None
+        self.header = {'alg': sign_alg}
+        if sign and sign_alg != 'none':
+            self.key = self._jwt.pack_key(iss)
+            if self.key.kid:
+                self.header['kid'] = self.key.kid
+        self._b64_header = b64encode_item(self.header).decode('utf-8')
+
+        # Only asymmetric signing is worth sending to another process
+        self._offload = executor is not None and isinstance(self.key,
+                                                            AsymmetricKey)
+
+    def _payload(self, payload, recv, aud, lifetime):
+        _args = {}
+        if payload is not None:
+            _args.update(payload)
+
+        _args['iss'] = self.iss
+        _args['iat'] = utc_time_sans_frac()
+        if lifetime:
+            _args['exp'] = _args['iat'] + lifetime
+        _aud = JWT.put_together_aud(recv, aud)
+        if _aud:
+            _args['aud'] = _aud
+
+        if self.sign and self.key is not None:
+            _args['kid'] = self.key.kid
+        return json.dumps(_args)
+
+    def _signing_input(self, msg):
+        return '.'.join(
+            [self._b64_header, b64encode_item(msg).decode('utf-8')])
+
+    def _signature(self, signing_input):
+        if isinstance(self.key, AsymmetricKey):
+            _key = self.key.private_key()
+        else:
+            _key = self.key.key
+        return SIGNER_ALGS[self.sign_alg].sign(signing_input.encode('utf-8'),
+                                               _key)
+
+    def _encryption_keys(self, recv):
+        _keyjar = self._jwt.key_jar
+        try:
+            _recv, _fp, _keys = self._enc_keys
+        except TypeError:  # Nothing cached yet
+            pass
+        else:
+            if _recv == recv and _fp and _fp == key_bundles_fingerprint(
+                    _keyjar, recv):
+                return _keys
+
+        # May cause the receiver's remote key bundles to be refreshed
+        _keys = JWE(alg=self.enc_alg, enc=self.enc_enc).pick_keys(
+            self._jwt.receiver_keys(recv, 'enc'), use='enc')
+        self._enc_keys = (recv, key_bundles_fingerprint(_keyjar, recv), _keys)
+        return _keys
+
+    def _finish(self, sjwt, recv):
+        if not self.encrypt:
+            return sjwt
+
+        if self.sign:
+            _jwe = JWE(sjwt, alg=self.enc_alg, enc=self.enc_enc, cty='JWT')
+        else:
+            _jwe = JWE(sjwt, alg=self.enc_alg, enc=self.enc_enc, cty='json')
+        return _jwe.encrypt(self._encryption_keys(recv), context='public')
+
+    def pack(self, payload=None, recv='', aud=None, lifetime=0):
+        """
+        :param payload: Information to be carried as payload in the JWT
+        :param recv: The intended immediate receiver
+        :param aud: Intended audience for this JWT
+        :param lifetime: Life time of the JWT in seconds
+        :return: A signed and/or encrypted JWT
+        """
+        _msg = self._payload(payload, recv, aud, lifetime)
+        if not self.sign:
+            return self._finish(_msg, recv)
+
+        _input = self._signing_input(_msg)
+        if self.key is None:
+            return self._finish(_input + '.', recv)
+
+        if self._offload:
+            sig = self.executor.sign(self.key, self.sign_alg,
+                                     _input.encode('utf-8'))
+        else:
+            sig = self._signature(_input)
+        return self._finish(
+            '.'.join([_input, b64encode_item(sig).decode('utf-8')]), recv)
+
+    def pack_async(self, payload=None, recv='', aud=None, lifetime=0,
+                   loop=None):
+        """
+        Like :py:meth:`pack` but returns an :py:class:`asyncio.Future`.
+        If there is a signing executor the event loop isn't blocked while
+        the signature is created.
+        """
+        if not self._offload:
+            _fut = Future()
+            try:
+                _fut.set_result(self.pack(payload, recv, aud, lifetime))
+            except Exception as err:
+                _fut.set_exception(err)
+            return asyncio.wrap_future(_fut, loop=loop)
+
+        _input = self._signing_input(
+            self._payload(payload, recv, aud, lifetime))
+        _res = Future()
+
+        def _done(fut):
+            try:
+                _sig = fut.result()
+                _res.set_result(self._finish(
+                    '.'.join([_input, b64encode_item(_sig).decode('utf-8')]),
+                    recv))
+            except Exception as err:
+                _res.set_exception(err)
+
+        self.executor.submit(self.key, self.sign_alg,
+                             _input.encode('utf-8')).add_done_callback(_done)
+        return asyncio.wrap_future(_res, loop=loop)
+
+
+class SignerCache(object):
+    """
+    Keeps one :py:class:`Signer` per client ID and algorithm combination.
+    All signers are dropped when the endpoint's own signing keys in the key
+    jar changes, the signers for a client can be dropped with
+    :py:meth:`invalidate` when the client's registration changes.
+
+    If there is a signing executor it's given the new keys when the keys
+    change.
+    """
+
+    def __init__(self, endpoint_context, executor=None):
+        self.endpoint_context = endpoint_context
+        self.executor = executor
+        self._db = {}
+        self._fingerprint = None
+        self.lock = threading.Lock()
+
+    def _own_keys_fingerprint(self):
+        _keyjar = self.endpoint_context.keyjar
+        return (key_bundles_fingerprint(_keyjar, ''),
+                key_bundles_fingerprint(_keyjar, self.endpoint_context.issuer))
+
+    def get(self, client_id, sign=True, sign_alg='RS256', encrypt=False,
+            enc_alg='RSA1_5', enc_enc='A128CBC-HS256'):
+        """
+        :param client_id: The client the JWT is for
+        :return: A :py:class:`Signer` instance
+        """
+        _fp = self._own_keys_fingerprint()
+        _key = (client_id, sign_alg if sign else None,
+                enc_alg if encrypt else None, enc_enc if encrypt else None)
+        with self.lock:
+            if _fp != self._fingerprint:
+                self._db = {}
+                self._fingerprint = _fp
+                _reload = True
+            else:
+                _reload = False
+            try:
+                return self._db[_key]
+            except KeyError:
+                pass
+
+        _executor = self.executor
+        if _executor is not None and _reload:
+            _executor.load_keys(self.endpoint_context.keyjar,
+                                owners=['', self.endpoint_context.issuer])
+
+        _signer = Signer(self.endpoint_context.keyjar,
+                         iss=self.endpoint_context.issuer, sign=sign,
+                         sign_alg=sign_alg, encrypt=encrypt, enc_alg=enc_alg,
+                         enc_enc=enc_enc, executor=_executor)
+        # Don't cache a signer if there was no fingerprint to compare with
+        if None not in _fp:
+            with self.lock:
+                self._db[_key] = _signer
+        return _signer
+
+    def invalidate(self, client_id=None):
+        with self.lock:
+            if client_id is None:
+                self._db = {}
+            else:
+                for _key in [k for k in self._db.keys() if k[0] == client_id]:
+                    del self._db[_key]
@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptojwt.jwk.asym import AsymmetricKey
+from cryptojwt.jws.jws import SIGNER_ALGS
+
+logger = logging.getLogger(__name__)
+
+# The private keys in a worker process, key ID -> private key
+_WORKER_KEYS = {}
+
+
+def _load_pem(pem):
+    return serialization.load_pem_private_key(pem, password=None,
+                                              backend=default_backend())
+
+
+def _load_worker_keys(keys):
+    for key_id, pem in keys:
+        _WORKER_KEYS[key_id] = _load_pem(pem)
+
+
+def _private_pem(key):
+    return key.private_key().private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption())
+
+
+def _worker_sign(key_id, alg, msg, pem=None):
+    try:
+        _key = _WORKER_KEYS[key_id]
+    except KeyError:
+        # A key that was added after the worker was started
+        _key = _WORKER_KEYS[key_id] = _load_pem(pem)
+    return SIGNER_ALGS[alg].sign(msg, _key)
+
+
+def _signing_keys(keyjar, owners):
+    """
+    :return: Dictionary with kid as key and a tuple of key ID, as used
+        by the workers, PEM and the key as value.
+    """
+    res = {}
+    for owner in owners:
+        try:
+            _bundles = keyjar.issuer_keys[owner]
+        except KeyError:
+            continue
+        for kb in _bundles:
+            for key in kb.keys():
+                if not isinstance(key, AsymmetricKey) or not key.kid:
+                    continue
+                if key.inactive_since or key.kid in res:
+                    continue
+                if key.private_key() is None:
+                    continue
+                _pem = _private_pem(key)
+                # The same kid could be used for another key later
+                _key_id = '{}:{}'.format(key.kid,
+                                         hashlib.sha256(_pem).hexdigest())
+                res[key.kid] = (_key_id, _pem, key)
+    return res
+
+
+def _sign(key, alg, msg):
+    return SIGNER_ALGS[alg].sign(msg, key.private_key())
+
+
+class SigningExecutor(object):
+    """
+    Creates asymmetric signatures in a pool of worker processes, so signing
+    isn't limited to the one core the GIL allows per process.
+
+    The pool is started once, by :py:meth:`start`, preferably before the
+    server starts any threads, since forking a multithreaded process can
+    deadlock. The private signing keys known then are passed as PEM to each
+    worker when it starts. Keys added later, see :py:meth:`load_keys`, are
+    passed along with the signatures they are used for and kept by the
+    worker. Otherwise only key IDs, algorithm names and the data to be
+    signed are passed per signature. Signing with a key that the workers
+    don't know about, or before the pool is started, is done in the calling
+    process. So is a signature the workers haven't made within *timeout*
+    seconds, a worker that dies takes its task with it.
+    """
+
+    def __init__(self, max_workers=None, timeout=5.0):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self._pool = None
+        # kid -> (key ID, PEM, key)
+        self._kids = {}
+        # The key IDs the workers got when they were started
+        self._preloaded = set()
+        self.lock = threading.Lock()
+
+    def start(self, keyjar=None, owners=('',)):
+        """
+        Start the pool of workers, if it's not already started.
+
+        :param keyjar: A KeyJar instance with the keys to give the workers
+        :param owners: The owners of the keys
+        """
+        if keyjar is None:
+            _keys = {}
+        else:
+            _keys = _signing_keys(keyjar, owners)
+
+        with self.lock:
+            if self._pool is not None:
+                return
+            self._pool = multiprocessing.Pool(
+                self.max_workers, initializer=_load_worker_keys,
+                initargs=([v[:2] for v in _keys.values()],))
+            self._kids = _keys
+            self._preloaded = set(v[0] for v in _keys.values())
+
+    def load_keys(self, keyjar, owners=('',)):
+        """
+        Use the private asymmetric keys of the given owners from now on.
+        No new worker processes are started.
+
+        :param keyjar: A KeyJar instance
+        :param owners: The owners of the keys
+        """
+        _keys = _signing_keys(keyjar, owners)
+        with self.lock:
+            self._kids = _keys
+
+    def submit(self, key, alg, msg):
+        """
+        :param key: The signing key
+        :param alg: The signing algorithm
+        :param msg: The bytes to be signed
+        :return: A :py:class:`concurrent.futures.Future` with the signature
+        """
+        _fut = Future()
+        with self.lock:
+            _pool = self._pool
+            try:
+                _key_id, _pem, _key = self._kids[key.kid]
+            except KeyError:
+                _offload = False
+            else:
+                _offload = _pool is not None and _key is key
+                if _key_id in self._preloaded:
+                    _pem = None
+
+        if not _offload:
+            logger.debug('Signing key kid=%s not loaded in workers', key.kid)
+            try:
+                _fut.set_result(_sign(key, alg, msg))
+            except Exception as err:
+                _fut.set_exception(err)
+            return _fut
+
+        _pool.apply_async(_worker_sign, (_key_id, alg, msg, _pem),
+                          callback=_fut.set_result,
+                          error_callback=_fut.set_exception)
+        return _fut
+
+    def sign(self, key, alg, msg):
+        """
+        Like :py:meth:`submit` but blocks until the signature is done, or
+        at most *timeout* seconds after which it's done in this process.
+
+        :return: The signature
+        """
+        try:
+            return self.submit(key, alg, msg).result(timeout=self.timeout)
+        except TimeoutError:
+            logger.warning('Signing in worker timed out, kid=%s', key.kid)
+            return _sign(key, alg, msg)
+
+    def sign_async(self, key, alg, msg, loop=None):
+        """
+        Like :py:meth:`submit` but returns an :py:class:`asyncio.Future`
+        which can be awaited in an event loop.
+        """
+        return asyncio.wrap_future(self.submit(key, alg, msg), loop=loop)
+
+    def close(self):
+        with self.lock:
+            _pool, self._pool, self._kids = self._pool, None, {}
+        if _pool is not None:
+            _pool.close()
+            _pool.join()
@@ -0,0 +1,111 @@
+import pickle
+import sqlite3
+
+from oidcendpoint.group_commit import GroupCommit
+
+
+class SqliteDataBase(object):
+    """
+    A key-value store backed by a SQLite table.
+    Implements both the :py:class:`oidcendpoint.in_memory_db.InMemoryDataBase`
+    interface (set/get/delete) and enough of the dictionary interface to be
+    used as a client database.
+
+    Writes are committed in groups, every *sync_every* writes or when
+    *sync_interval* seconds has passed since the first uncommitted write,
+    see :py:class:`oidcendpoint.group_commit.GroupCommit`.
+    The default is to commit every write. If *fsync* is True SQLite will
+    fsync on every commit.
+    """
+
+    def __init__(self, filename, table='kv', sync_every=1, sync_interval=0,
+                 fsync=True, background=False):
+        self.filename = filename
+        self.table = table
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        if fsync:
+            self._db.execute('PRAGMA synchronous=FULL')
+        else:
+            self._db.execute('PRAGMA synchronous=OFF')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS {} (key TEXT PRIMARY KEY, '
+            'value BLOB)'.format(table))
+        self._db.commit()
+        self._commit = GroupCommit(self._db.commit, max_ops=sync_every,
+                                   max_delay=sync_interval,
+                                   background=background)
+
+    def set(self, key, value):
+        with self._commit.lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO {} (key, value) VALUES (?, ?)'.format(
+                    self.table), (key, pickle.dumps(value)))
+            self._commit.add()
+
+    def get(self, key, default=None):
+        with self._commit.lock:
+            _row = self._db.execute(
+                'SELECT value FROM {} WHERE key = ?'.format(self.table),
+                (key,)).fetchone()
+        if _row is None:
+            return default
+        return pickle.loads(_row[0])
+
+    def delete(self, key):
+        with self._commit.lock:
+            _cur = self._db.execute(
+                'DELETE FROM {} WHERE key = ?'.format(self.table), (key,))
+            if not _cur.rowcount:
+                raise KeyError(key)
+            self._commit.add()
+
+    def keys(self):
+        with self._commit.lock:
+            return [k for (k,) in self._db.execute(
+                'SELECT key FROM {}'.format(self.table))]
+
+    def __len__(self):
+        with self._commit.lock:
+            return self._db.execute(
+                'SELECT COUNT(*) FROM {}'.format(self.table)).fetchone()[0]
+
+    def __contains__(self, key):
+        with self._commit.lock:
+            return self._db.execute(
+                'SELECT 1 FROM {} WHERE key = ?'.format(self.table),
+                (key,)).fetchone() is not None
+
+    def __getitem__(self, key):
+        _missing = object()
+        _val = self.get(key, _missing)
+        if _val is _missing:
+            raise KeyError(key)
+        return _val
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        self.delete(key)
+
+    def sync(self):
+        """
+        Commit all pending writes. Blocks until that is done.
+        """
+        self._commit.flush(force=True)
+
+    def flush_stats(self):
+        return self._commit.stats()
+
+    def close(self):
+        if self._db is None:
+            return
+        self._commit.close()
+        self._db.close()
+        self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
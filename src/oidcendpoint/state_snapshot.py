@@ -0,0 +1,109 @@
+import logging
+import os
+import pickle
+import threading
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+def _write(filename, state):
+    _tmp = '{}.{}.tmp'.format(filename, os.getpid())
+    with open(_tmp, 'wb') as fp:
+        pickle.dump({'version': SNAPSHOT_VERSION, 'state': state}, fp,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(_tmp, filename)
+
+
+def copy_state(value):
+    """
+    Copy dictionaries and lists, at every level, so the copy can be
+    written while request threads go on changing the original.
+    Each dictionary and list is copied in one C level operation, which
+    another thread can't interleave with, before its items are looked at.
+
+    :param value: The state or a part of it
+    :return: A copy
+    """
+    if isinstance(value, dict):
+        return {k: copy_state(v) for k, v in dict(value).items()}
+    if isinstance(value, list):
+        return [copy_state(v) for v in list(value)]
+    return value
+
+
+class SnapshotWriter(threading.Thread):
+    """
+    Writes a snapshot in a background thread.
+    """
+
+    def __init__(self, filename, state):
+        threading.Thread.__init__(self, daemon=True)
+        self.filename = filename
+        self.state = state
+        self.ok = False
+
+    def run(self):
+        try:
+            _write(self.filename, self.state)
+        except Exception as err:
+            logger.exception(err)
+        else:
+            self.ok = True
+
+
+def write_snapshot(filename, state, background=False):
+    """
+    Write a state snapshot to file. The state is copied first, so it may
+    be changed by other threads while the snapshot is taken.
+
+    If background is True the copy is written by a thread while the caller
+    continues.
+
+    :param filename: Where the snapshot should be written
+    :param state: A dictionary with picklable values
+    :param background: Whether the snapshot should be written by a
+        background thread.
+    :return: The :py:class:`SnapshotWriter` if background is True,
+        otherwise 0
+    """
+    _state = copy_state(state)
+    if background:
+        _writer = SnapshotWriter(filename, _state)
+        _writer.start()
+        return _writer
+
+    _write(filename, _state)
+    return 0
+
+
+def wait_for_snapshot(writer):
+    """
+    Wait for a background snapshot to finish.
+
+    :param writer: What :py:func:`write_snapshot` returned
+    :return: True if the snapshot was written successfully
+    """
+    if not writer:
+        return True
+    writer.join()
+    return writer.ok
+
+
+def read_snapshot(filename):
+    """
+    Read a snapshot written by :py:func:`write_snapshot`.
+
+    :param filename: The snapshot file
+    :return: The state dictionary
+    """
+    with open(filename, 'rb') as fp:
+        _info = pickle.load(fp)
+
+    if _info.get('version') != SNAPSHOT_VERSION:
+        raise ValueError('Unknown snapshot version: {}'.format(
+            _info.get('version')))
+    return _info['state']
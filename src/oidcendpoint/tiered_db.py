@@ -0,0 +1,158 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def _size(key, value):
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+
+class TieredDataBase(object):
+    """
+    A two tier database implementing the
+    :py:class:`oidcendpoint.in_memory_db.InMemoryDataBase` interface.
+
+    Recently used items are kept in memory as long as their combined size
+    stays below *max_bytes*. The least recently used items are spilled to
+    the cold database which can be any database with the same interface,
+    for instance a :py:class:`oidcendpoint.sqlite_db.SqliteDataBase`.
+    Items read from the cold database are moved back into memory.
+
+    Changed items are written to the cold database when they are spilled,
+    by :py:meth:`flush` and when a change is made while there are more than
+    *max_dirty* changed items in memory, or one changed more than
+    *max_dirty_age* seconds ago. Then the items changed longest ago are
+    written. With *write_through* every change is written at once.
+    """
+
+    def __init__(self, cold_db, max_bytes=64 * 1024 * 1024, max_dirty=1000,
+                 max_dirty_age=5.0, write_through=False):
+        self.cold = cold_db
+        self.max_bytes = max_bytes
+        self.max_dirty = max_dirty
+        self.max_dirty_age = max_dirty_age
+        self.write_through = write_through
+        self.resident_bytes = 0
+        # key -> value
+        self._hot = OrderedDict()
+        # key -> when it was first changed after it was last written, for
+        # the items that have changed, oldest first
+        self._dirty = OrderedDict()
+        self.hot_hits = 0
+        self.cold_hits = 0
+        self.misses = 0
+        # Protects _hot, _dirty, the counters and eviction
+        self.lock = threading.Lock()
+
+    def _add(self, key, value):
+        self._hot[key] = value
+        self.resident_bytes += _size(key, value)
+        self._evict()
+
+    def _remove(self, key):
+        value = self._hot.pop(key)
+        self.resident_bytes -= _size(key, value)
+        return value
+
+    def _write_back(self, key):
+        self.cold.set(key, self._hot[key])
+        del self._dirty[key]
+
+    def _evict(self):
+        while self.resident_bytes > self.max_bytes and len(self._hot) > 1:
+            key = next(iter(self._hot))
+            if key in self._dirty:
+                self._write_back(key)
+            self._remove(key)
+
+    def _write_back_old(self, now):
+        _before = now - self.max_dirty_age
+        while self._dirty:
+            key, since = next(iter(self._dirty.items()))
+            if len(self._dirty) <= self.max_dirty and since > _before:
+                break
+            self._write_back(key)
+
+    def set(self, key, value):
+        with self.lock:
+            _now = time.time()
+            if key in self._hot:
+                self._remove(key)
+            self._dirty.setdefault(key, _now)
+            self._add(key, value)
+            if self.write_through:
+                if key in self._dirty:
+                    self._write_back(key)
+            else:
+                self._write_back_old(_now)
+
+    def get(self, key):
+        with self.lock:
+            try:
+                value = self._hot[key]
+            except KeyError:
+                pass
+            else:
+                self._hot.move_to_end(key)
+                self.hot_hits += 1
+                return value
+
+            value = self.cold.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+
+            self.cold_hits += 1
+            # The cold database keeps its copy so there is no need to write
+            # it back on eviction unless it's changed.
+            self._add(key, value)
+            return value
+
+    def delete(self, key):
+        with self.lock:
+            _found = False
+            if key in self._hot:
+                self._remove(key)
+                self._dirty.pop(key, None)
+                _found = True
+            try:
+                self.cold.delete(key)
+            except KeyError:
+                if not _found:
+                    raise
+
+    def flush(self):
+        """
+        Write all changed in memory items to the cold database.
+        """
+        with self.lock:
+            while self._dirty:
+                self._write_back(next(iter(self._dirty)))
+
+    def stats(self):
+        """
+        :return: Dictionary with per tier hit rates and resident bytes
+        """
+        with self.lock:
+            return self._stats()
+
+    def _stats(self):
+        _lookups = self.hot_hits + self.cold_hits + self.misses
+        if _lookups:
+            _hot_rate = self.hot_hits / _lookups
+            _cold_rate = self.cold_hits / _lookups
+        else:
+            _hot_rate = _cold_rate = 0.0
+
+        return {
+            'hot_hits': self.hot_hits,
+            'cold_hits': self.cold_hits,
+            'misses': self.misses,
+            'hot_hit_rate': _hot_rate,
+            'cold_hit_rate': _cold_rate,
+            'resident_items': len(self._hot),
+            'dirty_items': len(self._dirty),
+            'resident_bytes': self.resident_bytes,
+            'max_bytes': self.max_bytes
+        }
@@ -63,6 +63,16 @@ def is_expired(exp, when=0):
     return when > exp
 
 
+def token_client_id(client_id='', sinfo=None, **kwargs):
+    if client_id:
+        return client_id
+
+    try:
+        return sinfo['authn_req']['client_id']
+    except (KeyError, TypeError):
+        return ''
+
+
 class Crypt(object):
     def __init__(self, password, mode=None):
         self.key = base64.urlsafe_b64encode(
@@ -129,6 +139,8 @@ class DefaultToken(Token):
         :param ttype: Type of token
         :param prev: Previous token, if there is one to go from
         :param sid: Session id
+        :param client_id: The client the token is issued to. If not given
+            it's picked from the session info, if that is given as *sinfo*.
         :return:
         """
         if not ttype and self.type:
@@ -146,9 +158,13 @@ class DefaultToken(Token):
         while rnd == tmp:  # Don't use the same random value again
             rnd = rndstr(32)  # Ultimate length multiple of 16
 
+        _parts = [rnd, ttype, sid, exp]
+        _client_id = token_client_id(**kwargs)
+        if _client_id:
+            _parts.append(_client_id)
+
         return base64.b64encode(
-            self.crypt.encrypt(lv_pack(rnd, ttype, sid, exp).encode())).decode(
-            "utf-8")
+            self.crypt.encrypt(lv_pack(*_parts).encode())).decode("utf-8")
 
     def key(self, user="", areq=None):
         """
@@ -177,7 +193,7 @@ class DefaultToken(Token):
         :param token: A token
         :return: dictionary with info about the token
         """
-        _res = dict(zip(['_id', 'type', 'sid', 'exp'],
+        _res = dict(zip(['_id', 'type', 'sid', 'exp', 'client_id'],
                         self.split_token(token)))
         if _res['type'] != self.type:
             raise WrongTokenType(_res['type'])
@@ -18,9 +18,22 @@ CMP_TYPE = ['exact', 'minimum', 'maximum', 'better']
 
 
 class AuthnBroker(object):
+    """
+    Keeps the authentication methods and which authentication class
+    references they are registered for.
+
+    Everything that's needed to pick a method, the candidate lists per
+    authentication class reference and comparison type, the method list and
+    the acr_values string, is computed when methods are added or removed.
+    """
+
     def __init__(self):
         self.db = {"info": {}, "key": {}}
         self.next = 0
+        # (acr, comparison type) -> [(method, acr), ...]
+        self._pick_table = {}
+        self._methods = []
+        self._acr_values = None
 
     @staticmethod
     def exact(a, b):
@@ -65,7 +78,13 @@ class AuthnBroker(object):
         except KeyError:
             self.db["key"][acr] = [_ref]
 
+        self._rebuild()
+
     def remove(self, acr, method=None, level=0, authn_authority=""):
+        """
+        Removes the authentication methods registered for an acr that match
+        all of the given method, level and authn_authority.
+        """
         try:
             _refs = self.db["key"][acr]
         except KeyError:
@@ -74,15 +93,34 @@ class AuthnBroker(object):
             _remain = []
             for _ref in _refs:
                 item = self.db["info"][_ref]
-                if method and method != item["method"]:
-                    _remain.append(_ref)
-                if level and level != item["level"]:
-                    _remain.append(_ref)
-                if authn_authority and authn_authority != item[
-                        "authn_authority"]:
+                if (method and method != item["method"]) or (
+                        level and level != item["level"]) or (
+                        authn_authority and
+                        authn_authority != item["authn_auth"]):
                     _remain.append(_ref)
+                else:
+                    del self.db["info"][_ref]
             if _remain:
-                self.db[acr] = _remain
+                self.db["key"][acr] = _remain
+            else:
+                del self.db["key"][acr]
+
+        self._rebuild()
+
+    def _rebuild(self):
+        _table = {}
+        for acr in self.db["key"].keys():
+            for comparision_type in CMP_TYPE:
+                _table[(acr, comparision_type)] = self._pick_by_class_ref(
+                    acr, comparision_type)
+        self._pick_table = _table
+
+        self._methods = [(info["method"], info["ref"]) for info in
+                         self.db["info"].values()]
+        if self._methods:
+            self._acr_values = " ".join(ref for _, ref in self._methods)
+        else:
+            self._acr_values = None
 
     @staticmethod
     def _cmp(item0, item1):
@@ -156,9 +194,15 @@ class AuthnBroker(object):
 
         if acr is None:
             # Anything else doesn't make sense
-            return self._pick_by_class_ref(UNSPECIFIED, "minimum")
-        else:
-            return self._pick_by_class_ref(acr, comparision_type)
+            acr = UNSPECIFIED
+            comparision_type = "minimum"
+
+        try:
+            return list(self._pick_table[(acr, comparision_type)])
+        except KeyError:
+            if comparision_type not in CMP_TYPE:
+                raise AttributeError(comparision_type)
+            return []
 
     @staticmethod
     def match(requested, provided):
@@ -168,30 +212,19 @@ class AuthnBroker(object):
             return False
 
     def __getitem__(self, item):
-        i = 0
-        for key, info in self.db["info"].items():
-            if i == item:
-                return info["method"], info["ref"]
-            i += 1
-
-        raise IndexError()
+        if item < 0:
+            raise IndexError()
+        return self._methods[item]
 
     def getAcrValuesString(self):
-        acr_values = None
-        for item in self.db["info"].values():
-            if acr_values is None:
-                acr_values = item["ref"]
-            else:
-                acr_values += " " + item["ref"]
-        return acr_values
+        return self._acr_values
 
     def __iter__(self):
-        for item in self.db["info"].values():
-            yield item["method"]
-        raise StopIteration
+        for method, _ in self._methods:
+            yield method
 
     def __len__(self):
-        return len(self.db["info"].keys())
+        return len(self._methods)
 
 
 def pick_auth(endpoint_context, areq, comparision_type=""):
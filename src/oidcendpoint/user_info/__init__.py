@@ -1,17 +1,46 @@
 import copy
 import json
 
+from oidcendpoint.user_info.indexed import IndexedUserDB
+from oidcendpoint.user_info.reload import ReloadingUserDB
+
 __author__ = 'rolandh'
 
 
 class UserInfo(object):
     """ Read only interface to a user info store """
 
-    def __init__(self, db=None, db_file=''):
+    def __init__(self, db=None, db_file='', indexed=False, index_file='',
+                 cache_size=1000, reload=False, reload_interval=5.0,
+                 incremental=False):
+        """
+        :param db: Dictionary like user database
+        :param db_file: JSON file with the user database
+        :param indexed: If True the users in db_file are read from an index,
+            when they are asked for, instead of all being loaded at startup.
+            See :py:class:`oidcendpoint.user_info.indexed.IndexedUserDB`.
+        :param index_file: Where the index is kept, default is db_file with
+            '.idx' added.
+        :param cache_size: How many users from the index to keep in memory
+        :param reload: If True db_file is read again when it changes.
+            See :py:class:`oidcendpoint.user_info.reload.ReloadingUserDB`.
+        :param reload_interval: How often, in seconds, to check db_file
+        :param incremental: On reload, find out which users changed
+        """
         if db is not None:
             self.db = db
         elif db_file:
-            self.db = json.loads(open(db_file).read())
+            if reload:
+                self.db = ReloadingUserDB(
+                    db_file, interval=reload_interval, indexed=indexed,
+                    index_file=index_file, cache_size=cache_size,
+                    incremental=incremental)
+            elif indexed:
+                self.db = IndexedUserDB(db_file, index_file=index_file,
+                                        cache_size=cache_size)
+            else:
+                with open(db_file, encoding='utf-8') as fp:
+                    self.db = json.load(fp)
         else:
             self.db = {}
 
@@ -44,6 +73,12 @@ class UserInfo(object):
 
     def __call__(self, user_id, client_id, user_info_claims=None, **kwargs):
         try:
-            return self.filter(self.db[user_id], user_info_claims)
+            if user_info_claims is not None and isinstance(
+                    self.db, (IndexedUserDB, ReloadingUserDB)):
+                # Only read the claims that are asked for
+                _info = self.db.get_claims(user_id, user_info_claims.keys())
+            else:
+                _info = self.db[user_id]
         except KeyError:
             return {}
+        return self.filter(_info, user_info_claims)
@@ -0,0 +1,131 @@
+import copy
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+
+def _claims_key(user_info_claims):
+    if user_info_claims is None:
+        return None
+    try:
+        user_info_claims = user_info_claims.to_dict()
+    except AttributeError:
+        pass
+    return json.dumps(user_info_claims, sort_keys=True)
+
+
+class CachedUserInfo(object):
+    """
+    Caches what a user info source, anything that can be called like
+    :py:class:`oidcendpoint.user_info.UserInfo`, returns.
+
+    Answers are kept per user for *ttl* seconds. When several threads ask
+    for the same thing at the same time only one of them asks the source,
+    the others wait for its answer. :py:meth:`invalidate` drops everything
+    kept about a user.
+    """
+
+    def __init__(self, source, ttl=60, max_users=10000):
+        self.source = source
+        self.ttl = ttl
+        self.max_users = max_users
+        # uid -> {(client_id, claims): (expires, info)}
+        self._db = {}
+        # (uid, client_id, claims) -> Future
+        self._inflight = {}
+        # Bumped when cached information is dropped, so that what is read
+        # from the source at the same time isn't kept.
+        self._epoch = 0
+        self._generation = {}
+        self.lock = threading.Lock()
+
+    def _expire(self, now):
+        for uid in [u for u, entries in self._db.items() if
+                    all(e[0] <= now for e in entries.values())]:
+            del self._db[uid]
+        if len(self._db) >= self.max_users:
+            self._db = {}
+
+    def __call__(self, user_id, client_id, user_info_claims=None, **kwargs):
+        _sub_key = (client_id, _claims_key(user_info_claims))
+        _key = (user_id,) + _sub_key
+        _now = time.time()
+
+        with self.lock:
+            try:
+                _expires, _info = self._db[user_id][_sub_key]
+            except KeyError:
+                pass
+            else:
+                if _expires > _now:
+                    return copy.copy(_info)
+
+            try:
+                _fut = self._inflight[_key]
+            except KeyError:
+                _fut = self._inflight[_key] = Future()
+                _owner = True
+                _generation = (self._epoch, self._generation.get(user_id, 0))
+            else:
+                _owner = False
+
+        if not _owner:
+            return copy.copy(_fut.result())
+
+        try:
+            _info = self.source(user_id, client_id, user_info_claims, **kwargs)
+        except Exception as err:
+            with self.lock:
+                del self._inflight[_key]
+            _fut.set_exception(err)
+            raise
+
+        with self.lock:
+            del self._inflight[_key]
+            # Don't keep what was read before an invalidation
+            if (self._epoch, self._generation.get(user_id, 0)) == _generation:
+                if user_id not in self._db and len(
+                        self._db) >= self.max_users:
+                    self._expire(_now)
+                self._db.setdefault(user_id, {})[_sub_key] = (
+                    time.time() + self.ttl, _info)
+        _fut.set_result(_info)
+        return copy.copy(_info)
+
+    def invalidate(self, user_id):
+        """
+        Forget everything known about a user, for instance because the
+        user's information has been changed.
+
+        :param user_id: User ID
+        """
+        with self.lock:
+            self._db.pop(user_id, None)
+            if any(k[0] == user_id for k in self._inflight.keys()):
+                self._generation[user_id] = self._generation.get(user_id,
+                                                                 0) + 1
+            elif user_id in self._generation:
+                del self._generation[user_id]
+
+    def clear(self):
+        with self.lock:
+            self._db = {}
+            self._epoch += 1
+
+    def users_changed(self, user_ids=None):
+        """
+        Drop what's known about users whose information has changed.
+
+        :param user_ids: The changed users, None if it's not known which
+            users changed.
+        """
+        if user_ids is None:
+            self.clear()
+        else:
+            for uid in user_ids:
+                self.invalidate(uid)
+
+    def __getattr__(self, item):
+        # Let the source's other attributes, like db and filter, through
+        return getattr(self.source, item)
@@ -0,0 +1,190 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+INDEX_VERSION = 1
+
+
+def build_index(db_file, index_file):
+    """
+    Build a SQLite index from a JSON user database. There is one row per
+    user and claim, so single claims can be read without decoding the
+    rest of the user's information.
+
+    :param db_file: JSON file with user IDs as keys and claims as values
+    :param index_file: Where the index should be written
+    """
+    with open(db_file, encoding='utf-8') as fp:
+        _users = json.load(fp)
+    _stat = os.stat(db_file)
+
+    _tmp = '{}.{}.tmp'.format(index_file, os.getpid())
+    _db = sqlite3.connect(_tmp)
+    try:
+        _db.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+        _db.execute('CREATE TABLE claims (user_id TEXT, claim TEXT, '
+                    'value TEXT, PRIMARY KEY (user_id, claim))')
+        _db.executemany(
+            'INSERT INTO claims (user_id, claim, value) VALUES (?, ?, ?)',
+            ((uid, claim, json.dumps(val))
+             for uid, info in _users.items() for claim, val in info.items()))
+        # users without any claims
+        _db.executemany(
+            'INSERT INTO claims (user_id, claim, value) VALUES (?, "", NULL)',
+            ((uid,) for uid, info in _users.items() if not info))
+        _db.executemany('INSERT INTO meta (key, value) VALUES (?, ?)', [
+            ('version', str(INDEX_VERSION)),
+            ('source_mtime', repr(_stat.st_mtime)),
+            ('source_size', str(_stat.st_size))])
+        _db.commit()
+    finally:
+        _db.close()
+    os.replace(_tmp, index_file)
+
+
+def _index_is_current(db_file, index_file):
+    if not os.path.exists(index_file):
+        return False
+
+    try:
+        _db = sqlite3.connect(index_file)
+    except sqlite3.Error:
+        return False
+    try:
+        _meta = dict(_db.execute('SELECT key, value FROM meta'))
+    except sqlite3.Error:
+        return False
+    finally:
+        _db.close()
+
+    _stat = os.stat(db_file)
+    return _meta.get('version') == str(INDEX_VERSION) and \
+        _meta.get('source_mtime') == repr(_stat.st_mtime) and \
+        _meta.get('source_size') == str(_stat.st_size)
+
+
+class IndexedUserDB(object):
+    """
+    Read only, dictionary like, user database where the users are read
+    from a SQLite index built from a JSON file, when they are asked for.
+    The index is only rebuilt if the JSON file has changed since it was
+    built. At most *cache_size* users are kept in memory.
+    """
+
+    def __init__(self, db_file, index_file='', cache_size=1000):
+        self.db_file = db_file
+        self.index_file = index_file or '{}.idx'.format(db_file)
+        self.cache_size = cache_size
+        if not _index_is_current(db_file, self.index_file):
+            build_index(db_file, self.index_file)
+
+        self._db = sqlite3.connect(self.index_file, check_same_thread=False)
+        # user_id -> (claims, missing claims, complete)
+        self._cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _cache_get(self, user_id):
+        try:
+            _entry = self._cache[user_id]
+        except KeyError:
+            return None
+        self._cache.move_to_end(user_id)
+        return _entry
+
+    def _cache_set(self, user_id, entry):
+        self._cache[user_id] = entry
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _select(self, user_id, claims=None):
+        if claims is None:
+            return self._db.execute(
+                'SELECT claim, value FROM claims WHERE user_id = ?',
+                (user_id,)).fetchall()
+
+        _claims = list(claims)
+        return self._db.execute(
+            'SELECT claim, value FROM claims WHERE user_id = ? AND claim '
+            'IN ({})'.format(','.join('?' * len(_claims))),
+            [user_id] + _claims).fetchall()
+
+    def _exists(self, user_id):
+        return self._db.execute(
+            'SELECT 1 FROM claims WHERE user_id = ? LIMIT 1',
+            (user_id,)).fetchone() is not None
+
+    def _load(self, user_id, claims, entry):
+        if entry is None:
+            _known, _missing, _complete = {}, set(), False
+        else:
+            _known, _missing, _complete = entry
+
+        if _complete:
+            return entry
+
+        if claims is None:
+            _rows = self._select(user_id)
+            if not _rows:
+                raise KeyError(user_id)
+            return {c: json.loads(v) for c, v in _rows if c}, set(), True
+
+        _fetch = [c for c in claims if c not in _known and c not in _missing]
+        if not _fetch:
+            return entry
+
+        _rows = self._select(user_id, _fetch)
+        if entry is None and not _rows and not self._exists(user_id):
+            raise KeyError(user_id)
+
+        _known = dict(_known)
+        _known.update({c: json.loads(v) for c, v in _rows})
+        return _known, _missing.union(set(_fetch) - set(_known)), False
+
+    def get_claims(self, user_id, claims=None):
+        """
+        :param user_id: User ID
+        :param claims: The claims that are asked for, all if None
+        :return: Dictionary with those of the asked for claims the user has
+        :raise KeyError: If the user isn't known
+        """
+        with self.lock:
+            _entry = self._load(user_id, claims, self._cache_get(user_id))
+            self._cache_set(user_id, _entry)
+
+        _known = _entry[0]
+        if claims is None:
+            return dict(_known)
+        return {c: _known[c] for c in claims if c in _known}
+
+    def __getitem__(self, user_id):
+        return self.get_claims(user_id)
+
+    def get(self, user_id, default=None):
+        try:
+            return self[user_id]
+        except KeyError:
+            return default
+
+    def __contains__(self, user_id):
+        with self.lock:
+            if user_id in self._cache:
+                return True
+            return self._exists(user_id)
+
+    def keys(self):
+        with self.lock:
+            return [u for (u,) in self._db.execute(
+                'SELECT DISTINCT user_id FROM claims')]
+
+    def __len__(self):
+        with self.lock:
+            return self._db.execute(
+                'SELECT COUNT(DISTINCT user_id) FROM claims').fetchone()[0]
+
+    def close(self):
+        # Not while someone is reading
+        with self.lock:
+            self._db.close()
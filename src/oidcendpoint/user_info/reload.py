@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from oidcendpoint.user_info.indexed import IndexedUserDB
+
+logger = logging.getLogger(__name__)
+
+
+def file_signature(path):
+    """
+    :param path: Path to a file
+    :return: Something that changes when the file is modified or replaced,
+        None if the file doesn't exist.
+    """
+    try:
+        _stat = os.stat(path)
+    except OSError:
+        return None
+    return _stat.st_ino, _stat.st_size, _stat.st_mtime_ns
+
+
+def diff_users(old, new):
+    """
+    Find the users that have been added, removed or changed. Unchanged
+    users in *new* are replaced by the same users in *old*, so the copies
+    just read can be freed.
+
+    :param old: The user database in use
+    :param new: The user database just read
+    :return: Set of user IDs
+    """
+    _changed = set(old.keys()) - set(new.keys())
+    for uid, info in new.items():
+        try:
+            _old = old[uid]
+        except KeyError:
+            _changed.add(uid)
+        else:
+            if _old == info:
+                new[uid] = _old
+            else:
+                _changed.add(uid)
+    return _changed
+
+
+class ReloadingUserDB(object):
+    """
+    Dictionary like user database read from a JSON file that is read again
+    when the file changes, without restarting the process.
+
+    A daemon thread checks the file's inode, size and modification time
+    every *interval* seconds. When the file has changed it's read, or
+    indexed if *indexed* is True, in that thread and the result replaces
+    the database in use in one assignment. Requests are handled using the
+    old database until then. If the new file can't be read the old database
+    is kept and reading is tried again at the next check. A replaced
+    indexed database is closed at the first check at least *interval*
+    seconds later, when no request should be using it anymore.
+
+    Without *indexed* the new file is read completely before it replaces
+    the old database, so while reloading both are in memory. Use *indexed*
+    if the user database is too big for that.
+
+    With *incremental* the new database is compared with the old one, user
+    by user, and unchanged users are shared between them. Listeners, added
+    with :py:meth:`add_listener`, are then told which users changed instead
+    of being told that everything did.
+    """
+
+    def __init__(self, db_file, interval=5.0, indexed=False, index_file='',
+                 cache_size=1000, incremental=False, background=True):
+        self.db_file = db_file
+        self.interval = interval
+        self.indexed = indexed
+        self.index_file = index_file
+        self.cache_size = cache_size
+        self.incremental = incremental and not indexed
+        self.listeners = []
+        self.reloads = 0
+        # (time replaced, database) of replaced databases not yet closed
+        self._retired = []
+        self.lock = threading.Lock()
+
+        self._signature = file_signature(db_file)
+        self._db = self._load()
+        self._closed = threading.Event()
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _load(self):
+        if self.indexed:
+            return IndexedUserDB(self.db_file, index_file=self.index_file,
+                                 cache_size=self.cache_size)
+        with open(self.db_file, encoding='utf-8') as fp:
+            return json.load(fp)
+
+    def add_listener(self, func):
+        """
+        :param func: Called as func(user_ids) after a reload, user_ids is
+            the set of changed users or None if all users may have changed.
+        """
+        self.listeners.append(func)
+
+    def check(self):
+        """
+        Reload the database if the file has changed.
+
+        :return: True if the database was reloaded
+        """
+        with self.lock:
+            return self._check()
+
+    def _close_retired(self, before):
+        _keep = []
+        for replaced, _db in self._retired:
+            if replaced <= before:
+                _db.close()
+            else:
+                _keep.append((replaced, _db))
+        self._retired = _keep
+
+    def _check(self):
+        self._close_retired(time.time() - self.interval)
+
+        _signature = file_signature(self.db_file)
+        if _signature is None or _signature == self._signature:
+            return False
+
+        try:
+            _new = self._load()
+        except (OSError, ValueError) as err:
+            logger.warning('Could not reload {}: {}'.format(self.db_file,
+                                                            err))
+            return False
+
+        if self.incremental:
+            _changed = diff_users(self._db, _new)
+        else:
+            _changed = None
+
+        _old = self._db
+        self._db = _new
+        if isinstance(_old, IndexedUserDB):
+            self._retired.append((time.time(), _old))
+        self._signature = _signature
+        self.reloads += 1
+        logger.info('Reloaded {}'.format(self.db_file))
+
+        for func in self.listeners:
+            try:
+                func(_changed)
+            except Exception as err:
+                logger.exception(err)
+        return True
+
+    def _run(self):
+        while not self._closed.wait(self.interval):
+            try:
+                self.check()
+            except Exception as err:
+                logger.exception(err)
+
+    def close(self):
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self.lock:
+            self._close_retired(time.time())
+            if isinstance(self._db, IndexedUserDB):
+                self._db.close()
+
+    def get_claims(self, user_id, claims=None):
+        """
+        :param user_id: User ID
+        :param claims: The claims that are asked for, all if None
+        :return: Dictionary with those of the asked for claims the user has
+        :raise KeyError: If the user isn't known
+        """
+        _db = self._db
+        if isinstance(_db, IndexedUserDB):
+            return _db.get_claims(user_id, claims)
+
+        _info = _db[user_id]
+        if claims is None:
+            return _info
+        return {c: _info[c] for c in claims if c in _info}
+
+    def __getitem__(self, user_id):
+        return self._db[user_id]
+
+    def get(self, user_id, default=None):
+        return self._db.get(user_id, default)
+
+    def __contains__(self, user_id):
+        return user_id in self._db
+
+    def keys(self):
+        return self._db.keys()
+
+    def __len__(self):
+        return len(self._db)
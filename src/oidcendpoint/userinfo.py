@@ -1,4 +1,7 @@
+import json
 import logging
+import threading
+from collections import OrderedDict
 
 from oidcservice import sanitize
 from oidcmsg.oidc import Claims
@@ -102,6 +105,84 @@ def by_schema(cls, **kwa):
     return dict([(key, val) for key, val in kwa.items() if key in cls.c_param])
 
 
+def _claims_request_key(session, about):
+    try:
+        _claims = session['authn_req']["claims"][about]
+    except (KeyError, TypeError):
+        return None
+
+    try:
+        _claims = _claims.to_dict()
+    except AttributeError:
+        pass
+    return json.dumps(_claims, sort_keys=True)
+
+
+def compile_claims_plan(session):
+    """
+    Work out which claims should be returned from the userinfo endpoint
+    given the scope, the permissions and the claims request in the session.
+
+    :param session: Session information
+    :return: A :py:class:`oidcmsg.oidc.Claims` instance or None
+    """
+    authn_req = session['authn_req']
+    uic = scope2claims(authn_req["scope"])
+
+    # Get only keys allowed by user and update the dict if such info
+    # is stored in session
+    perm_set = session.get('permission')
+    if perm_set:
+        uic = {key: uic[key] for key in uic if key in perm_set}
+
+    uic = update_claims(session, "userinfo", uic)
+
+    if uic:
+        return Claims(**uic)
+    return None
+
+
+class ClaimsPlanCache(object):
+    """
+    Keeps the result of :py:func:`compile_claims_plan` per scope, permission
+    and claims request combination. At most *max_entries* are kept, the
+    least recently used are dropped first.
+
+    The cached Claims instances are shared and must not be modified.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._db = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, session):
+        """
+        :param session: Session information
+        :return: A :py:class:`oidcmsg.oidc.Claims` instance or None
+        """
+        _perm = session.get('permission')
+        _key = (tuple(sorted(session['authn_req']['scope'])),
+                tuple(sorted(_perm)) if _perm else None,
+                _claims_request_key(session, "userinfo"))
+
+        with self.lock:
+            try:
+                _plan = self._db[_key]
+            except KeyError:
+                pass
+            else:
+                self._db.move_to_end(_key)
+                return _plan
+
+        _plan = compile_claims_plan(session)
+        with self.lock:
+            self._db[_key] = _plan
+            while len(self._db) > self.max_entries:
+                self._db.popitem(last=False)
+        return _plan
+
+
 def collect_user_info(endpoint_context, session, userinfo_claims=None):
     """
     Collect information about a user.
@@ -115,23 +196,10 @@ def collect_user_info(endpoint_context, session, userinfo_claims=None):
     authn_req = session['authn_req']
 
     if userinfo_claims is None:
-        uic = scope2claims(authn_req["scope"])
-
-        # Get only keys allowed by user and update the dict if such info
-        # is stored in session
-        perm_set = session.get('permission')
-        if perm_set:
-            uic = {key: uic[key] for key in uic if key in perm_set}
-
-        uic = update_claims(session, "userinfo", uic)
-
-        if uic:
-            userinfo_claims = Claims(**uic)
-        else:
-            userinfo_claims = None
-
-        logger.debug(
-            "userinfo_claim: %s" % sanitize(userinfo_claims.to_dict()))
+        userinfo_claims = endpoint_context.claims_plan_cache.get(session)
+        if userinfo_claims is not None:
+            logger.debug(
+                "userinfo_claim: %s" % sanitize(userinfo_claims.to_dict()))
 
     logger.debug("Session info: %s" % sanitize(session))
 
@@ -144,10 +212,18 @@ def collect_user_info(endpoint_context, session, userinfo_claims=None):
     info = endpoint_context.userinfo(uid, authn_req['client_id'],
                                      userinfo_claims)
 
-    if "sub" in userinfo_claims:
+    if userinfo_claims is not None and "sub" in userinfo_claims:
         if not claims_match(session["sub"], userinfo_claims["sub"]):
             raise FailedAuthentication("Unmatched sub claim")
 
+    # Claims the user info source didn't have may be available as
+    # aggregated or distributed claims
+    if userinfo_claims is not None and endpoint_context.claims_sources:
+        _missing = [c for c in userinfo_claims.keys() if c not in info]
+        if _missing:
+            info.update(endpoint_context.claims_sources.collect(
+                uid, authn_req['client_id'], _missing))
+
     info["sub"] = session["sub"]
     try:
         logger.debug("user_info_response: {}".format(info))
@@ -1,8 +1,11 @@
 import logging
+import time
 from http.cookies import SimpleCookie
 
 from cryptojwt.exception import UnknownAlgorithm
 
+from oidcendpoint.sign_cost import cheapest_alg
+
 logger = logging.getLogger(__name__)
 
 OAUTH2_NOCACHE_HEADERS = [
@@ -26,6 +29,32 @@ DEF_SIGN_ALG = {"id_token": "RS256",
                 "private_key_jwt": "RS256"}
 
 
+def cost_aware_sign_alg(endpoint_context, client_info, payload_type):
+    """
+    If the signing cost per algorithm has been measured, pick the cheapest
+    of the algorithms the client has said it can handle. That is the
+    <payload_type>_signing_alg_values_supported client metadata, which the
+    registration endpoint limits to algorithms this provider supports and
+    has keys for, see
+    :py:data:`oidcendpoint.oidc.registration.SIGNING_ALG_PREFERENCES`.
+
+    :return: An algorithm name or None
+    """
+    _cost = endpoint_context.sign_alg_cost
+    if not _cost:
+        return None
+
+    try:
+        _allowed = client_info[
+            "{}_signing_alg_values_supported".format(payload_type)]
+    except KeyError:
+        return None
+    if isinstance(_allowed, str):
+        _allowed = [_allowed]
+
+    return cheapest_alg(_cost, _allowed)
+
+
 def get_sign_and_encrypt_algorithms(endpoint_context, client_info, payload_type,
                                     sign=False, encrypt=False):
     args = {'sign': sign, 'encrypt': encrypt}
@@ -37,7 +66,10 @@ def get_sign_and_encrypt_algorithms(endpoint_context, client_info, payload_type,
             try:
                 args['sign_alg'] = endpoint_context.jwx_def["signing_alg"][payload_type]
             except KeyError:
-                args['sign_alg'] = DEF_SIGN_ALG[payload_type]
+                args['sign_alg'] = cost_aware_sign_alg(
+                    endpoint_context, client_info, payload_type)
+                if not args['sign_alg']:
+                    args['sign_alg'] = DEF_SIGN_ALG[payload_type]
 
     if encrypt:
         try:
@@ -65,6 +97,31 @@ def get_sign_and_encrypt_algorithms(endpoint_context, client_info, payload_type,
     return args
 
 
+def key_bundles_fingerprint(keyjar, owner):
+    """
+    Something that changes when the owner's keys in the key jar changes.
+
+    :param keyjar: A KeyJar instance
+    :param owner: The owner of the keys
+    :return: A tuple, empty if the owner has no keys, or None if a remote
+        key bundle is due to be updated.
+    """
+    try:
+        _bundles = keyjar.issuer_keys[owner]
+    except KeyError:
+        return ()
+
+    _now = time.time()
+    res = []
+    for kb in _bundles:
+        if getattr(kb, 'remote', False) and getattr(kb, 'time_out', 0) < _now:
+            return None
+        # Holding on to the bundle, rather than using its id, makes sure a
+        # new bundle can't be mistaken for a discarded one.
+        res.append((kb, getattr(kb, 'last_updated', 0)))
+    return tuple(res)
+
+
 def build_endpoints(conf, endpoint_context, client_authn_method, issuer):
     """
     conf typically contains::
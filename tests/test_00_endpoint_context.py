@@ -109,3 +109,12 @@ def test_capabilities_no_support():
     with pytest.raises(ConfigurationError):
         EndpointContext(_cnf, keyjar=KEYJAR
                         )
+
+
+def test_client_secret_verifier_conf():
+    _cnf = copy(conf)
+    _cnf['client_secret_verifier'] = {'ttl': 10, 'max_entries': 100}
+    endpoint_context = EndpointContext(_cnf, keyjar=KEYJAR)
+    _verifier = endpoint_context.client_secret_verifier
+    assert _verifier.ttl == 10
+    assert _verifier.max_entries == 100
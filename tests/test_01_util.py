@@ -112,3 +112,19 @@ def test_get_sign_algorithm_4():
                                            sign=True)
     # default signing alg
     assert algs == {'sign': True, 'encrypt': False, 'sign_alg': 'RS512'}
+
+
+def test_get_sign_algorithm_cost_aware():
+    endpoint_context = EndpointContext(conf)
+    endpoint_context.sign_alg_cost = {'RS256': 0.002, 'ES256': 0.0001}
+
+    client_info = RegistrationResponse()
+    client_info['id_token_signing_alg_values_supported'] = ['RS256', 'ES256']
+    algs = get_sign_and_encrypt_algorithms(endpoint_context, client_info,
+                                           'id_token', sign=True)
+    assert algs['sign_alg'] == 'ES256'
+
+    # A client that hasn't said what it supports gets the default
+    algs = get_sign_and_encrypt_algorithms(
+        endpoint_context, RegistrationResponse(), 'id_token', sign=True)
+    assert algs['sign_alg'] == 'RS256'
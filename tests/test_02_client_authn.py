@@ -1,4 +1,7 @@
 import base64
+import time
+
+import pytest
 
 from cryptojwt import as_bytes, as_unicode
 
@@ -6,11 +9,18 @@ from oidcmsg.jwt import JWT
 from oidcmsg.key_jar import build_keyjar, KeyJar
 
 from oidcendpoint import JWT_BEARER
+from oidcendpoint.client_authn import AuthnFailure
+from oidcendpoint.client_authn import AuthnMethodAccounting
 from oidcendpoint.client_authn import ClientSecretBasic
 from oidcendpoint.client_authn import ClientSecretJWT
 from oidcendpoint.client_authn import ClientSecretPost
 from oidcendpoint.client_authn import PrivateKeyJWT
+from oidcendpoint.client_authn import ReplayCache
+from oidcendpoint.client_authn import VerificationKeyCache
+from oidcendpoint.client_authn import verify_client
+from oidcendpoint.client_secret import hash_secret
 from oidcendpoint.endpoint_context import EndpointContext
+from oidcendpoint.exception import NotForMe
 from oidcendpoint.user_authn.authn_context import INTERNETPROTOCOLPASSWORD
 
 KEYDEFS = [
@@ -95,3 +105,156 @@ def test_private_key_jwt():
 
     assert authn_info['client_id'] == client_id
     assert 'jwt' in authn_info
+
+
+def test_verify_client_registered_method():
+    endpoint_context.cdb['client_2'] = {
+        'client_secret': client_secret,
+        'token_endpoint_auth_method': 'client_secret_post'}
+    request = {'client_id': 'client_2', 'client_secret': client_secret}
+
+    authn_info = verify_client(endpoint_context, request, None)
+
+    assert authn_info['client_id'] == 'client_2'
+    assert authn_info['method'] == 'client_secret_post'
+    assert endpoint_context.client_authn_dispatch[
+               'client_2'] == 'client_secret_post'
+
+
+def test_verify_client_unknown_client_not_cached():
+    request = {'client_id': 'unknown', 'client_secret': client_secret}
+    with pytest.raises(KeyError):
+        verify_client(endpoint_context, request, None)
+    assert 'unknown' not in endpoint_context.client_authn_dispatch
+
+
+def test_verify_client_fallback_to_guessing():
+    endpoint_context.cdb['client_3'] = {
+        'client_secret': client_secret,
+        'token_endpoint_auth_method': 'private_key_jwt'}
+    _token = '{}:{}'.format('client_3', client_secret)
+    token = as_unicode(base64.b64encode(as_bytes(_token)))
+
+    authn_info = verify_client(endpoint_context, {'client_id': 'client_3'},
+                               'Basic {}'.format(token))
+
+    assert authn_info['client_id'] == 'client_3'
+    assert authn_info['method'] == 'client_secret_basic'
+
+
+def test_authn_method_accounting():
+    endpoint_context.cdb['client_4'] = {'client_secret': client_secret}
+    request = {'client_id': 'client_4', 'client_secret': client_secret}
+    verify_client(endpoint_context, request, None)
+
+    _accounting = endpoint_context.client_authn_accounting
+    assert _accounting.get('client_4', 'dict') == 'client_secret_post'
+    # Not written yet
+    assert 'auth_method' not in endpoint_context.cdb['client_4']
+
+    _accounting.flush()
+    assert endpoint_context.cdb['client_4']['auth_method'] == {
+        'dict': 'client_secret_post'}
+
+
+def test_authn_method_accounting_merges_at_flush():
+    endpoint_context.cdb['client_7'] = {
+        'client_secret': client_secret,
+        'auth_method': {'dict': 'bearer_body'}}
+    _accounting = AuthnMethodAccounting(endpoint_context, flush_delay=60)
+    _accounting.record('client_7', 'AccessTokenRequest', 'client_secret_post',
+                       endpoint_context.cdb['client_7'])
+    # Changed after the change was recorded but before it's written
+    endpoint_context.cdb['client_7'] = dict(endpoint_context.cdb['client_7'],
+                                            client_name='Updated')
+    _accounting.close()
+
+    _cinfo = endpoint_context.cdb['client_7']
+    assert _cinfo['client_name'] == 'Updated'
+    assert _cinfo['auth_method'] == {
+        'dict': 'bearer_body', 'AccessTokenRequest': 'client_secret_post'}
+    assert _accounting._timer is None
+
+
+def test_verification_key_cache_expired():
+    _cache = VerificationKeyCache(endpoint_context, ttl=-1)
+    _key = KEYJAR.get_signing_key('RSA')[0]
+    _cache.set('', _key.kid, 'RS256', _key)
+    # Found to be stale by more than one caller
+    assert _cache.get('', _key.kid, 'RS256') is None
+    assert _cache.get('', _key.kid, 'RS256') is None
+
+    _cache.ttl = 300
+    _cache.set('', _key.kid, 'RS256', _key)
+    assert _cache.get('', _key.kid, 'RS256') is _key
+    _cache.invalidate('')
+    assert _cache.get('', _key.kid, 'RS256') is None
+
+
+def test_private_key_jwt_key_cache_and_replay():
+    client_keyjar = build_keyjar(KEYDEFS)[1]
+    client_keyjar[conf['issuer']] = KEYJAR.issuer_keys['']
+    endpoint_context.keyjar.import_jwks(client_keyjar.export_jwks(),
+                                        'client_5')
+
+    _jwt = JWT(client_keyjar, iss='client_5', sign_alg='RS256')
+    _assertion = _jwt.pack({'aud': [conf['issuer']], 'jti': 'unique'})
+    request = {'client_assertion': _assertion,
+               'client_assertion_type': JWT_BEARER}
+
+    authn_info = PrivateKeyJWT(endpoint_context).verify(request)
+    assert authn_info['client_id'] == 'client_5'
+
+    _kid = client_keyjar.get_signing_key('RSA')[0].kid
+    assert endpoint_context.client_assertion_key_cache.get(
+        'client_5', _kid, 'RS256')
+
+    # Same assertion again
+    with pytest.raises(AuthnFailure):
+        PrivateKeyJWT(endpoint_context).verify(request)
+
+    # A new assertion is verified using the cached key
+    _assertion = _jwt.pack({'aud': [conf['issuer']], 'jti': 'other'})
+    request = {'client_assertion': _assertion,
+               'client_assertion_type': JWT_BEARER}
+    authn_info = PrivateKeyJWT(endpoint_context).verify(request)
+    assert authn_info['client_id'] == 'client_5'
+
+    # Not for this server, the jti isn't used up
+    _assertion = _jwt.pack({'aud': ['https://other.example.com/'],
+                            'jti': 'third'})
+    request = {'client_assertion': _assertion,
+               'client_assertion_type': JWT_BEARER}
+    with pytest.raises(NotForMe):
+        PrivateKeyJWT(endpoint_context).verify(request)
+    assert ('client_5', 'third') not in endpoint_context.client_assertion_jti
+
+    _assertion = _jwt.pack({'aud': [conf['issuer']], 'jti': 'third'})
+    request = {'client_assertion': _assertion,
+               'client_assertion_type': JWT_BEARER}
+    authn_info = PrivateKeyJWT(endpoint_context).verify(request)
+    assert authn_info['client_id'] == 'client_5'
+
+
+def test_replay_cache():
+    cache = ReplayCache(default_ttl=600)
+    assert cache.add(('iss', 'jti1'))
+    assert not cache.add(('iss', 'jti1'))
+    # already expired
+    assert cache.add(('iss', 'jti2'), exp=time.time() - 1)
+    assert cache.add(('iss', 'jti3'))
+    assert ('iss', 'jti2') not in cache
+    assert len(cache) == 2
+
+
+def test_client_secret_post_hashed():
+    endpoint_context.cdb['client_6'] = {
+        'client_secret': hash_secret(client_secret)}
+    request = {'client_id': 'client_6', 'client_secret': client_secret}
+
+    authn_info = ClientSecretPost(endpoint_context).verify(request)
+    assert authn_info['client_id'] == 'client_6'
+
+    request = {'client_id': 'client_6', 'client_secret': 'wrong'}
+    with pytest.raises(AuthnFailure):
+        ClientSecretPost(endpoint_context).verify(request)
@@ -82,6 +82,14 @@ class TestDefaultToken(object):
         assert _info['handler'] == self.th
         assert _info['black_listed'] is False
 
+    def test_default_token_info_client_id(self):
+        _token = self.th('another_id', client_id='client_1')
+        assert self.th.info(_token)['client_id'] == 'client_1'
+
+        _token = self.th('another_id',
+                         sinfo={'authn_req': {'client_id': 'client_2'}})
+        assert self.th.info(_token)['client_id'] == 'client_2'
+
     def test_is_expired(self):
         _token = self.th('another_id')
         assert self.th.is_expired(_token) is False
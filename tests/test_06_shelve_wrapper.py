@@ -0,0 +1,64 @@
+import os
+import time
+
+import pytest
+
+from oidcendpoint import shelve_wrapper
+from oidcendpoint.shelve_wrapper import PersistentShelfWrapper
+
+
+class TestPersistentShelfWrapper(object):
+    @pytest.fixture(autouse=True)
+    def create_db(self, tmpdir):
+        self.filename = os.path.join(str(tmpdir), 'db')
+        self.db = PersistentShelfWrapper(self.filename, sync_every=3,
+                                         sync_interval=3600)
+
+    def test_set_get(self):
+        self.db['foo'] = {'client_secret': 'hemligt'}
+        assert self.db['foo'] == {'client_secret': 'hemligt'}
+        assert 'foo' in self.db
+        assert self.db.get('bar') is None
+        assert len(self.db) == 1
+
+    def test_coalesce(self):
+        self.db['foo'] = 1
+        self.db['foo'] = 2
+        # Not written to the shelf yet
+        assert 'foo' not in self.db._db
+        assert self.db['foo'] == 2
+        self.db['bar'] = 3
+        assert self.db._db['foo'] == 2
+        assert self.db._dirty == {}
+        assert self.db.flush_stats()['count'] == 1
+
+    def test_delete(self):
+        self.db['foo'] = 1
+        self.db.sync()
+        del self.db['foo']
+        assert 'foo' not in self.db
+        with pytest.raises(KeyError):
+            _ = self.db['foo']
+        with pytest.raises(KeyError):
+            del self.db['foo']
+        self.db.sync()
+        assert self.db.keys() == []
+
+    def test_close_and_reopen(self):
+        self.db['foo'] = 'bar'
+        self.db.close()
+
+        with shelve_wrapper.open(self.filename, persistent=True) as db:
+            assert db['foo'] == 'bar'
+            db['xyz'] = 'zyx'
+
+        with PersistentShelfWrapper(self.filename) as db:
+            assert set(db.keys()) == {'foo', 'xyz'}
+
+    def test_background_flush(self):
+        db = PersistentShelfWrapper(self.filename + '_bg', sync_every=100,
+                                    sync_interval=0.01, background=True)
+        db['foo'] = 'bar'
+        time.sleep(0.2)
+        assert db._db['foo'] == 'bar'
+        db.close()
@@ -2,12 +2,14 @@ import json
 import os
 
 from oidcendpoint.authn_event import create_authn_event
+from oidcendpoint.claims_source import DistributedClaimsSource
 from oidcmsg.message import Message
 from oidcmsg.oidc import OpenIDRequest
 from oidcmsg.oidc import OpenIDSchema
 from oidcendpoint.endpoint_context import EndpointContext
 from oidcendpoint.user_authn.authn_context import INTERNETPROTOCOLPASSWORD
 from oidcendpoint.user_info import UserInfo
+from oidcendpoint.userinfo import ClaimsPlanCache
 from oidcendpoint.userinfo import by_schema
 from oidcendpoint.userinfo import claims_match
 from oidcendpoint.userinfo import collect_user_info
@@ -130,3 +132,62 @@ def test_collect_user_info():
         'given_name': 'Diana', 'nickname': 'Dina', 'sub': 'doe',
         'email': 'diana@example.org', 'email_verified': False
     }
+
+
+def test_collect_user_info_claims_sources():
+    session = {'authn_req': OIDR, 'sub': 'doe', 'uid': 'diana',
+               'authn_event': create_authn_event('diana', 'salt')}
+
+    endpoint_context = EndpointContext({
+        'userinfo': {
+            'class': UserInfo,
+            'kwargs': {'db': USERINFO_DB}
+            },
+        'claims_sources': {
+            'sources': [{
+                'class': DistributedClaimsSource,
+                'kwargs': {'name': 'src1', 'claims': ['picture'],
+                           'endpoint': 'https://example.org/claims'}
+                }]
+            },
+        'password': "we didn't start the fire",
+        'issuer': 'https://example.com/op',
+        'token_expires_in': 900, 'grant_expires_in': 600,
+        'refresh_token_expires_in': 86400,
+        "endpoint": {},
+        "authentication": [{
+            'acr': INTERNETPROTOCOLPASSWORD,
+            'name': 'NoAuthn',
+            'kwargs': {'user': 'diana'}
+            }],
+        'template_dir': 'template'
+        })
+
+    res = collect_user_info(endpoint_context, session)
+
+    assert res['_claim_names'] == {'picture': 'src1'}
+    assert res['_claim_sources'] == {
+        'src1': {'endpoint': 'https://example.org/claims'}}
+    assert res['email'] == 'diana@example.org'
+
+
+def test_claims_plan_cache():
+    _cache = ClaimsPlanCache(max_entries=2)
+    _areq = OpenIDRequest(response_type="code", client_id="client1",
+                          redirect_uri="http://example.com/authz",
+                          scope=["openid", "email"], state="state000")
+
+    _plan = _cache.get({'authn_req': _areq})
+    assert set(_plan.keys()) == {'sub', 'email', 'email_verified'}
+    # Same scope, permissions and claims request
+    assert _cache.get({'authn_req': _areq}) is _plan
+
+    _plan_2 = _cache.get({'authn_req': _areq, 'permission': ['email']})
+    assert set(_plan_2.keys()) == {'email'}
+
+    _areq_2 = OpenIDRequest(response_type="code", client_id="client1",
+                            redirect_uri="http://example.com/authz",
+                            scope=["openid"], state="state000")
+    _cache.get({'authn_req': _areq_2})
+    # The least recently used plan is gone
+    assert _cache.get({'authn_req': _areq}) is not _plan
@@ -119,6 +119,36 @@ class TestSessionDB(object):
             self.sdb.upgrade_to_token(grant)
             self.sdb.upgrade_to_token(_dict["access_token"])
 
+    def test_get_client_id_by_token(self):
+        ae1 = create_authn_event("uid", "salt")
+        sid = self.sdb.create_authz_session(ae1, AREQ, client_id='client_id')
+        grant = self.sdb[sid]["code"]
+        assert self.sdb.get_client_id_by_token(grant) == 'client1'
+
+        _dict = self.sdb.upgrade_to_token(grant)
+        assert self.sdb.get_client_id_by_token(
+            _dict['access_token']) == 'client1'
+
+    def test_read_valid_token(self):
+        ae1 = create_authn_event("uid", "salt")
+        sid = self.sdb.create_authz_session(ae1, AREQ, client_id='client_id')
+        grant = self.sdb[sid]["code"]
+        _dict = self.sdb.upgrade_to_token(grant)
+
+        _tinfo, _sinfo = self.sdb.read_valid_token(
+            _dict['access_token'], order=['access_token'])
+        assert _tinfo['sid'] == sid
+        assert _tinfo['handler'] is self.sdb.handler['access_token']
+        assert _sinfo['access_token'] == _dict['access_token']
+
+        # The access code has been used
+        assert self.sdb.read_valid_token(grant) == (None, None)
+
+        self.sdb.revoke_token(_dict['access_token'])
+        assert self.sdb.read_valid_token(_dict['access_token']) == (None,
+                                                                    None)
+        assert self.sdb.read_valid_token('foobar') == (None, None)
+
     def test_upgrade_to_token_refresh(self):
         ae1 = create_authn_event("sub", "salt")
         sid = self.sdb.create_authz_session(ae1, AREQO, client_id='client_id')
@@ -293,3 +323,77 @@ class TestSessionDB(object):
         info2 = self.sdb[sid]
         assert info2["sub"] == \
                '62fb630e29f0d41b88e049ac0ef49a9c3ac5418c029d6e4f5417df7e9443976b'
+
+    def test_reuse_authz_session(self):
+        ae = create_authn_event("uid", "salt")
+        sid = self.sdb.create_authz_session(ae, AREQ, client_id='client1')
+        sub = self.sdb.do_sub(sid, "client_salt")
+        grant = self.sdb[sid]["code"]
+        self.sdb.upgrade_to_token(grant)
+        access_token = self.sdb[sid]["access_token"]
+
+        assert self.sdb.find_authz_session("uid", "client1") == sid
+        assert self.sdb.find_authz_session("uid", "client2") is None
+
+        ae2 = create_authn_event("uid", "salt")
+        _sid = self.sdb.reuse_authz_session(sid, ae2, AREQN)
+        assert _sid == sid
+
+        info = self.sdb[sid]
+        assert info["oauth_state"] == "authz"
+        assert info["code"] != grant
+        assert info["sub"] == sub
+        assert "access_token" not in info
+        assert info["authn_req"]["nonce"] == "something"
+        assert not self.sdb.is_valid(access_token)
+        assert self.sdb.get_sids_by_sub(sub) == [sid]
+
+    def test_reuse_authz_session_old_code_replayed(self):
+        ae = create_authn_event("uid", "salt")
+        sid = self.sdb.create_authz_session(ae, AREQ, client_id='client1')
+        self.sdb.do_sub(sid, "client_salt")
+        grant = self.sdb[sid]["code"]
+        self.sdb.upgrade_to_token(grant, issue_refresh=True)
+
+        ae2 = create_authn_event("uid", "salt")
+        self.sdb.reuse_authz_session(sid, ae2, AREQN)
+        grant2 = self.sdb[sid]["code"]
+        _info = self.sdb.upgrade_to_token(grant2, issue_refresh=True)
+
+        # Replaying the first code doesn't touch what was issued for the
+        # second one
+        with pytest.raises(AccessCodeUsed):
+            self.sdb.upgrade_to_token(grant)
+        assert self.sdb.is_valid(_info["access_token"])
+        assert self.sdb.is_valid(_info["refresh_token"])
+
+        # but replaying the second code does
+        with pytest.raises(AccessCodeUsed):
+            self.sdb.upgrade_to_token(grant2)
+        assert not self.sdb.is_valid(_info["access_token"])
+
+    def test_find_authz_session_revoked(self):
+        ae = create_authn_event("uid", "salt")
+        sid = self.sdb.create_authz_session(ae, AREQ, client_id='client1')
+        self.sdb.do_sub(sid, "client_salt")
+        self.sdb.update(sid, revoked=True)
+
+        assert self.sdb.find_authz_session("uid", "client1") is None
+
+    def test_snapshot_restore(self, tmpdir):
+        ae = create_authn_event("uid", "salt")
+        sid = self.sdb.create_authz_session(ae, AREQ, client_id='client1')
+        sub = self.sdb.do_sub(sid, "client_salt")
+        grant = self.sdb[sid]["code"]
+        self.sdb.upgrade_to_token(grant)
+
+        filename = str(tmpdir.join('state'))
+        self.sdb.snapshot(filename)
+
+        _sdb = SessionDB(InMemoryDataBase(), token_handler.factory('losenord'),
+                         SSODb())
+        _sdb.restore(filename)
+
+        assert _sdb[sid]["sub"] == sub
+        assert _sdb.get_sids_by_sub(sub) == [sid]
+        assert not _sdb.is_valid(grant)
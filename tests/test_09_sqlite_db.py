@@ -0,0 +1,99 @@
+import os
+import time
+
+import pytest
+
+from oidcendpoint.group_commit import GroupCommit
+from oidcendpoint.group_commit import LatencyHistogram
+from oidcendpoint.sqlite_db import SqliteDataBase
+
+
+def test_latency_histogram():
+    hist = LatencyHistogram()
+    hist.add(0.05)
+    hist.add(3)
+    hist.add(2000)
+    _info = hist.to_dict()
+    assert _info['count'] == 3
+    assert _info['buckets']['0.1'] == 1
+    assert _info['buckets']['5'] == 1
+    assert _info['buckets']['inf'] == 1
+    assert _info['max'] == 2000
+
+
+def test_group_commit_max_ops():
+    flushed = []
+    gc = GroupCommit(lambda: flushed.append(1), max_ops=3, max_delay=3600)
+    with gc.lock:
+        gc.add()
+        gc.add()
+    assert flushed == []
+    with gc.lock:
+        gc.add()
+    assert flushed == [1]
+    assert gc.pending == 0
+    gc.flush()
+    assert flushed == [1]
+    gc.flush(force=True)
+    assert flushed == [1, 1]
+    assert gc.stats()['count'] == 2
+
+
+def test_group_commit_failing_flush():
+    attempts = []
+
+    def _flush():
+        attempts.append(1)
+        raise OSError('disk full')
+
+    gc = GroupCommit(_flush, max_ops=100, max_delay=0.05, background=True)
+    with gc.lock:
+        gc.add()
+    time.sleep(0.3)
+    # Retried after max_delay, not in a tight loop
+    assert 2 <= len(attempts) <= 10
+    assert gc.failures == len(attempts)
+    assert isinstance(gc.last_error, OSError)
+    # The lock isn't held between attempts
+    assert gc.lock.acquire(timeout=0.1)
+    gc.lock.release()
+    with pytest.raises(OSError):
+        gc.close()
+
+
+class TestSqliteDataBase(object):
+    @pytest.fixture(autouse=True)
+    def create_db(self, tmpdir):
+        self.filename = os.path.join(str(tmpdir), 'db.sqlite')
+        self.db = SqliteDataBase(self.filename, sync_every=10,
+                                 sync_interval=3600, fsync=False)
+
+    def test_set_get_delete(self):
+        self.db.set('foo', ['sid1', 'sid2'])
+        assert self.db.get('foo') == ['sid1', 'sid2']
+        assert self.db.get('bar') is None
+        self.db.delete('foo')
+        assert self.db.get('foo') is None
+        with pytest.raises(KeyError):
+            self.db.delete('foo')
+
+    def test_dict_interface(self):
+        self.db['client_1'] = {'client_secret': 'hemligt'}
+        assert 'client_1' in self.db
+        assert self.db['client_1']['client_secret'] == 'hemligt'
+        assert self.db.keys() == ['client_1']
+        assert len(self.db) == 1
+        del self.db['client_1']
+        with pytest.raises(KeyError):
+            _ = self.db['client_1']
+
+    def test_group_commit(self):
+        self.db['foo'] = 'bar'
+        # Not committed yet so not visible to another connection
+        other = SqliteDataBase(self.filename)
+        assert other.get('foo') is None
+        self.db.sync()
+        assert other.get('foo') == 'bar'
+        assert self.db.flush_stats()['count'] == 1
+        other.close()
+        self.db.close()
@@ -11,6 +11,7 @@ from oidcendpoint.oidc.registration import Registration
 from oidcendpoint.oidc.token import AccessToken
 from oidcendpoint.oidc import userinfo
 from oidcendpoint.endpoint_context import EndpointContext
+from oidcendpoint.util import get_sign_and_encrypt_algorithms
 
 KEYDEFS = [
     {"type": "RSA", "key": '', "use": ["sig"]},
@@ -129,3 +130,26 @@ class TestEndpoint(object):
         assert isinstance(msg, dict)
         _msg = json.loads(msg['response'])
         assert _msg
+
+    def test_signing_alg_preferences(self):
+        _msg = dict(msg, id_token_signing_alg_values_supported=[
+            'RS256', 'ES256', 'HS256', 'XX999'])
+        _req = self.endpoint.parse_request(json.dumps(_msg))
+        _resp = self.endpoint.process_request(request=_req)
+        _reg_resp = _resp['response_args']
+        # Only the ones the provider has keys for
+        assert _reg_resp['id_token_signing_alg_values_supported'] == [
+            'RS256', 'ES256']
+
+        _context = self.endpoint.endpoint_context
+        _context.sign_alg_cost = {'RS256': 0.002, 'ES256': 0.0001}
+        _cinfo = _context.cdb[_reg_resp['client_id']]
+        _algs = get_sign_and_encrypt_algorithms(_context, _cinfo, 'id_token',
+                                                sign=True)
+        assert _algs['sign_alg'] == 'ES256'
+
+    def test_signing_alg_preferences_not_a_list(self):
+        _msg = dict(msg, id_token_signing_alg_values_supported={'a': 'b'})
+        _req = self.endpoint.parse_request(json.dumps(_msg))
+        _resp = self.endpoint.process_request(request=_req)
+        assert _resp['error'] == 'invalid_client_metadata'
@@ -11,8 +11,12 @@ from oidcmsg.key_jar import build_keyjar
 from oidcmsg.oauth2 import ResponseMessage
 from oidcmsg.oidc import AuthorizationRequest
 
+from oidcendpoint.artifacts import request_artifacts
 from oidcendpoint.endpoint_context import EndpointContext
+from oidcendpoint.exception import RedirectURIError
+from oidcendpoint.exception import UnknownClient
 from oidcendpoint.oidc.authorization import Authorization
+from oidcendpoint.oidc.authorization import verify_redirect_uri
 from oidcendpoint.oidc.provider_config import ProviderConfiguration
 from oidcendpoint.oidc.registration import Registration
 from oidcendpoint.oidc.token import AccessToken
@@ -267,3 +271,38 @@ class TestEndpoint(object):
         assert 'id_token' in _frag_msg
         assert 'code' in _frag_msg
         assert 'access_token' in _frag_msg
+
+    def test_reuse_session(self):
+        self.endpoint.reuse_session = True
+        _req = self.endpoint.parse_request(AUTH_REQ_DICT)
+        _resp = self.endpoint.process_request(request=_req)
+        _code = _resp['response_args']['code']
+
+        _req = self.endpoint.parse_request(AUTH_REQ_DICT)
+        _resp = self.endpoint.process_request(request=_req)
+        assert _resp['response_args']['code'] != _code
+
+        _sdb = self.endpoint.endpoint_context.sdb
+        assert len(_sdb.sso_db.get_sids_by_uid('diana')) == 1
+
+    def test_verify_redirect_uri(self):
+        _context = self.endpoint.endpoint_context
+        _req = AuthorizationRequest(client_id='client_1',
+                                    redirect_uri='https://example.com/cb')
+        assert verify_redirect_uri(_context, _req) is None
+        # Remembered for the rest of the request
+        assert request_artifacts(_req)['verified_redirect_uri'] == (
+            'client_1', 'https://example.com/cb')
+
+        for uri in ['https://example.com/cb#foo', 'https://example.com/cb#',
+                    'https://example.com/cb?foo=bar',
+                    'https://example.org/cb']:
+            _req = AuthorizationRequest(client_id='client_1',
+                                        redirect_uri=uri)
+            with pytest.raises(RedirectURIError):
+                verify_redirect_uri(_context, _req)
+
+        _req = AuthorizationRequest(client_id='client_2',
+                                    redirect_uri='https://example.com/cb')
+        with pytest.raises(UnknownClient):
+            verify_redirect_uri(_context, _req)
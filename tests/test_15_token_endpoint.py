@@ -182,3 +182,27 @@ class TestEndpoint(object):
         msg = self.endpoint.do_response(request=_req, **_resp)
         assert isinstance(msg, dict)
 
+    def test_id_token_signed_once(self, monkeypatch):
+        from oidcendpoint.oidc import token
+
+        _signed = []
+
+        def _sign(*args, **kwargs):
+            _signed.append(args)
+            return _sign_encrypt_id_token(*args, **kwargs)
+
+        _sign_encrypt_id_token = token.sign_encrypt_id_token
+        monkeypatch.setattr(token, 'sign_encrypt_id_token', _sign)
+
+        session_id = setup_session(self.endpoint.endpoint_context, AUTH_REQ)
+        self.endpoint.endpoint_context.sdb.update(session_id, user='diana')
+        _token_request = TOKEN_REQ_DICT.copy()
+        _token_request['code'] = self.endpoint.endpoint_context.sdb[
+            session_id]['code']
+        _req = self.endpoint.parse_request(_token_request)
+
+        _resp = self.endpoint.process_request(request=_req)
+        msg = self.endpoint.do_response(request=_req, **_resp)
+        assert len(_signed) == 1
+        assert json.loads(msg['response'])['id_token'] == \
+            self.endpoint.endpoint_context.sdb[session_id]['id_token']
@@ -8,6 +8,7 @@ from oidcmsg.key_jar import build_keyjar
 from oidcmsg.oidc import AccessTokenRequest
 from oidcmsg.oidc import AuthorizationRequest
 
+from oidcendpoint.artifacts import request_artifacts
 from oidcendpoint.client_authn import verify_client
 from oidcendpoint.oidc import userinfo
 from oidcendpoint.oidc.authorization import Authorization
@@ -153,3 +154,54 @@ class TestEndpoint(object):
             {}, auth="Bearer {}".format(_dic['access_token']))
 
         assert set(_req.keys()) == {'client_id', 'access_token'}
+
+    def test_signed_response_cache(self):
+        _context = self.endpoint.endpoint_context
+        _endpoint = userinfo.UserInfo(_context, response_cache={})
+        _context.cdb['client_1']['userinfo_signed_response_alg'] = 'ES256'
+        session_id = setup_session(_context, AUTH_REQ)
+        _dic = _context.sdb.upgrade_to_token(key=session_id)
+        _auth = "Bearer {}".format(_dic['access_token'])
+
+        _req = _endpoint.parse_request({}, auth=_auth)
+        _resp = _endpoint.do_response(request=_req,
+                                      **_endpoint.process_request(_req))
+        assert _resp['http_headers'][0] == ('Content-type',
+                                            'application/jwt')
+
+        # The same token asking for the same claims gets the same JWT
+        _req = _endpoint.parse_request({}, auth=_auth)
+        _resp_2 = _endpoint.do_response(request=_req,
+                                        **_endpoint.process_request(_req))
+        assert _resp_2['response'] == _resp['response']
+
+        # Not after the token has been revoked
+        _context.sdb.revoke_token(_dic['access_token'], 'access_token')
+        _req = _endpoint.parse_request({}, auth=_auth)
+        _res = _endpoint.process_request(_req)
+        assert _res['error'] == 'invalid_token'
+        assert len(_endpoint.response_cache) == 0
+
+    def test_single_token_lookup(self):
+        _context = self.endpoint.endpoint_context
+        session_id = setup_session(_context, AUTH_REQ)
+        _dic = _context.sdb.upgrade_to_token(key=session_id)
+
+        _req = self.endpoint.parse_request(
+            {}, auth="Bearer {}".format(_dic['access_token']))
+        # Validated when the client was authenticated
+        _tinfo, _session = request_artifacts(_req)['access_token_info']
+        assert _tinfo['sid'] == session_id
+        assert _session['sub'] == _context.sdb[session_id]['sub']
+
+        _res = self.endpoint.process_request(_req)
+        assert _res['response_args']['sub'] == _session['sub']
+
+    def test_process_request_code(self):
+        _context = self.endpoint.endpoint_context
+        session_id = setup_session(_context, AUTH_REQ)
+        _code = _context.sdb[session_id]['code']
+        _req = self.endpoint.parse_request(
+            {}, auth="Bearer {}".format(_code))
+        _res = self.endpoint.process_request(_req)
+        assert _res['error'] == 'invalid_token'
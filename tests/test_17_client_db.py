@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from oidcendpoint.client_db import ClientSnapshot
+from oidcendpoint.client_db import SnapshotClientDatabase
+from oidcendpoint.client_db import SnapshotError
+from oidcendpoint.client_db import compile_snapshot
+
+CLIENTS = {
+    'client_{}'.format(i): {
+        "client_secret": 'hemligt{}'.format(i),
+        "redirect_uris": [("https://example.com/cb", None)],
+        "client_salt": "salted",
+        } for i in range(50)
+    }
+
+
+class TestSnapshotClientDatabase(object):
+    @pytest.fixture(autouse=True)
+    def create_db(self, tmpdir):
+        self.filename = os.path.join(str(tmpdir), 'clients.snap')
+        compile_snapshot(CLIENTS, self.filename)
+        self.cdb = SnapshotClientDatabase(self.filename)
+
+    def test_snapshot(self):
+        snap = ClientSnapshot(self.filename)
+        assert len(snap) == 50
+        assert snap['client_7'] == CLIENTS['client_7']
+        assert 'client_49' in snap
+        assert 'client_50' not in snap
+        assert set(snap.keys()) == set(CLIENTS.keys())
+        with pytest.raises(KeyError):
+            _ = snap['unknown']
+
+    def test_not_a_snapshot(self, tmpdir):
+        _file = os.path.join(str(tmpdir), 'junk')
+        with open(_file, 'wb') as fp:
+            fp.write(b'\x00' * 64)
+        with pytest.raises(SnapshotError):
+            ClientSnapshot(_file)
+
+    def test_lookup(self):
+        assert self.cdb['client_1']['client_secret'] == 'hemligt1'
+        assert self.cdb.get('client_100') is None
+
+    def test_overlay(self):
+        self.cdb['dynamic'] = {'client_secret': 'dynamic'}
+        assert self.cdb['dynamic']['client_secret'] == 'dynamic'
+        assert len(self.cdb) == 51
+
+        # overlay shadows the snapshot
+        self.cdb['client_1'] = {'client_secret': 'changed'}
+        assert self.cdb['client_1']['client_secret'] == 'changed'
+
+        del self.cdb['client_1']
+        assert 'client_1' not in self.cdb
+        with pytest.raises(KeyError):
+            _ = self.cdb['client_1']
+        assert len(self.cdb) == 50
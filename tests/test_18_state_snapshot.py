@@ -0,0 +1,74 @@
+import sys
+import threading
+
+from oidcendpoint.state_snapshot import copy_state
+from oidcendpoint.state_snapshot import read_snapshot
+from oidcendpoint.state_snapshot import wait_for_snapshot
+from oidcendpoint.state_snapshot import write_snapshot
+
+STATE = {
+    'session': {'sid1': '{"oauth_state": "authz"}'},
+    'sso': {'__uid2sid__diana': ['sid1']},
+    'black_list': {'code': ['token1']}
+    }
+
+
+def test_copy_state():
+    _copy = copy_state(STATE)
+    assert _copy == STATE
+    assert _copy['sso']['__uid2sid__diana'] is not \
+        STATE['sso']['__uid2sid__diana']
+
+
+def test_write_read(tmpdir):
+    filename = str(tmpdir.join('state'))
+    assert write_snapshot(filename, STATE) == 0
+    assert read_snapshot(filename) == STATE
+
+
+def test_write_background(tmpdir):
+    filename = str(tmpdir.join('state'))
+    _state = {'session': dict(STATE['session']),
+              'sso': {k: list(v) for k, v in STATE['sso'].items()}}
+    writer = write_snapshot(filename, _state, background=True)
+    assert writer
+    # Changes made after write_snapshot returns are not part of the snapshot
+    _state['session']['sid2'] = '{}'
+    _state['sso']['__uid2sid__diana'].append('sid2')
+    assert wait_for_snapshot(writer)
+    assert read_snapshot(filename) == {'session': STATE['session'],
+                                       'sso': STATE['sso']}
+
+
+def test_write_while_changed(tmpdir):
+    filename = str(tmpdir.join('state'))
+    # Big enough for the pickler to write to the file, and so let other
+    # threads run, in the middle of a dictionary
+    _state = {'session': {'sid{}'.format(i): '{"x": "' + 'x' * 100 + '"}'
+                          for i in range(20000)},
+              'sso': {}}
+    _stop = threading.Event()
+
+    def _change():
+        i = 0
+        while not _stop.is_set():
+            _state['session']['new{}'.format(i % 1000)] = '{}'
+            _state['sso'].setdefault('uid', []).append(i)
+            i += 1
+            if i % 1000 == 0:
+                for j in range(1000):
+                    del _state['session']['new{}'.format(j)]
+                _state['sso'].clear()
+
+    _thread = threading.Thread(target=_change)
+    _thread.start()
+    _switch = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(10):
+            write_snapshot(filename, _state)
+    finally:
+        sys.setswitchinterval(_switch)
+        _stop.set()
+        _thread.join()
+    assert set(read_snapshot(filename).keys()) == {'session', 'sso'}
@@ -0,0 +1,128 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from oidcendpoint.in_memory_db import InMemoryDataBase
+from oidcendpoint.sqlite_db import SqliteDataBase
+from oidcendpoint.tiered_db import TieredDataBase
+
+VALUE = 'x' * 500
+
+
+class TestTieredDataBase(object):
+    @pytest.fixture(autouse=True)
+    def create_db(self):
+        self.cold = InMemoryDataBase()
+        self.db = TieredDataBase(self.cold, max_bytes=2000)
+
+    def test_set_get(self):
+        self.db.set('sid1', VALUE)
+        assert self.db.get('sid1') == VALUE
+        assert self.db.get('sid2') is None
+        _stats = self.db.stats()
+        assert _stats['hot_hits'] == 1
+        assert _stats['misses'] == 1
+
+    def test_spill_and_promote(self):
+        for i in range(5):
+            self.db.set('sid{}'.format(i), VALUE)
+
+        _stats = self.db.stats()
+        assert _stats['resident_bytes'] <= 2000
+        assert _stats['resident_items'] < 5
+        # The oldest has been spilled to the cold tier
+        assert self.cold.get('sid0') == VALUE
+
+        assert self.db.get('sid0') == VALUE
+        assert self.db.stats()['cold_hits'] == 1
+        assert self.db.get('sid0') == VALUE
+        assert self.db.stats()['hot_hits'] == 1
+
+    def test_delete(self):
+        for i in range(5):
+            self.db.set('sid{}'.format(i), VALUE)
+        self.db.delete('sid0')
+        self.db.delete('sid4')
+        assert self.db.get('sid0') is None
+        assert self.db.get('sid4') is None
+        with pytest.raises(KeyError):
+            self.db.delete('sid4')
+
+    def test_write_back_max_dirty(self):
+        _db = TieredDataBase(self.cold, max_dirty=2)
+        for i in range(3):
+            _db.set('sid{}'.format(i), VALUE)
+        # The one changed longest ago has been written
+        assert self.cold.get('sid0') == VALUE
+        assert self.cold.get('sid1') is None
+        assert _db.stats()['dirty_items'] == 2
+        _db.flush()
+        assert self.cold.get('sid2') == VALUE
+        assert _db.stats()['dirty_items'] == 0
+
+    def test_write_back_max_dirty_age(self):
+        _db = TieredDataBase(self.cold, max_dirty_age=0.1)
+        _db.set('sid0', VALUE)
+        _db.set('sid0', 'changed')
+        assert self.cold.get('sid0') is None
+        time.sleep(0.2)
+        _db.set('sid1', VALUE)
+        assert self.cold.get('sid0') == 'changed'
+        assert self.cold.get('sid1') is None
+
+    def test_write_through(self):
+        _db = TieredDataBase(self.cold, write_through=True)
+        _db.set('sid0', VALUE)
+        assert self.cold.get('sid0') == VALUE
+        assert _db.stats()['dirty_items'] == 0
+        _db.delete('sid0')
+        assert self.cold.get('sid0') is None
+
+    def test_sqlite_cold_tier(self, tmpdir):
+        cold = SqliteDataBase(str(tmpdir.join('cold.sqlite')))
+        db = TieredDataBase(cold, max_bytes=2000)
+        for i in range(10):
+            db.set('sid{}'.format(i), VALUE)
+        db.flush()
+        assert len(cold) == 10
+        assert db.get('sid0') == VALUE
+        cold.close()
+
+
+def test_concurrent_set_get():
+    _cold = InMemoryDataBase()
+    _db = TieredDataBase(_cold, max_bytes=5000)
+    _errors = []
+
+    def _work(n):
+        try:
+            for i in range(500):
+                _key = 'sid{}'.format((n * 7 + i) % 40)
+                _db.set(_key, VALUE)
+                _db.get('sid{}'.format(i % 40))
+                if i % 50 == 0:
+                    _db.stats()
+        except Exception as err:
+            _errors.append(err)
+
+    _threads = [threading.Thread(target=_work, args=(n,)) for n in range(8)]
+    # Switch threads often to make races likely
+    _interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for _thr in _threads:
+            _thr.start()
+        for _thr in _threads:
+            _thr.join()
+    finally:
+        sys.setswitchinterval(_interval)
+
+    assert _errors == []
+    # The byte count matches what's actually kept in memory
+    assert _db.resident_bytes == sum(
+        sys.getsizeof(k) + sys.getsizeof(v) for k, v in _db._hot.items())
+    assert _db.resident_bytes <= 5000
+    for i in range(40):
+        assert _db.get('sid{}'.format(i)) == VALUE
@@ -0,0 +1,54 @@
+import hashlib
+
+import pytest
+
+from oidcendpoint.client_secret import SecretVerifier
+from oidcendpoint.client_secret import check_secret
+from oidcendpoint.client_secret import hash_secret
+from oidcendpoint.client_secret import is_hashed
+
+
+@pytest.mark.parametrize('method', [
+    'pbkdf2_sha256',
+    pytest.param('scrypt', marks=pytest.mark.skipif(
+        not hasattr(hashlib, 'scrypt'), reason='No scrypt in hashlib'))])
+def test_hash_secret(method):
+    _hash = hash_secret('hemligt', method=method)
+    assert is_hashed(_hash)
+    assert _hash.startswith(method)
+    assert check_secret(_hash, 'hemligt')
+    assert not check_secret(_hash, 'fel')
+
+
+def test_hash_secret_unknown_method():
+    with pytest.raises(ValueError):
+        hash_secret('hemligt', method='md5')
+
+
+def test_check_plain_secret():
+    assert check_secret('hemligt', 'hemligt')
+    assert not check_secret('hemligt', 'hemligt!')
+
+
+def test_check_broken_hash():
+    assert not check_secret('pbkdf2_sha256$xyz$salt$hash', 'hemligt')
+
+
+def test_verifier_memo():
+    verifier = SecretVerifier(ttl=60)
+    _hash = hash_secret('hemligt')
+    assert verifier.verify('client_1', _hash, 'hemligt')
+    assert len(verifier._memo) == 1
+    assert verifier.verify('client_1', _hash, 'hemligt')
+    # failed verifications are not remembered
+    assert not verifier.verify('client_1', _hash, 'fel')
+    assert len(verifier._memo) == 1
+    # Another client with the same secret
+    assert not verifier.verify('client_2', hash_secret('annat'), 'hemligt')
+
+
+def test_check_secret_not_a_string():
+    assert not check_secret(None, 'hemligt')
+    assert not check_secret(12345, '12345')
+    assert not check_secret('hemligt', None)
+    assert not SecretVerifier().verify('client_1', None, 'hemligt')
@@ -0,0 +1,110 @@
+from cryptojwt.jws import jws
+from cryptojwt.jwt import JWT
+from cryptojwt.key_jar import build_keyjar
+from cryptojwt.key_jar import KeyJar
+
+from oidcendpoint.signer import Signer
+from oidcendpoint.signer import SignerCache
+
+KEYDEFS = [
+    {"type": "RSA", "key": '', "use": ["sig"]},
+    {"type": "EC", "crv": "P-256", "use": ["sig"]}
+]
+
+ISSUER = 'https://example.com/'
+
+
+class Context(object):
+    def __init__(self, keyjar, issuer):
+        self.keyjar = keyjar
+        self.issuer = issuer
+
+
+def client_keyjar(keyjar):
+    _kj = KeyJar()
+    _kj.import_jwks(keyjar.export_jwks(), ISSUER)
+    return _kj
+
+
+def test_signer_pack():
+    _keyjar = build_keyjar(KEYDEFS)
+    for alg in ['RS256', 'ES256']:
+        _signer = Signer(_keyjar, iss=ISSUER, sign_alg=alg)
+        _token = _signer.pack({'sub': 'sub'}, recv='client_1', lifetime=300)
+
+        _jws = jws.factory(_token)
+        assert _jws.jwt.headers['alg'] == alg
+        assert _jws.jwt.headers['kid'] == _signer.key.kid
+
+        _info = JWT(client_keyjar(_keyjar), iss='client_1').unpack(_token)
+        assert _info['sub'] == 'sub'
+        assert _info['iss'] == ISSUER
+        assert _info['aud'] == ['client_1']
+        assert _info['exp'] - _info['iat'] == 300
+
+
+def test_signer_cache():
+    _keyjar = build_keyjar(KEYDEFS)
+    _context = Context(_keyjar, ISSUER)
+    _cache = SignerCache(_context)
+
+    _signer = _cache.get('client_1', sign_alg='RS256')
+    assert _cache.get('client_1', sign_alg='RS256') is _signer
+    assert _cache.get('client_1', sign_alg='ES256') is not _signer
+    assert _cache.get('client_2', sign_alg='RS256') is not _signer
+
+    _cache.invalidate('client_1')
+    assert _cache.get('client_1', sign_alg='RS256') is not _signer
+
+
+def test_signer_cache_key_rotation():
+    _context = Context(build_keyjar(KEYDEFS), ISSUER)
+    _cache = SignerCache(_context)
+    _signer = _cache.get('client_1', sign_alg='RS256')
+
+    _context.keyjar = build_keyjar(KEYDEFS)
+    _new_signer = _cache.get('client_1', sign_alg='RS256')
+    assert _new_signer is not _signer
+    assert _new_signer.key.kid != _signer.key.kid
+
+
+ENC_KEYDEFS = [
+    {"type": "RSA", "key": '', "use": ["enc"]},
+    {"type": "EC", "crv": "P-256", "use": ["enc"]}
+]
+
+
+def test_signer_encrypt():
+    _keyjar = build_keyjar(KEYDEFS)
+    _client_keyjar = build_keyjar(ENC_KEYDEFS)
+    _keyjar.import_jwks(_client_keyjar.export_jwks(), 'client_1')
+    _client_keyjar.import_jwks(_keyjar.export_jwks(), ISSUER)
+
+    for enc_alg in ['RSA-OAEP', 'ECDH-ES']:
+        _signer = Signer(_keyjar, iss=ISSUER, sign_alg='ES256', encrypt=True,
+                         enc_alg=enc_alg, enc_enc='A128CBC-HS256')
+        for _ in range(2):
+            _token = _signer.pack({'sub': 'sub'}, recv='client_1')
+            _info = JWT(_client_keyjar, iss='client_1').unpack(_token)
+            assert _info['sub'] == 'sub'
+
+
+def test_signer_encryption_keys_refreshed():
+    _keyjar = build_keyjar(KEYDEFS)
+    _keyjar.import_jwks(build_keyjar(ENC_KEYDEFS).export_jwks(), 'client_1')
+
+    _signer = Signer(_keyjar, iss=ISSUER, sign_alg='ES256', encrypt=True,
+                     enc_alg='RSA-OAEP', enc_enc='A128CBC-HS256')
+    _signer.pack({'sub': 'sub'}, recv='client_1')
+    _keys = _signer._encryption_keys('client_1')
+    assert _signer._encryption_keys('client_1') is _keys
+
+    # The client registers new keys
+    _client_keyjar = build_keyjar(ENC_KEYDEFS)
+    _keyjar.issuer_keys['client_1'] = []
+    _keyjar.import_jwks(_client_keyjar.export_jwks(), 'client_1')
+    _client_keyjar.import_jwks(_keyjar.export_jwks(), ISSUER)
+
+    _token = _signer.pack({'sub': 'sub'}, recv='client_1')
+    _info = JWT(_client_keyjar, iss='client_1').unpack(_token)
+    assert _info['sub'] == 'sub'
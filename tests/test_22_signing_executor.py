@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from cryptojwt.jwt import JWT
+from cryptojwt.key_jar import build_keyjar
+from cryptojwt.key_jar import KeyJar
+
+from oidcendpoint.signer import Signer
+from oidcendpoint.signer import SignerCache
+from oidcendpoint.signing_executor import SigningExecutor
+
+KEYDEFS = [
+    {"type": "RSA", "key": '', "use": ["sig"]},
+    {"type": "EC", "crv": "P-256", "use": ["sig"]}
+]
+
+ISSUER = 'https://example.com/'
+
+
+class Context(object):
+    def __init__(self, keyjar, issuer):
+        self.keyjar = keyjar
+        self.issuer = issuer
+
+
+def unpack(keyjar, token):
+    _kj = KeyJar()
+    _kj.import_jwks(keyjar.export_jwks(), ISSUER)
+    return JWT(_kj, iss='client_1').unpack(token)
+
+
+class TestSigningExecutor(object):
+    @pytest.fixture(autouse=True)
+    def create_executor(self):
+        self.keyjar = build_keyjar(KEYDEFS)
+        self.executor = SigningExecutor(max_workers=2)
+        self.executor.start(self.keyjar)
+        yield
+        self.executor.close()
+
+    def test_pack(self):
+        for alg in ['RS256', 'ES256']:
+            _signer = Signer(self.keyjar, iss=ISSUER, sign_alg=alg,
+                             executor=self.executor)
+            _token = _signer.pack({'sub': 'sub'}, recv='client_1')
+            assert unpack(self.keyjar, _token)['sub'] == 'sub'
+
+    def test_pack_async(self):
+        _signer = Signer(self.keyjar, iss=ISSUER, sign_alg='RS256',
+                         executor=self.executor)
+        _loop = asyncio.new_event_loop()
+        try:
+            _tokens = _loop.run_until_complete(asyncio.gather(
+                *[_signer.pack_async({'sub': str(i)}, recv='client_1',
+                                     loop=_loop) for i in range(4)]))
+        finally:
+            _loop.close()
+
+        assert [unpack(self.keyjar, t)['sub'] for t in _tokens] == [
+            '0', '1', '2', '3']
+
+    def test_unknown_key_signed_locally(self):
+        _keyjar = build_keyjar(KEYDEFS)
+        _signer = Signer(_keyjar, iss=ISSUER, sign_alg='RS256',
+                         executor=self.executor)
+        _token = _signer.pack({'sub': 'sub'}, recv='client_1')
+        assert unpack(_keyjar, _token)['sub'] == 'sub'
+
+    def test_signer_cache_loads_keys(self):
+        _context = Context(build_keyjar(KEYDEFS), ISSUER)
+        _cache = SignerCache(_context, executor=self.executor)
+        _signer = _cache.get('client_1', sign_alg='RS256')
+        assert _signer.key.kid in self.executor._kids
+
+    def test_keys_loaded_later(self):
+        _keyjar = build_keyjar(KEYDEFS)
+        _pool = self.executor._pool
+        self.executor.load_keys(_keyjar)
+        # Not a new pool
+        assert self.executor._pool is _pool
+
+        _signer = Signer(_keyjar, iss=ISSUER, sign_alg='ES256',
+                         executor=self.executor)
+        _calls = []
+        _orig = _pool.apply_async
+
+        def _apply_async(*args, **kwargs):
+            _calls.append(args)
+            return _orig(*args, **kwargs)
+
+        _pool.apply_async = _apply_async
+        for _ in range(3):
+            _token = _signer.pack({'sub': 'sub'}, recv='client_1')
+            assert unpack(_keyjar, _token)['sub'] == 'sub'
+        # Signed in the workers, the key passed along
+        assert len(_calls) == 3
+        assert _calls[0][1][3] is not None
+
+    def test_not_started(self):
+        _executor = SigningExecutor(max_workers=2)
+        _executor.load_keys(self.keyjar)
+        assert _executor._pool is None
+        _signer = Signer(self.keyjar, iss=ISSUER, sign_alg='RS256',
+                         executor=_executor)
+        _token = _signer.pack({'sub': 'sub'}, recv='client_1')
+        assert unpack(self.keyjar, _token)['sub'] == 'sub'
+
+    def test_worker_lost(self):
+        self.executor.timeout = 0.1
+        # A task that's never done, like one given to a worker that died
+        self.executor._pool.apply_async = lambda *args, **kwargs: None
+        _signer = Signer(self.keyjar, iss=ISSUER, sign_alg='RS256',
+                         executor=self.executor)
+        _token = _signer.pack({'sub': 'sub'}, recv='client_1')
+        assert unpack(self.keyjar, _token)['sub'] == 'sub'
@@ -0,0 +1,25 @@
+from cryptojwt.key_jar import build_keyjar
+
+from oidcendpoint.sign_cost import cheapest_alg
+from oidcendpoint.sign_cost import measure_sign_cost
+
+KEYDEFS = [
+    {"type": "RSA", "key": '', "use": ["sig"]},
+    {"type": "EC", "crv": "P-256", "use": ["sig"]}
+]
+
+
+def test_measure_sign_cost():
+    _cost = measure_sign_cost(build_keyjar(KEYDEFS), rounds=2)
+    assert {'RS256', 'ES256'}.issubset(set(_cost.keys()))
+    # No P-384 key
+    assert 'ES384' not in _cost
+    assert 'HS256' not in _cost
+    assert 'none' not in _cost
+
+
+def test_cheapest_alg():
+    _cost = {'RS256': 0.002, 'PS256': 0.003, 'ES256': 0.0001}
+    assert cheapest_alg(_cost, ['RS256', 'ES256']) == 'ES256'
+    assert cheapest_alg(_cost, ['RS256', 'PS256']) == 'RS256'
+    assert cheapest_alg(_cost, ['ES384']) is None
@@ -0,0 +1,28 @@
+from oidcmsg.message import Message
+
+from oidcendpoint.artifacts import Artifacts
+from oidcendpoint.artifacts import request_artifacts
+
+
+def test_produce_once():
+    _calls = []
+
+    def _compute(a, b=0):
+        _calls.append((a, b))
+        return a + b
+
+    _artifacts = Artifacts()
+    assert _artifacts.produce('sum', _compute, 1, b=2) == 3
+    assert _artifacts.produce('sum', _compute, 1, b=2) == 3
+    assert _calls == [(1, 2)]
+    assert 'sum' in _artifacts
+    assert _artifacts.get('other') is None
+
+
+def test_request_artifacts():
+    _req = Message(foo='bar')
+    request_artifacts(_req)['id_token'] = 'token'
+    assert request_artifacts(_req)['id_token'] == 'token'
+    # Not part of the message
+    assert _req.to_dict() == {'foo': 'bar'}
+    assert 'id_token' not in request_artifacts(Message(foo='bar'))
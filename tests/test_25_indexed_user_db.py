@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from oidcendpoint.user_info import UserInfo
+from oidcendpoint.user_info.indexed import IndexedUserDB
+
+BASEDIR = os.path.abspath(os.path.dirname(__file__))
+
+
+@pytest.fixture
+def db_file(tmpdir):
+    _file = os.path.join(str(tmpdir), 'users.json')
+    shutil.copy(os.path.join(BASEDIR, 'users.json'), _file)
+    return _file
+
+
+def test_lookup(db_file):
+    with open(db_file, encoding='utf-8') as fp:
+        _users = json.load(fp)
+
+    _db = IndexedUserDB(db_file, cache_size=1)
+    assert set(_db.keys()) == set(_users.keys())
+    assert len(_db) == len(_users)
+    for uid, info in _users.items():
+        assert uid in _db
+        assert _db[uid] == info
+    assert 'nobody' not in _db
+    with pytest.raises(KeyError):
+        _db.get_claims('nobody', ['name'])
+    _db.close()
+
+
+def test_projection(db_file):
+    _db = IndexedUserDB(db_file)
+    assert _db.get_claims('diana', ['name', 'shoe_size']) == {
+        'name': 'Diana Krall'}
+    # Partially loaded, the rest is read when asked for
+    assert _db.get_claims('diana', ['email']) == {
+        'email': 'diana@example.org'}
+    assert _db['diana']['nickname'] == 'Dina'
+    _db.close()
+
+
+def test_index_rebuilt_when_changed(db_file):
+    _db = IndexedUserDB(db_file)
+    _mtime = os.stat(_db.index_file).st_mtime
+    _db.close()
+
+    # Not changed
+    IndexedUserDB(db_file).close()
+    assert os.stat(db_file + '.idx').st_mtime == _mtime
+
+    with open(db_file, 'w') as fp:
+        json.dump({'eve': {'name': 'Eve'}}, fp)
+    _db = IndexedUserDB(db_file)
+    assert list(_db.keys()) == ['eve']
+    _db.close()
+
+
+def test_user_info(db_file):
+    _userinfo = UserInfo(db_file=db_file, indexed=True)
+    assert _userinfo('diana', 'client_1', {'name': None}) == {
+        'name': 'Diana Krall'}
+    assert _userinfo('nobody', 'client_1', {'name': None}) == {}
+    assert _userinfo('diana', 'client_1')['sub'] == 'dikr0001'
@@ -0,0 +1,106 @@
+import threading
+import time
+
+from oidcendpoint.user_info.cache import CachedUserInfo
+
+USERS = {
+    'diana': {'sub': 'dikr0001', 'name': 'Diana Krall', 'nickname': 'Dina'},
+    'babs': {'sub': 'babs0001', 'name': 'Barbara J Jensen'}
+}
+
+
+class Source(object):
+    def __init__(self, delay=0):
+        self.db = {k: dict(v) for k, v in USERS.items()}
+        self.calls = []
+        self.delay = delay
+
+    def __call__(self, user_id, client_id, user_info_claims=None, **kwargs):
+        self.calls.append(user_id)
+        time.sleep(self.delay)
+        try:
+            _info = self.db[user_id]
+        except KeyError:
+            return {}
+        if user_info_claims is None:
+            return dict(_info)
+        return {k: v for k, v in _info.items() if k in user_info_claims}
+
+
+def test_cached():
+    _source = Source()
+    _cache = CachedUserInfo(_source, ttl=60)
+
+    assert _cache('diana', 'client_1', {'name': None}) == {
+        'name': 'Diana Krall'}
+    _info = _cache('diana', 'client_1', {'name': None})
+    assert _source.calls == ['diana']
+
+    # What's returned can be modified without affecting the cache
+    _info['sub'] = 'other'
+    assert _cache('diana', 'client_1', {'name': None}) == {
+        'name': 'Diana Krall'}
+
+    # A different claims request
+    _cache('diana', 'client_1', {'nickname': None})
+    assert _source.calls == ['diana', 'diana']
+    # The source's attributes are reachable
+    assert _cache.db is _source.db
+
+
+def test_ttl():
+    _source = Source()
+    _cache = CachedUserInfo(_source, ttl=0.1)
+    _cache('diana', 'client_1')
+    _cache('diana', 'client_1')
+    assert len(_source.calls) == 1
+    time.sleep(0.2)
+    _cache('diana', 'client_1')
+    assert len(_source.calls) == 2
+
+
+def test_invalidate():
+    _source = Source()
+    _cache = CachedUserInfo(_source, ttl=60)
+    _cache('diana', 'client_1')
+    _cache('babs', 'client_1')
+
+    _source.db['diana']['name'] = 'Diana K'
+    _cache.invalidate('diana')
+    assert _cache('diana', 'client_1')['name'] == 'Diana K'
+    _cache('babs', 'client_1')
+    assert _source.calls == ['diana', 'babs', 'diana']
+
+
+def test_single_flight():
+    _source = Source(delay=0.2)
+    _cache = CachedUserInfo(_source, ttl=60)
+
+    _res = []
+    _threads = [threading.Thread(
+        target=lambda: _res.append(_cache('diana', 'client_1')))
+        for _ in range(5)]
+    for _thr in _threads:
+        _thr.start()
+    for _thr in _threads:
+        _thr.join()
+
+    assert _source.calls == ['diana']
+    assert len(_res) == 5
+    assert all(r['name'] == 'Diana Krall' for r in _res)
+
+
+def test_invalidate_during_fetch():
+    _source = Source(delay=0.2)
+    _cache = CachedUserInfo(_source, ttl=60)
+
+    _thr = threading.Thread(target=_cache, args=('diana', 'client_1'))
+    _thr.start()
+    time.sleep(0.05)
+    _cache.invalidate('diana')
+    _thr.join()
+
+    # What was read before the invalidation isn't kept
+    _source.delay = 0
+    _cache('diana', 'client_1')
+    assert _source.calls == ['diana', 'diana']
@@ -0,0 +1,238 @@
+import threading
+import time
+
+import pytest
+from cryptojwt.jws import jws
+from cryptojwt.jwt import JWT
+from cryptojwt.key_jar import build_keyjar
+from cryptojwt.key_jar import KeyJar
+
+from oidcendpoint.claims_source import AggregatedClaimsSource
+from oidcendpoint.claims_source import ClaimsSources
+from oidcendpoint.claims_source import DistributedClaimsSource
+from oidcendpoint.exception import ConfigurationError
+
+KEYDEFS = [{"type": "RSA", "key": '', "use": ["sig"]}]
+
+ISSUER = 'https://claims.example.com/'
+
+CREDIT = {'diana': {'credit_score': 650, 'credit_limit': 2000}}
+
+
+class Fetch(object):
+    def __init__(self, db, delay=0):
+        self.db = db
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, user_id, client_id, claims):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.db.get(user_id)
+
+
+def client_keyjar(keyjar):
+    _kj = KeyJar()
+    _kj.import_jwks(keyjar.export_jwks(), ISSUER)
+    return _kj
+
+
+def test_aggregated():
+    _keyjar = build_keyjar(KEYDEFS)
+    _fetch = Fetch(CREDIT)
+    _source = AggregatedClaimsSource('src1', ['credit_score'], _fetch,
+                                     keyjar=_keyjar, issuer=ISSUER)
+    _res, _names = _source('diana', 'client_1', {'credit_score'})
+    assert _names == {'credit_score'}
+    _info = JWT(client_keyjar(_keyjar), iss='client_1').unpack(_res['JWT'])
+    assert _info['credit_score'] == 650
+    # Only what was asked for
+    assert 'credit_limit' not in _info
+
+    # Reused until it expires
+    assert _source('diana', 'client_1', {'credit_score'}) == (_res, _names)
+    assert _fetch.calls == 1
+
+    assert _source('babs', 'client_1', {'credit_score'}) is None
+
+
+def test_aggregated_expires():
+    _keyjar = build_keyjar(KEYDEFS)
+    _fetch = Fetch(CREDIT)
+    _source = AggregatedClaimsSource('src1', ['credit_score'], _fetch,
+                                     keyjar=_keyjar, issuer=ISSUER,
+                                     lifetime=1)
+    _source('diana', 'client_1', {'credit_score'})
+    time.sleep(1.1)
+    _source('diana', 'client_1', {'credit_score'})
+    assert _fetch.calls == 2
+
+
+def test_aggregated_max_entries():
+    _keyjar = build_keyjar(KEYDEFS)
+    _fetch = Fetch({'diana': {'credit_score': 650},
+                    'babs': {'credit_score': 700},
+                    'clark': {'credit_score': 600}})
+    _source = AggregatedClaimsSource('src1', ['credit_score'], _fetch,
+                                     keyjar=_keyjar, issuer=ISSUER,
+                                     max_entries=2)
+    _source('diana', 'client_1', {'credit_score'})
+    _source('babs', 'client_1', {'credit_score'})
+    # diana is now used more recently than babs
+    _source('diana', 'client_1', {'credit_score'})
+    _source('clark', 'client_1', {'credit_score'})
+    assert len(_source._cache) == 2
+    assert _fetch.calls == 3
+
+    _source('diana', 'client_1', {'credit_score'})
+    assert _fetch.calls == 3
+    _source('babs', 'client_1', {'credit_score'})
+    assert _fetch.calls == 4
+
+
+def test_aggregated_signed_elsewhere():
+    _keyjar = build_keyjar(KEYDEFS)
+    _jwt = JWT(_keyjar, iss=ISSUER, lifetime=300).pack(
+        {'credit_score': 650}, recv='client_1')
+    _fetch = Fetch({'diana': _jwt})
+    _source = AggregatedClaimsSource('src1', ['credit_score'], _fetch,
+                                     signed=True)
+    assert _source('diana', 'client_1', {'credit_score'}) == (
+        {'JWT': _jwt}, {'credit_score'})
+    _source('diana', 'client_1', {'credit_score'})
+    assert _fetch.calls == 1
+
+    _expires = _source._cache[('diana', 'client_1', ('credit_score',))][0]
+    assert _expires == jws.factory(_jwt).jwt.payload()['exp']
+
+
+def test_aggregated_no_keyjar():
+    with pytest.raises(ConfigurationError):
+        AggregatedClaimsSource('src1', ['credit_score'], Fetch(CREDIT))
+
+    # Said to return JWTs but didn't
+    _source = AggregatedClaimsSource('src1', ['credit_score'], Fetch(CREDIT),
+                                     signed=True)
+    with pytest.raises(ConfigurationError):
+        _source('diana', 'client_1', {'credit_score'})
+
+
+def test_distributed():
+    _source = DistributedClaimsSource(
+        'src2', ['shipping_address'], 'https://bank.example.com/claims',
+        access_token=lambda uid, cid, claims: 'token-{}'.format(uid))
+    assert _source('diana', 'client_1', {'shipping_address'}) == (
+        {'endpoint': 'https://bank.example.com/claims',
+         'access_token': 'token-diana'},
+        {'shipping_address'})
+
+
+def test_collect():
+    _keyjar = build_keyjar(KEYDEFS)
+    _sources = ClaimsSources([
+        AggregatedClaimsSource('src1', ['credit_score'], Fetch(CREDIT),
+                               keyjar=_keyjar, issuer=ISSUER),
+        DistributedClaimsSource('src2', ['shipping_address'],
+                                'https://bank.example.com/claims'),
+        DistributedClaimsSource('src3', ['payment_info'],
+                                'https://pay.example.com/claims')])
+
+    _res = _sources.collect('diana', 'client_1',
+                            ['credit_score', 'shipping_address', 'email'])
+    assert _res['_claim_names'] == {'credit_score': 'src1',
+                                    'shipping_address': 'src2'}
+    assert set(_res['_claim_sources'].keys()) == {'src1', 'src2'}
+    assert 'JWT' in _res['_claim_sources']['src1']
+
+    assert _sources.collect('diana', 'client_1', ['email']) == {}
+
+
+def test_collect_only_returned_claims():
+    _keyjar = build_keyjar(KEYDEFS)
+    _jwt = JWT(_keyjar, iss=ISSUER, lifetime=300).pack(
+        {'credit_score': 650}, recv='client_1')
+    _sources = ClaimsSources([
+        AggregatedClaimsSource('src1', ['credit_score', 'credit_limit'],
+                               Fetch({'diana': {'credit_score': 650}}),
+                               keyjar=_keyjar, issuer=ISSUER),
+        AggregatedClaimsSource('src2', ['credit_limit', 'payment_info'],
+                               Fetch({'diana': _jwt}), signed=True),
+        AggregatedClaimsSource('src3', ['credit_limit'],
+                               Fetch({'diana': CREDIT['diana']}),
+                               keyjar=_keyjar, issuer=ISSUER)])
+
+    _res = _sources.collect('diana', 'client_1',
+                            ['credit_score', 'credit_limit', 'payment_info'])
+    # Neither src1 nor src2 had credit_limit, src2 had nothing at all
+    assert _res['_claim_names'] == {'credit_score': 'src1',
+                                    'credit_limit': 'src3'}
+    assert set(_res['_claim_sources'].keys()) == {'src1', 'src3'}
+
+
+def test_collect_timeout():
+    _keyjar = build_keyjar(KEYDEFS)
+    _jwt = JWT(_keyjar, iss=ISSUER, lifetime=300).pack(
+        {'credit_score': 650, 'credit_limit': 2000}, recv='client_1')
+    _sources = ClaimsSources([
+        AggregatedClaimsSource('slow', ['credit_score'],
+                               Fetch({'diana': _jwt}, delay=0.5),
+                               timeout=0.1, signed=True),
+        AggregatedClaimsSource('fast', ['credit_limit'],
+                               Fetch({'diana': _jwt}, delay=0.05),
+                               timeout=0.3, signed=True)])
+
+    _start = time.time()
+    _res = _sources.collect('diana', 'client_1',
+                            ['credit_score', 'credit_limit'])
+    # The sources are asked at the same time
+    assert time.time() - _start < 0.4
+    assert _res['_claim_names'] == {'credit_limit': 'fast'}
+    assert _res['_claim_sources'] == {'fast': {'JWT': _jwt}}
+
+
+def test_collect_hanging_source():
+    _keyjar = build_keyjar(KEYDEFS)
+    _jwt = JWT(_keyjar, iss=ISSUER, lifetime=300).pack(
+        {'credit_limit': 2000}, recv='client_1')
+    _release = threading.Event()
+    _calls = []
+
+    def _hang(user_id, client_id, claims):
+        _calls.append(user_id)
+        _release.wait()
+
+    _sources = ClaimsSources([
+        AggregatedClaimsSource('hung', ['credit_score'], _hang, timeout=0.1,
+                               signed=True),
+        AggregatedClaimsSource('fast', ['credit_limit'],
+                               Fetch({'diana': _jwt}), timeout=0.5,
+                               signed=True)],
+        max_workers=2, max_pending=1)
+    try:
+        for _ in range(3):
+            _res = _sources.collect('diana', 'client_1',
+                                    ['credit_score', 'credit_limit'])
+            # There is always a worker left for the other source
+            assert _res['_claim_names'] == {'credit_limit': 'fast'}
+        # Not asked while it still had a task running
+        assert _calls == ['diana']
+    finally:
+        _release.set()
+
+    # Asked again once it's done
+    time.sleep(0.1)
+    _sources.collect('diana', 'client_1', ['credit_score'])
+    assert len(_calls) == 2
+
+
+def test_collect_failing_source():
+    def _fail(user_id, client_id, claims):
+        raise ValueError('No')
+
+    _sources = ClaimsSources([
+        AggregatedClaimsSource('bad', ['credit_score'], _fail, signed=True),
+        DistributedClaimsSource('src2', ['shipping_address'],
+                                'https://bank.example.com/claims')])
+    _res = _sources.collect('diana', 'client_1',
+                            ['credit_score', 'shipping_address'])
+    assert _res['_claim_names'] == {'shipping_address': 'src2'}
@@ -0,0 +1,65 @@
+import time
+
+from oidcendpoint.response_cache import ResponseCache
+from oidcendpoint.response_cache import claims_fingerprint
+
+
+class Signer(object):
+    pass
+
+
+def test_claims_fingerprint():
+    _fp = claims_fingerprint({'sub': 'doe', 'name': 'Diana'}, 'client_1')
+    assert _fp == claims_fingerprint({'name': 'Diana', 'sub': 'doe'},
+                                     'client_1')
+    assert _fp != claims_fingerprint({'sub': 'doe', 'name': 'Di'}, 'client_1')
+    assert _fp != claims_fingerprint({'sub': 'doe', 'name': 'Diana'},
+                                     'client_2')
+
+
+def test_get_set():
+    _cache = ResponseCache()
+    _signer = Signer()
+    _cache.set('token', 'fp', 'a.b.c', time.time() + 60, _signer)
+    assert _cache.get('token', 'fp', _signer) == 'a.b.c'
+    # Claims changed
+    assert _cache.get('token', 'fp2', _signer) is None
+    # Keys or algorithms changed
+    assert _cache.get('token', 'fp', Signer()) is None
+    assert _cache.get('other', 'fp', _signer) is None
+
+    # Only the latest response per token is kept
+    _cache.set('token', 'fp2', 'd.e.f', time.time() + 60, _signer)
+    assert _cache.get('token', 'fp', _signer) is None
+    assert len(_cache) == 1
+
+
+def test_token_lifetime():
+    _cache = ResponseCache()
+    _cache.set('token', 'fp', 'a.b.c', time.time() + 0.1)
+    assert _cache.get('token', 'fp') == 'a.b.c'
+    time.sleep(0.2)
+    assert _cache.get('token', 'fp') is None
+
+    # Already expired tokens aren't cached
+    _cache.set('token', 'fp', 'a.b.c', time.time() - 1)
+    assert len(_cache) == 0
+
+
+def test_invalidate():
+    _cache = ResponseCache()
+    _cache.set('token', 'fp', 'a.b.c', time.time() + 60)
+    _cache.set('token2', 'fp', 'd.e.f', time.time() + 60)
+    _cache.invalidate('token')
+    assert _cache.get('token', 'fp') is None
+    assert _cache.get('token2', 'fp') == 'd.e.f'
+    _cache.clear()
+    assert len(_cache) == 0
+
+
+def test_max_entries():
+    _cache = ResponseCache(max_entries=2)
+    for tok in ['t1', 't2', 't3']:
+        _cache.set(tok, 'fp', tok, time.time() + 60)
+    assert _cache.get('t1', 'fp') is None
+    assert _cache.get('t3', 'fp') == 't3'
@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+import pytest
+
+from oidcendpoint.user_info import UserInfo
+from oidcendpoint.user_info.cache import CachedUserInfo
+from oidcendpoint.user_info.reload import ReloadingUserDB
+from oidcendpoint.user_info.reload import diff_users
+
+BASEDIR = os.path.abspath(os.path.dirname(__file__))
+
+
+@pytest.fixture
+def db_file(tmpdir):
+    _file = os.path.join(str(tmpdir), 'users.json')
+    shutil.copy(os.path.join(BASEDIR, 'users.json'), _file)
+    return _file
+
+
+def update(db_file, func):
+    with open(db_file, encoding='utf-8') as fp:
+        _users = json.load(fp)
+    func(_users)
+    # Written to another file and moved in place, like most tools do
+    _tmp = '{}.new'.format(db_file)
+    with open(_tmp, 'w', encoding='utf-8') as fp:
+        json.dump(_users, fp)
+    os.replace(_tmp, db_file)
+
+
+def rename(users):
+    users['diana']['name'] = 'Diana K'
+
+
+def test_diff_users():
+    _old = {'a': {'name': 'A'}, 'b': {'name': 'B'}, 'c': {'name': 'C'}}
+    _new = {'a': {'name': 'A'}, 'b': {'name': 'Bee'}, 'd': {'name': 'D'}}
+    assert diff_users(_old, _new) == {'b', 'c', 'd'}
+    assert _new['a'] is _old['a']
+
+
+def test_reload(db_file):
+    _db = ReloadingUserDB(db_file, background=False)
+    assert _db['diana']['name'] == 'Diana Krall'
+    assert _db.check() is False
+
+    update(db_file, rename)
+    assert _db['diana']['name'] == 'Diana Krall'
+    assert _db.check() is True
+    assert _db['diana']['name'] == 'Diana K'
+    assert _db.get_claims('diana', ['name', 'shoe_size']) == {
+        'name': 'Diana K'}
+    assert _db.reloads == 1
+
+
+def test_reload_indexed(db_file):
+    _db = ReloadingUserDB(db_file, indexed=True, background=False,
+                          interval=0.1)
+    assert _db.get_claims('diana', ['name']) == {'name': 'Diana Krall'}
+    _old = _db._db
+    update(db_file, rename)
+    assert _db.check() is True
+    assert _db.get_claims('diana', ['name']) == {'name': 'Diana K'}
+
+    # Still usable by requests that got it before the reload
+    assert _old.get_claims('diana', ['name']) == {'name': 'Diana Krall'}
+    time.sleep(0.2)
+    _db.check()
+    with pytest.raises(sqlite3.ProgrammingError):
+        _old.get_claims('diana', ['email'])
+    assert _db._retired == []
+
+    _db.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        _db.get_claims('diana', ['email'])
+
+
+def test_broken_file_keeps_old(db_file):
+    _db = ReloadingUserDB(db_file, background=False)
+    with open(db_file, 'w') as fp:
+        fp.write('{"diana": ')
+    assert _db.check() is False
+    assert _db['diana']['name'] == 'Diana Krall'
+
+    _users = {'diana': {'name': 'Diana K'}}
+    with open(db_file, 'w') as fp:
+        json.dump(_users, fp)
+    assert _db.check() is True
+    assert list(_db.keys()) == ['diana']
+
+
+def test_listeners(db_file):
+    _changes = []
+    _db = ReloadingUserDB(db_file, incremental=True, background=False)
+    _db.add_listener(_changes.append)
+    update(db_file, rename)
+    _db.check()
+    assert _changes == [{'diana'}]
+
+    _db = ReloadingUserDB(db_file, background=False)
+    _db.add_listener(_changes.append)
+    update(db_file, rename)
+    _db.check()
+    assert _changes[-1] is None
+
+
+def test_background(db_file):
+    _user_info = UserInfo(db_file=db_file, reload=True, reload_interval=0.05,
+                          incremental=True)
+    _cache = CachedUserInfo(_user_info)
+    _user_info.db.add_listener(_cache.users_changed)
+    assert _cache('diana', 'client_1', {'name': None}) == {
+        'name': 'Diana Krall'}
+
+    update(db_file, rename)
+    for _ in range(40):
+        if _user_info.db.reloads:
+            break
+        time.sleep(0.05)
+    _user_info.db.close()
+
+    assert _cache('diana', 'client_1', {'name': None}) == {'name': 'Diana K'}
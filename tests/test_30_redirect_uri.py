@@ -0,0 +1,70 @@
+from urllib.parse import parse_qs
+
+from oidcendpoint.redirect_uri import RedirectURIMatcher
+from oidcendpoint.redirect_uri import compile_redirect_uris
+from oidcendpoint.redirect_uri import split_redirect_uri
+
+REDIRECT_URIS = [
+    ('https://example.com/cb', None),
+    ('https://example.com/cb2', parse_qs('foo=bar')),
+    ('https://example.com/cb2', parse_qs('foo=bar&x=1&x=2')),
+]
+
+
+def test_compile():
+    _compiled = compile_redirect_uris(REDIRECT_URIS)
+    assert set(_compiled.keys()) == {'https://example.com/cb',
+                                     'https://example.com/cb2'}
+    assert _compiled['https://example.com/cb'] == {frozenset()}
+    assert len(_compiled['https://example.com/cb2']) == 2
+
+
+def test_split():
+    assert split_redirect_uri('https://example.com/cb%3Ffoo%3Dbar') == (
+        'https://example.com/cb', frozenset([('foo', 'bar')]), None)
+    assert split_redirect_uri('https://example.com/cb#frag') == (
+        'https://example.com/cb', frozenset(), 'frag')
+    assert split_redirect_uri('https://example.com/cb#') == (
+        'https://example.com/cb', frozenset(), '')
+
+
+def test_match():
+    _matcher = RedirectURIMatcher()
+    for uri in ['https://example.com/cb', 'https://example.com/cb?',
+                'https://example.com/cb2?foo=bar',
+                'https://example.com/cb2?x=2&foo=bar&x=1']:
+        assert _matcher.match('client_1', REDIRECT_URIS, uri)
+
+    for uri in ['https://example.com/cb3', 'https://example.com/cb?foo=bar',
+                'https://example.com/cb2', 'https://example.com/cb2?foo=baz',
+                'https://example.com/cb2?foo=bar&x=1',
+                'https://example.com/cb#fragment', 'https://example.com/cb#',
+                'https://example.com/cb%23']:
+        assert not _matcher.match('client_1', REDIRECT_URIS, uri)
+
+
+def test_registration_changed():
+    _matcher = RedirectURIMatcher()
+    assert _matcher.match('client_1', REDIRECT_URIS, 'https://example.com/cb')
+
+    # Changed without invalidate being called, directly in the cdb or by
+    # another process sharing it
+    _new = [('https://example.org/cb', None)]
+    assert not _matcher.match('client_1', _new, 'https://example.com/cb')
+    assert _matcher.match('client_1', _new, 'https://example.org/cb')
+
+    # Changed in place
+    _new.append(('https://example.org/cb2', None))
+    assert _matcher.match('client_1', _new, 'https://example.org/cb2')
+    del _new[0]
+    assert not _matcher.match('client_1', _new, 'https://example.org/cb')
+    assert _matcher.match('client_1', _new, 'https://example.org/cb2')
+
+
+def test_invalidate():
+    _matcher = RedirectURIMatcher(max_entries=1)
+    _matcher.match('client_1', REDIRECT_URIS, 'https://example.com/cb')
+    _matcher.match('client_2', REDIRECT_URIS, 'https://example.com/cb')
+    assert list(_matcher._db.keys()) == ['client_2']
+    _matcher.invalidate('client_2')
+    assert len(_matcher._db) == 0
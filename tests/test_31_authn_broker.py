@@ -0,0 +1,89 @@
+import pytest
+
+from oidcendpoint.user_authn.authn_context import INTERNETPROTOCOLPASSWORD
+from oidcendpoint.user_authn.authn_context import MOBILETWOFACTORCONTRACT
+from oidcendpoint.user_authn.authn_context import PASSWORD
+from oidcendpoint.user_authn.authn_context import UNSPECIFIED
+from oidcendpoint.user_authn.authn_context import AuthnBroker
+
+
+class Method(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+@pytest.fixture
+def broker():
+    _broker = AuthnBroker()
+    _broker.add(UNSPECIFIED, Method('none'), level=0)
+    _broker.add(PASSWORD, Method('password'), level=10)
+    _broker.add(INTERNETPROTOCOLPASSWORD, Method('ipp'), level=10)
+    _broker.add(MOBILETWOFACTORCONTRACT, Method('2fa'), level=30)
+    return _broker
+
+
+def names(res):
+    return [(m.name, acr) for m, acr in res]
+
+
+def test_pick_exact(broker):
+    assert names(broker.pick(PASSWORD, 'exact')) == [('password', PASSWORD)]
+    assert broker.pick('urn:unknown', 'exact') == []
+
+
+def test_pick_minimum(broker):
+    assert names(broker.pick(PASSWORD)) == [
+        ('2fa', MOBILETWOFACTORCONTRACT), ('password', PASSWORD),
+        ('ipp', INTERNETPROTOCOLPASSWORD)]
+    # No acr is the same as unspecified
+    assert len(broker.pick()) == 4
+
+
+def test_pick_better(broker):
+    assert names(broker.pick(PASSWORD, 'better')) == [
+        ('2fa', MOBILETWOFACTORCONTRACT)]
+
+
+def test_pick_maximum(broker):
+    assert names(broker.pick(PASSWORD, 'maximum')) == [
+        ('password', PASSWORD), ('ipp', INTERNETPROTOCOLPASSWORD),
+        ('none', UNSPECIFIED)]
+
+
+def test_pick_result_can_be_modified(broker):
+    broker.pick(PASSWORD).pop()
+    assert len(broker.pick(PASSWORD)) == 3
+
+
+def test_unknown_comparison_type(broker):
+    with pytest.raises(AttributeError):
+        broker.pick(PASSWORD, 'foo')
+
+
+def test_index_and_acr_values(broker):
+    assert len(broker) == 4
+    assert broker[0][0].name == 'none'
+    assert broker[3][1] == MOBILETWOFACTORCONTRACT
+    with pytest.raises(IndexError):
+        broker[4]
+    assert [m.name for m in broker] == ['none', 'password', 'ipp', '2fa']
+    assert broker.getAcrValuesString() == ' '.join(
+        [UNSPECIFIED, PASSWORD, INTERNETPROTOCOLPASSWORD,
+         MOBILETWOFACTORCONTRACT])
+    assert AuthnBroker().getAcrValuesString() is None
+
+
+def test_remove(broker):
+    broker.remove(MOBILETWOFACTORCONTRACT)
+    assert len(broker) == 3
+    assert broker.pick(MOBILETWOFACTORCONTRACT, 'exact') == []
+    assert names(broker.pick(PASSWORD, 'better')) == []
+    assert MOBILETWOFACTORCONTRACT not in broker.getAcrValuesString()
+
+    _method = broker[1][0]
+    broker.add(PASSWORD, Method('password2'), level=10)
+    broker.remove(PASSWORD, method=_method)
+    assert names(broker.pick(PASSWORD, 'exact')) == [('password2', PASSWORD)]